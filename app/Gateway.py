@@ -52,10 +52,11 @@ Launches several concurrent processes:
     4) PARACHAIN PROCESS
 
     writes apodized blocks of each blockchain in offerings to disk
+    resumes from the parachains on disk, backfilling blocks missed while down
 
     5) LOGO PROCESS
 
-    animates the the startup logo allowing a delay for parachains to be built
+    animates the the startup logo while parachains catch up
 
 """
 # STANDARD MODULES
@@ -75,11 +76,13 @@ from address_allocator import initialize_addresses
 from config import gateway_assets, offerings, processes
 from ipc_utilities import chronicle, json_ipc
 from logo_supreme import run as logo_supreme
+from parachain_window import ParachainWindow
 from process_deposits import deposit_server
 from process_ingots import ingot_casting
-from process_parachains import spawn_parachains
+from process_parachains import await_parachains, spawn_parachains
 from process_withdrawals import withdrawal_listener
 from signing.bitshares.rpc import rpc_get_account, wss_handshake
+from signing.bitshares.signing_service import supervise
 from utilities import it, xterm
 from watchdog import watchdog, watchdog_sleep
 
@@ -162,17 +165,28 @@ def ingot_process(comptroller: Dict[str, str]) -> None:
     process.start()
 
 
-def logo_process() -> None:
+def signing_process() -> None:
     """
-    Create a subprocess for the initialization logo.
+    Launch the resident BitShares signing service under its supervisor.
+    Issue and reserve orders then skip the fork, handshake, and header queries.
 
     :returns: None
     """
+    process = Process(target=supervise, args=(list(gateway_assets().values()),))
+    process.daemon = False
+    process.start()
+
+
+def logo_process() -> Process:
+    """
+    Create a subprocess for the initialization logo.
+
+    :returns: the logo Process, to join once parachains are ready
+    """
     process = Process(target=logo_supreme)
     process.daemon = True
     process.start()
-    process.join()
-    process.terminate()
+    return process
 
 
 def parachain_process(comptroller: Dict[str, str]) -> None:
@@ -228,23 +242,32 @@ def main() -> None:
     parachain_process(comptroller)
     # give half second to ctrl+shift+\ to break program on startup for dev
     time.sleep(0.5)
-    logo_process()
+    logo = logo_process()
     # set state machine to "all incoming accounts available"
     for network in comptroller["offerings"]:
         initialize_addresses(network)
+    # await the readiness barrier; parachains have resumed and caught up
+    try:
+        await_parachains(comptroller, "main")
+    except TimeoutError as error:
+        print(it("yellow", f"PARACHAINS FAILED TO INITIALIZE {error.args}"))
+        raise ChildProcessError() from error
+    logo.join()
+    logo.terminate()
     # confirm parachains are running
     for network in offerings():
         try:
-            parachain_cache = json_ipc(f"parachain_{network}.txt")
-            # extract the block numbers in the cached parachain
-            parachain_nums = sorted([str(i) for i in list(parachain_cache.keys())])
             # determine the maximum block number on record
-            latest_block = max(parachain_nums)
+            latest_block = ParachainWindow.load(network).latest
+            if latest_block is None:
+                raise ValueError(f"parachain_{network}.txt is empty")
             print(it(xterm(), f"{network.upper()} BLOCK {latest_block}"))
         except Exception as error:
             print(it("yellow", f"{network.upper()} PARACHAIN FAILED TO INITIALIZE"))
             raise ChildProcessError() from error
     print("")
+    if processes().get("signing_service"):
+        signing_process()
     # spawn 3 concurrent gateway subprocesses; passing the comptroller
     if processes()["ingots"]:
         ingot_process(comptroller)
@@ -25,18 +25,44 @@ binary interprocess communication for address in use
 [0,1,0,1,1,1] will mean addresses at index 0 and 2 are in use
 allowing for concurrent on_get api server operations
 on a finite number of accounts
+
+Deposit Leases
+
+in memory table of live deposit offers keyed by (client_id, network)
+a repeated request is offered the same address and memo until it expires
+requests for the same key are serialized; other keys proceed concurrently
+leases are released by the listener dispatcher on completion or timeout
+
+Watchlists
+
+each listener dispatcher publishes its (address, memo) keys per process
+the parachain writers persist only transfers matching their union
 """
 
 # STANDARD PYTHON MODULES
+import os
 import time
+from contextlib import contextmanager
 from json import dumps as json_dumps
-from multiprocessing import Process
-from typing import Optional
+from multiprocessing import Lock, Process
+from threading import RLock
+from typing import Any, Dict, Iterable, Iterator, List, Optional, Set, Tuple
 
 # BITSHARES GATEWAY MODULES
 from config import foreign_accounts
 from ipc_utilities import json_ipc
 
+# GLOBAL CONSTANTS
+# serialize read-modify-write of the gateway state between on_get threads
+# and the forked unlock processes; concurrent requests no longer need jitter
+GATEWAY_STATE_LOCK = Lock()
+# deposit leases live in the deposit server process only
+LEASES: Dict[Tuple[str, str], Dict[str, Any]] = {}
+LEASE_LOCK = RLock()
+# per (client_id, network) [lock, waiters]; an entry lives while anyone holds it
+KEY_LOCKS: Dict[Tuple[str, str], List[Any]] = {}
+PIPE = os.path.dirname(os.path.abspath(__file__)) + "/pipe"
+
 
 def initialize_addresses(network: str) -> None:
     """
@@ -66,17 +92,132 @@ def lock_address(network: str) -> Optional[int]:
     """
     doc = f"{network}_gateway_state.txt"
     gateway_idx = None
-    gateway_state = json_ipc(doc=doc)
-    for idx, state in enumerate(gateway_state):
-        if state:
-            gateway_idx = idx
-            gateway_state[idx] = 0
-            break
-    json_ipc(doc=doc, text=json_dumps(gateway_state))
+    with GATEWAY_STATE_LOCK:
+        gateway_state = json_ipc(doc=doc)
+        for idx, state in enumerate(gateway_state):
+            if state:
+                gateway_idx = idx
+                gateway_state[idx] = 0
+                break
+        if gateway_idx is not None:
+            json_ipc(doc=doc, text=json_dumps(gateway_state))
 
     return gateway_idx
 
 
+def get_lease(client_id: str, network: str) -> Optional[Dict[str, Any]]:
+    """
+    Return the live deposit lease for this client and network, if any.
+
+    :param client_id: BitShares client id.
+    :param network: Name of the network.
+
+    :return: Lease dict with memo, nonce, account_idx, and expires; or None.
+    """
+    with LEASE_LOCK:
+        lease = LEASES.get((client_id, network))
+        if lease is not None and lease["expires"] <= time.time():
+            del LEASES[(client_id, network)]
+            lease = None
+    return lease
+
+
+@contextmanager
+def lease_lock(client_id: str, network: str) -> Iterator[None]:
+    """
+    Serialize deposit requests for one client and network,
+    so a double click cannot lock two addresses; other clients are not held up.
+
+    :param client_id: BitShares client id.
+    :param network: Name of the network.
+
+    :return: context manager
+    """
+    key = (client_id, network)
+    with LEASE_LOCK:
+        entry = KEY_LOCKS.setdefault(key, [RLock(), 0])
+        entry[1] += 1
+    try:
+        with entry[0]:
+            yield
+    finally:
+        with LEASE_LOCK:
+            entry[1] -= 1
+            if not entry[1]:
+                del KEY_LOCKS[key]
+
+
+def grant_lease(client_id: str, network: str, lease: Dict[str, Any]) -> None:
+    """
+    Record a deposit lease for this client and network.
+
+    :param client_id: BitShares client id.
+    :param network: Name of the network.
+    :param lease: Lease dict with memo, nonce, account_idx, and expires.
+
+    :return: None
+    """
+    with LEASE_LOCK:
+        LEASES[(client_id, network)] = lease
+
+
+def release_lease(client_id: str, network: str, nonce: int) -> None:
+    """
+    Drop the deposit lease for this client and network;
+    only if it is still the lease granted to the request with this nonce.
+
+    :param client_id: BitShares client id.
+    :param network: Name of the network.
+    :param nonce: Nonce of the request which was granted the lease.
+
+    :return: None
+    """
+    with LEASE_LOCK:
+        lease = LEASES.get((client_id, network))
+        if lease is not None and lease["nonce"] == nonce:
+            del LEASES[(client_id, network)]
+
+
+def publish_watchlist(network: str, keys: Iterable[Tuple[str, str]]) -> None:
+    """
+    Publish the (address, memo) keys this process is listening for.
+
+    :param network: Name of the network.
+    :param keys: (address, memo) pairs; memo is "" when any memo will do.
+
+    :return: None
+    """
+    doc = f"watch_{network}_{os.getpid()}.txt"
+    json_ipc(doc=doc, text=json_dumps([list(key) for key in keys]))
+
+
+def load_watchlist(network: str) -> Set[Tuple[str, str]]:
+    """
+    Union of the (address, memo) keys published by every listening process.
+
+    :param network: Name of the network.
+
+    :return: Set of (address, memo) pairs.
+    """
+    prefix = f"watch_{network}_"
+    watchlist = set()
+    for doc in os.listdir(PIPE):
+        if doc.startswith(prefix):
+            watchlist.update(tuple(key) for key in json_ipc(doc=doc))
+    return watchlist
+
+
+def scrub_watchlists() -> None:
+    """
+    Remove the watchlists of a previous session.
+
+    :return: None
+    """
+    for doc in os.listdir(PIPE):
+        if doc.startswith("watch_"):
+            os.remove(f"{PIPE}/{doc}")
+
+
 def unlock_address_process(network: str, idx: int, delay: float) -> None:
     """
     Check the binary state of the gateway addresses.
@@ -90,9 +231,10 @@ def unlock_address_process(network: str, idx: int, delay: float) -> None:
     """
     time.sleep(delay)
     doc = f"{network}_gateway_state.txt"
-    gateway_state = json_ipc(doc=doc)
-    gateway_state[idx] = 1
-    json_ipc(doc=doc, text=json_dumps(gateway_state))
+    with GATEWAY_STATE_LOCK:
+        gateway_state = json_ipc(doc=doc)
+        gateway_state[idx] = 1
+        json_ipc(doc=doc, text=json_dumps(gateway_state))
 
 
 def unlock_address(network: str, idx: int, delay: float) -> None:
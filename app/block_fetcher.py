@@ -0,0 +1,207 @@
+r"""
+block_fetcher.py
+ ╔═══════════════════════════╗
+ ║ ╦═╗╦╔╦╗╔═╗╦ ╦╔═╗╦═╗╔═╗╔═╗ ║
+ ║ ╠═╣║ ║ ╚═╗╠═╣╠═╣╠╦╝╠═ ╚═╗ ║
+ ║ ╩═╝╩ ╩ ╚═╝╩ ╩╩ ╩╩╚═╚═╝╚═╝ ║
+ ║   ╔═╗╔═╗╔╦╗╔═╗╦ ╦╔═╗╦ ╦   ║
+ ║   ║ ╦╠═╣ ║ ╠═ ║║║╠═╣╚╦╝   ║
+ ║   ╚═╝╩ ╩ ╩ ╚═╝╚╩╝╩ ╩ ╩    ║
+ ║╔═╗ _                 _ ┌─┐║
+ ║╚═╝  \               /  └─┘║
+ ║╔═╗ _ \             / _ ┌─┐║
+ ║╚═╝  \  ╔═╗ ---> ┌─┐ /  └─┘║
+ ║╔═╗ _/  ╚═╝ <--- └─┘ \_ ┌─┐║
+ ║╚═╝   /             \   └─┘║
+ ║╔═╗ _/               \_ ┌─┐║
+ ║╚═╝                     └─┘║
+ ╚═══════════════════════════╝
+WTFPL litepresence.com Jan 2024
+
+Bounded concurrent block fetcher for http json block sources
+
+    a fixed pool of worker threads; keep alive sessions are node_pool's
+    every http request has a timeout; every item may have a deadline
+    failed requests are retried with jittered exponential backoff
+    the node's Retry-After is respected; node_pool enforces any rate limit
+    results are yielded in request order as soon as each is complete
+
+Extraction helpers for large block payloads
+
+    a raw bytes scan for watched names skips decoding most blocks entirely
+    an object_pairs_hook drops bulky fields while decoding the remainder
+"""
+
+# STANDARD MODULES
+import time
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from random import random
+from threading import Lock
+from typing import Any, Callable, Dict, Iterable, Iterator, List, Optional, Set, Tuple
+
+# BITSHARES GATEWAY MODULES
+from config import parachain_params, timing
+
+# GLOBAL CONSTANTS
+FETCHERS: Dict[str, "BlockFetcher"] = {}
+FETCHERS_LOCK = Lock()
+
+
+class BlockFetcher:
+    """
+    A small fixed thread and socket budget for following a busy chain
+    """
+
+    def __init__(
+        self,
+        name: str,
+        workers: int = 8,
+        timeout: float = 5,
+        deadline: Optional[float] = None,
+        backoff: float = 0.1,
+        backoff_cap: float = 5,
+    ) -> None:
+        """
+        :param name: label for log messages, usually the network
+        :param workers: concurrent requests at most
+        :param timeout: seconds allowed for each http request
+        :param deadline: seconds allowed per item over all retries; None retries forever
+        :param backoff: seconds before the first retry
+        :param backoff_cap: longest pause between retries
+        """
+        self.name = name
+        self.workers = workers
+        self.timeout = timeout
+        self.deadline = deadline
+        self.backoff = backoff
+        self.backoff_cap = backoff_cap
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix=f"{name}_fetch")
+
+    def attempt(self, request: Callable[[Any, float], Any], item: Any) -> Any:
+        """
+        Call request(item, timeout) until it returns, backing off on failure.
+
+        :param request: callable making one http request and returning the parsed result
+        :param item: the block number or other request key
+        :return: the parsed result
+        :raise TimeoutError: if the item deadline passes
+        """
+        start = time.time()
+        iteration = 0
+        while True:
+            retry_after = 0.0
+            try:
+                return request(item, self.timeout)
+            except Exception as error:
+                print(f"{self.name} fetch {item} failed {error.args}")
+                retry_after = self.retry_after(error)
+            if self.deadline is not None and time.time() - start > self.deadline:
+                raise TimeoutError(f"{self.name} fetch {item} deadline exceeded")
+            # full jitter keeps retrying workers from hitting the node in lockstep
+            pause = min(self.backoff_cap, self.backoff * 2**iteration)
+            time.sleep(max(retry_after, pause * random()))
+            iteration += 1
+
+    @staticmethod
+    def retry_after(error: Exception) -> float:
+        """
+        Seconds the node asked us to wait, from a 429 or 503 Retry-After header.
+
+        :param error: the exception raised by the request
+        :return: seconds to wait, zero if the node did not say
+        """
+        response = getattr(error, "response", None)
+        if response is None or response.status_code not in [429, 503]:
+            return 0.0
+        try:
+            return float(response.headers.get("Retry-After", 1))
+        except ValueError:
+            return 1.0
+
+    def fetch(
+        self, request: Callable[[Any, float], Any], items: Iterable[Any]
+    ) -> Iterator[Tuple[Any, Any]]:
+        """
+        Fetch every item concurrently; yield (item, result) in item order.
+
+        At most twice the worker count are in flight or awaiting delivery,
+        so a long catch up does not hold every block in memory at once.
+
+        :param request: callable making one http request and returning the parsed result
+        :param items: block numbers or other request keys
+        :return: iterator of (item, result)
+        """
+        items = iter(items)
+        pending = deque()
+        for item in items:
+            pending.append((item, self.executor.submit(self.attempt, request, item)))
+            if len(pending) >= 2 * self.workers:
+                break
+        while pending:
+            item, future = pending.popleft()
+            result = future.result()
+            for following in items:
+                pending.append(
+                    (following, self.executor.submit(self.attempt, request, following))
+                )
+                break
+            yield item, result
+
+
+def needles(watch: Optional[Set[str]], default: bytes) -> List[bytes]:
+    """
+    The byte strings a raw payload must contain to be worth decoding.
+
+    :param watch: watched addresses or accounts; None if unfiltered
+    :param default: json fragment every relevant payload contains, eg. b'"Payment"'
+    :return: list of byte strings; an empty list matches nothing
+    """
+    if watch is None:
+        return [default]
+    return [str(name).encode() for name in watch]
+
+
+def mentions(raw: bytes, wanted: List[bytes]) -> bool:
+    """
+    A fast scan of the undecoded payload for any wanted byte string.
+
+    :param raw: the http response body
+    :param wanted: from needles()
+    :return: True if the payload may contain a relevant transfer
+    """
+    return any(needle in raw for needle in wanted)
+
+
+def pruning_hook(drop: Set[str]) -> Callable[[List[Tuple[str, Any]]], Dict]:
+    """
+    Build a json object_pairs_hook which discards bulky unused fields.
+
+    :param drop: keys to discard from every decoded object
+    :return: the hook
+    """
+
+    def hook(pairs: List[Tuple[str, Any]]) -> Dict:
+        return {key: value for key, value in pairs if key not in drop}
+
+    return hook
+
+
+def fetcher(network: str) -> BlockFetcher:
+    """
+    Return this process's fetcher for the network, creating it on first use.
+
+    parachain_params()[network] may set "workers";
+    timing()[network]["request"] is the per request timeout
+
+    :param network: the network to fetch from
+    :return: the BlockFetcher
+    """
+    with FETCHERS_LOCK:
+        if network not in FETCHERS:
+            FETCHERS[network] = BlockFetcher(
+                network,
+                workers=parachain_params()[network].get("workers", 8),
+                timeout=timing()[network]["request"],
+            )
+        return FETCHERS[network]
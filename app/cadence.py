@@ -0,0 +1,140 @@
+r"""
+cadence.py
+ ╔═══════════════════════════╗
+ ║ ╦═╗╦╔╦╗╔═╗╦ ╦╔═╗╦═╗╔═╗╔═╗ ║
+ ║ ╠═╣║ ║ ╚═╗╠═╣╠═╣╠╦╝╠═ ╚═╗ ║
+ ║ ╩═╝╩ ╩ ╚═╝╩ ╩╩ ╩╩╚═╚═╝╚═╝ ║
+ ║   ╔═╗╔═╗╔╦╗╔═╗╦ ╦╔═╗╦ ╦   ║
+ ║   ║ ╦╠═╣ ║ ╠═ ║║║╠═╣╚╦╝   ║
+ ║   ╚═╝╩ ╩ ╩ ╚═╝╚╩╝╩ ╩ ╩    ║
+ ║╔═╗ _                 _ ┌─┐║
+ ║╚═╝  \               /  └─┘║
+ ║╔═╗ _ \             / _ ┌─┐║
+ ║╚═╝  \  ╔═╗ ---> ┌─┐ /  └─┘║
+ ║╔═╗ _/  ╚═╝ <--- └─┘ \_ ┌─┐║
+ ║╚═╝   /             \   └─┘║
+ ║╔═╗ _/               \_ ┌─┐║
+ ║╚═╝                     └─┘║
+ ╚═══════════════════════════╝
+WTFPL litepresence.com Jan 2024
+
+Adaptive polling cadence for a parachain
+
+    learns the chain's inter block time online as an exponentially weighted
+    mean and deviation of observed tip arrivals
+    schedules the next poll just after the next block is expected
+    backs off exponentially while polls find nothing new
+    polls at the floor while catching up, eg. several blocks behind
+"""
+
+# STANDARD MODULES
+import time
+from typing import Dict, Optional
+
+# GLOBAL CONSTANTS
+# weight of the newest inter block time in the moving averages
+ALPHA = 0.2
+
+
+class Cadence:
+    """
+    When to next ask a node for its tip, given when the tip last moved
+    """
+
+    def __init__(self, pause: float, floor: float, ceiling: float) -> None:
+        """
+        :param pause: seconds between polls until a block time is learned
+        :param floor: the shortest pause
+        :param ceiling: the longest pause
+        """
+        self.pause = pause
+        self.floor = floor
+        self.ceiling = ceiling
+        self.mean: Optional[float] = None
+        self.deviation = 0.0
+        self.height: Optional[int] = None
+        self.arrival = 0.0
+        self.misses = 0
+        self.behind = False
+
+    def observe(self, height: int, now: Optional[float] = None) -> None:
+        """
+        Record a poll result.
+
+        :param height: the tip height the node returned
+        :param now: unix time of the poll, default now
+        """
+        now = time.time() if now is None else now
+        if self.height is None:
+            self.height, self.arrival = height, now
+            return
+        if height <= self.height:
+            self.misses += 1
+            return
+        blocks = height - self.height
+        interval = (now - self.arrival) / blocks
+        if self.mean is None:
+            self.mean = interval
+        else:
+            error = interval - self.mean
+            self.mean += ALPHA * error
+            self.deviation += ALPHA * (abs(error) - self.deviation)
+        # more than one new block on a poll timed for one; we have fallen behind
+        self.behind = blocks > 1
+        self.height = height
+        self.arrival = now
+        self.misses = 0
+
+    def next_pause(self, now: Optional[float] = None) -> float:
+        """
+        :param now: unix time, default now
+        :return: seconds to wait before the next poll
+        """
+        now = time.time() if now is None else now
+        if self.behind:
+            pause = self.floor
+        elif self.mean is None:
+            pause = self.pause
+        elif self.misses:
+            # the block is late; retry soon, then ever less often
+            pause = self.floor * 2**self.misses
+        else:
+            # just after the next block is expected to arrive
+            expected = self.arrival + self.mean + self.deviation
+            pause = expected - now
+        return min(self.ceiling, max(self.floor, pause))
+
+    def report(self) -> Dict[str, Optional[float]]:
+        """
+        :return: the live cadence, for the parachain status file
+        """
+        return {
+            "pause": round(self.next_pause(), 3),
+            "block_time": None if self.mean is None else round(self.mean, 3),
+            "deviation": round(self.deviation, 3),
+            "misses": self.misses,
+            "behind": self.behind,
+        }
+
+
+def unit_test() -> None:
+    """
+    A 2 second chain, then a stall, then a burst of 5 blocks.
+    """
+    cadence = Cadence(pause=6, floor=0.25, ceiling=30)
+    now, height = 1000.0, 100
+    for _ in range(20):
+        cadence.observe(height, now)
+        now += 2
+        height += 1
+    print("learned", cadence.report())
+    for _ in range(4):
+        cadence.observe(height - 1, now)
+        print("stalled", cadence.next_pause(now))
+        now += cadence.next_pause(now)
+    cadence.observe(height + 4, now)
+    print("burst", cadence.report())
+
+
+if __name__ == "__main__":
+    unit_test()
@@ -20,7 +20,7 @@ WTFPL litepresence.com Jan 2021
 """
 
 # BITSHARES GATEWAY MODULES
-from nodes import bitcoin_node, litecoin_node
+from node_pool import node_pool
 
 # THIRD PARTY MODULES
 from signing.bitcoin.bitcoinrpc.authproxy import AuthServiceProxy
@@ -38,9 +38,8 @@ def create_ltcbtc_accounts(number: int, network: str) -> None:
 
     for i in range(number):
         if network == "ltc":
-            access = AuthServiceProxy(
-                litecoin_node()[0] + "/wallet/" + litecoin_node()[1]
-            )
+            # wallets live on the primary node
+            access = AuthServiceProxy("/wallet/".join(node_pool("ltc").primary))
             public = access.getaddressinfo(access.getnewaddress())["embedded"][
                 "address"
             ]
@@ -50,9 +49,8 @@ def create_ltcbtc_accounts(number: int, network: str) -> None:
             print('"private":', '"' + private + '",', "\n")
 
         elif network == "btc":
-            access = AuthServiceProxy(
-                bitcoin_node()[0] + "/wallet/" + bitcoin_node()[1]
-            )
+            # wallets live on the primary node
+            access = AuthServiceProxy("/wallet/".join(node_pool("btc").primary))
             public = access.getnewaddress("", "legacy")
             private = access.dumpprivkey(public)
             print("BTC", i + 1)
@@ -31,11 +31,18 @@ import time
 import traceback
 from json import dumps as json_dumps
 from json import loads as json_loads
+from queue import Queue
 from sqlite3 import connect as sql
+from threading import Lock, Thread
 
 # BITSHARES GATEWAY MODULES
 from config import DB_PATH
 
+# GLOBAL CONSTANTS
+AUDIT_QUEUE = Queue()
+AUDIT_LOCK = Lock()
+AUDIT_THREAD = []
+
 
 def chronicle(comptroller, msg=None):
     """
@@ -81,6 +88,32 @@ def chronicle(comptroller, msg=None):
         relational(comptroller)
 
 
+def chronicle_worker():
+    """
+    drain the audit queue in the background, one chronicle event at a time
+    """
+    while True:
+        comptroller, msg = AUDIT_QUEUE.get()
+        try:
+            chronicle(comptroller, msg)
+        except Exception:
+            print("chronicle_worker failed\n", traceback.format_exc())
+
+
+def chronicle_later(comptroller, msg=None):
+    """
+    queue this comptroller event for auditing by a background thread
+
+    use on latency sensitive paths, eg. the deposit server on_get,
+    the comptroller is copied so the caller may continue to modify it
+    """
+    with AUDIT_LOCK:
+        if not AUDIT_THREAD:
+            AUDIT_THREAD.append(Thread(target=chronicle_worker, daemon=True))
+            AUDIT_THREAD[0].start()
+    AUDIT_QUEUE.put((dict(comptroller), msg))
+
+
 def relational(comptroller):
     """
     Log comptroller events for auditing purposes to relational sql.
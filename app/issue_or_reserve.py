@@ -24,10 +24,12 @@ issue or reserve called by the chain specific listeners
 from typing import Any, Dict, Optional
 
 # BITSHARES GATEWAY MODULES
-from config import gateway_assets, nil
+from config import gateway_assets, nil, processes
 from ipc_utilities import chronicle
+from parachain_transfer import PRECISION
 from signing.bitshares.graphene_auth import issue, reserve
-from utilities import it, roughly
+from signing.bitshares.money import Amount
+from utilities import it
 
 
 def issue_or_reserve(comptroller: Dict[str, Any]) -> Dict[str, Any]:
@@ -52,7 +54,11 @@ def issue_or_reserve(comptroller: Dict[str, Any]) -> Dict[str, Any]:
     memo_check: bool = comptroller["memo_check"]
     listening_to: str = comptroller["listening_to"]
     issuer_action: Optional[str] = comptroller["issuer_action"]
-    withdrawal_amount: Optional[float] = comptroller["withdrawal_amount"]
+    trx_units: int = comptroller["trx_units"]
+    withdrawal_units: Optional[int] = comptroller["withdrawal_units"]
+    # the exact fixed point amount heard, and nil, at this network's precision
+    amount = Amount(trx_units, PRECISION[network])
+    nil_amount = Amount.parse(nil()[network], PRECISION[network])
 
     # If the transaction is to the address we're listening to
     if listening_to == trx_to:
@@ -63,7 +69,7 @@ def issue_or_reserve(comptroller: Dict[str, Any]) -> Dict[str, Any]:
             print(msg)
 
         # Chronicle nil deposits but do not issue or reserve
-        if 0 < trx_amount <= nil()[network]:
+        if 0 < trx_units <= nil_amount.units:
             msg: str = "Received nil amount"
             chronicle(comptroller, msg)
             print(msg)
@@ -71,7 +77,7 @@ def issue_or_reserve(comptroller: Dict[str, Any]) -> Dict[str, Any]:
                 print(comptroller)
 
         # Process deposits greater than nil
-        if trx_amount > nil()[network]:
+        if trx_units > nil_amount.units:
             print(
                 f"Nonce {nonce}",
                 it("red", f"{direction} {network.upper()}"),
@@ -82,24 +88,39 @@ def issue_or_reserve(comptroller: Dict[str, Any]) -> Dict[str, Any]:
             # Client has deposited foreign tokens, issue an equal amount of UIA
             if issuer_action == "issue" and memo_check:
                 msg: str = (
-                    f'Nonce {nonce} {it("red", f"ISSUING {trx_amount}")} {client_id}, {uia},'
+                    f'Nonce {nonce} {it("red", f"ISSUING {amount}")} {client_id}, {uia},'
                     f" {uia_id}, {network}"
                 )
                 print(msg)
-                issue(gateway_assets()[network], trx_amount, client_id)
+                receipt = issue(
+                    gateway_assets()[network],
+                    amount,
+                    client_id,
+                    processes().get("signing_service", False),
+                )
+                # the graphene transaction, perhaps shared with other deposits
+                comptroller["graphene_tx_id"] = receipt["tx_id"]
+                comptroller["graphene_batch"] = receipt["batch"]
                 # Signal to break the while loop
                 comptroller["complete"] = True
                 chronicle(comptroller, str(msg))
 
             # Parent process is sending funds to the client,
-            # reserve the UIA upon hearing proof of transfer
-            elif issuer_action == "reserve" and roughly(trx_amount, withdrawal_amount):
+            # reserve the UIA upon hearing proof of transfer of the exact base units
+            elif issuer_action == "reserve" and trx_units == withdrawal_units:
                 msg: str = (
-                    f'Nonce {nonce} {it("red", f"RESERVING {trx_amount}")} {client_id}, {uia},'
+                    f'Nonce {nonce} {it("red", f"RESERVING {amount}")} {client_id}, {uia},'
                     f" {uia_id}, {network}"
                 )
                 print(msg)
-                reserve(gateway_assets()[network], trx_amount)
+                receipt = reserve(
+                    gateway_assets()[network],
+                    amount,
+                    processes().get("signing_service", False),
+                )
+                # the graphene transaction, perhaps shared with other withdrawals
+                comptroller["graphene_tx_id"] = receipt["tx_id"]
+                comptroller["graphene_batch"] = receipt["batch"]
                 # Signal to break the while loop
                 comptroller["complete"] = True
                 chronicle(comptroller, str(msg))
@@ -21,9 +21,9 @@ WTFPL litepresence.com Jan 2021
 Standarized Transaction Listener Boilerplate for All Blockchains
 
 called by process_withdrawals.py and process_deposits.py
-    initializes a foreign chain listening while loop
-    imports chain specific block processing to await for a specific transfer
-    finalizes the gateway transaction by issuing or reserving UIA
+    initializes the audit trail for a foreign chain listener
+    registers it with the network dispatcher to await a specific transfer
+    the dispatcher finalizes by issuing or reserving UIA
 """
 
 # DISABLE SELECT PYLINT TESTS
@@ -36,15 +36,13 @@ from pprint import pprint
 from typing import Any, Dict
 
 # BITSHARES GATEWAY MODULES
-from address_allocator import unlock_address
-from config import foreign_accounts, gateway_assets, parachain_params, timing
-from ipc_utilities import chronicle, json_ipc
-from issue_or_reserve import issue_or_reserve
+from config import foreign_accounts, gateway_assets
+from listener_dispatcher import Expectation, dispatcher
 from parachain_eosio import verify_eosio_account
 from parachain_ltcbtc import verify_ltcbtc_account
 from parachain_ripple import verify_ripple_account
+from parachain_transfer import to_units
 from parachain_xyz import verify_xyz_account
-from utilities import it, precisely, xterm
 
 
 def verifier_specific(network: str) -> Any:
@@ -59,10 +57,10 @@ def verifier_specific(network: str) -> Any:
     return dispatch[network]
 
 
-def listener_boilerplate(comptroller: Dict[str, Any]) -> None:
+def listener_boilerplate(comptroller: Dict[str, Any]) -> Expectation:
     """
-    For every block from initialized until detected:
-    Check for a transaction to the gateway, issue or reserve UIA upon receipt of gateway transfer.
+    Register a listener for a transaction to or from the gateway;
+    the network dispatcher will issue or reserve UIA upon receipt of gateway transfer.
 
     :dict(comproller) contains full audit trail and these pertinent keys:
       :key int(account_idx) # from gateway_state.py
@@ -71,15 +69,13 @@ def listener_boilerplate(comptroller: Dict[str, Any]) -> None:
       :key int(nonce) # the millesecond label for this listening event
 
     for reserving withdrawals two additional comptroller keys are available:
-      :key float(withdrawal_amount)
+      :key str(withdrawal_amount) # exact decimal string
+      :key int(withdrawal_units) # the amount in foreign chain base units
       :key str(client_address)
 
-    :return None
+    :return Expectation; its done Event is set on completion or timeout
     """
-    color = xterm()
-    start = time.time()
     # Localizing the comptroller values
-    memo = comptroller["memo"]
     nonce = comptroller["nonce"]
     network = comptroller["network"]
     account_idx = comptroller["account_idx"]
@@ -97,6 +93,7 @@ def listener_boilerplate(comptroller: Dict[str, Any]) -> None:
         direction = "incoming deposit"
         client_address = None  # not applicable to deposits
         withdrawal_amount = None  # not applicable to deposits
+        withdrawal_units = None
         listening_to = gateway_address
     elif issuer_action == "reserve":
         # Reserving uia to cover withdrawal of foreign tokens
@@ -105,6 +102,7 @@ def listener_boilerplate(comptroller: Dict[str, Any]) -> None:
         direction = "outgoing withdrawal"
         client_address = comptroller["client_address"]
         withdrawal_amount = comptroller["withdrawal_amount"]
+        withdrawal_units = to_units(withdrawal_amount, network)
         listening_to = client_address
     else:
         # For unit testing issuer action is None
@@ -112,102 +110,30 @@ def listener_boilerplate(comptroller: Dict[str, Any]) -> None:
         direction = None
         client_address = None
         withdrawal_amount = None
+        withdrawal_units = None
         listening_to = foreign_accounts()[network][0]["public"]
-    # Initialize the block counter
-    parachain = json_ipc(f"parachain_{network}.txt")
-    parachain_keys = [int(x) for x in list(parachain.keys())]
-    start_block_num = max(parachain_keys)
-    checked_blocks = [start_block_num]
     # Update the audit trail
     comptroller["uia"] = uia
     comptroller["uia_id"] = uia_id
-    comptroller["complete"] = False  # signal to break the while loop
+    comptroller["complete"] = False  # signal to stop listening
     comptroller["direction"] = direction
     comptroller["listening_to"] = listening_to
     comptroller["client_address"] = client_address
     comptroller["gateway_address"] = gateway_address
-    comptroller["start_block_num"] = start_block_num
     comptroller["withdrawal_amount"] = withdrawal_amount
-    print("Start Block:", start_block_num, "NONCE", nonce, "LISTENING TO", listening_to)
-    # Iterate through irreversible block data
-    while 1:
-        # Limit parachain read frequency
-        time.sleep(parachain_params()[network]["pause"])
-        # if issue/reserve has signaled to break the while loop
-        if comptroller["complete"]:
-            break
-        # After timeout, break the while loop; if deposit, release the address
-        elapsed = time.time() - start
-        if elapsed > timing()[network]["timeout"]:
-            print(it("red", f"NONCE {memo} {network.upper()} GATEWAY TIMEOUT"))
-            if issuer_action == "issue":
-                if network not in ["eos", "xrp"]:
-                    unlock_address(network, account_idx, timing()[network]["pause"])
-            msg = "listener timeout"
-            chronicle(comptroller, msg)
-            break
-        # Otherwise, get the latest block number from the parachain
-        parachain = json_ipc(f"parachain_{network}.txt")
-        parachain_keys = [int(x) for x in list(parachain.keys())]
-        current_block_num = max(parachain_keys)
-        # Get the maximum block number we have checked
-        max_checked_block = max(checked_blocks)
-        # If there are any new blocks
-        if current_block_num > max_checked_block + 1:
-            # announce every block from last checked till now
-            new_blocks = [*range(max_checked_block + 1, current_block_num)]
-            # announce the latest blocks
-            str_also = ""
-            if len(new_blocks) > 1:
-                min_new = str(min(new_blocks[:-1]))
-                max_new = str(max(new_blocks[:-1]))
-                str_also = "[" + min_new + " ... " + max_new + "]"
-            print(
-                it(color, comptroller["event_id"]),
-                it(color, f"{memo} {nonce}"),
-                it("yellow", f"{network}".upper()),
-                it(color, "BLOCK"),
-                it("yellow", max(new_blocks)),
-                it(color, time.ctime()[11:19]),
-                it(color, "GATE"),
-                it("yellow", account_idx),
-                it(color, str_also),
-            )
-            # With a new cache of blocks, check every block from last check till now
-            for block_num in new_blocks:
-                if block_num not in checked_blocks:
-                    checked_blocks.append(block_num)
-                try:
-                    transfers = parachain[str(block_num)]
-                except Exception:
-                    transfers = []
-                    msg = f"missing block data for {block_num}"
-                    # FIXME fallback mechanism?
-                    chronicle(comptroller, msg)
-                for transfer in transfers:
-                    # Extract the transaction data
-                    trx_to = transfer["to"]
-                    trx_hash = transfer["hash"]
-                    trx_memo = transfer["memo"]
-                    trx_from = transfer["from"]
-                    trx_amount = transfer["amount"]
-                    # Test the memo on pertinent network deposits
-                    memo_check = True
-                    if issuer_action == "issue" and network in ["eos", "xrp"]:
-                        memo_check = bool(memo == trx_memo)
-                    # Update the audit trail
-                    comptroller["trx_to"] = trx_to
-                    comptroller["elapsed"] = elapsed
-                    comptroller["trx_hash"] = trx_hash
-                    comptroller["trx_memo"] = trx_memo
-                    comptroller["trx_from"] = trx_from
-                    comptroller["trx_block"] = block_num
-                    comptroller["str_amount"] = precisely(trx_amount, 8)
-                    comptroller["trx_amount"] = trx_amount
-                    comptroller["memo_check"] = memo_check
-                    comptroller["current_block"] = current_block_num
-                    # Issue or reserve and return the modified audit trail
-                    comptroller = issue_or_reserve(comptroller)
+    comptroller["withdrawal_units"] = withdrawal_units
+    # Register with this process's dispatcher, which reads each block once
+    # and only hands transfers matching this listener to issue_or_reserve
+    expectation = dispatcher(network).register(comptroller)
+    print(
+        "Start Block:",
+        comptroller["start_block_num"],
+        "NONCE",
+        nonce,
+        "LISTENING TO",
+        listening_to,
+    )
+    return expectation
 
 
 def main() -> None:
@@ -258,7 +184,7 @@ def main() -> None:
     )
     print(f"\n{network.upper()} Transaction Listener\n============================")
     # Unit test the listener
-    listener_boilerplate(comptroller)
+    listener_boilerplate(comptroller).done.wait()
 
 
 if __name__ == "__main__":
@@ -0,0 +1,304 @@
+r"""
+listener_dispatcher.py
+ ╔═══════════════════════════╗
+ ║ ╦═╗╦╔╦╗╔═╗╦ ╦╔═╗╦═╗╔═╗╔═╗ ║
+ ║ ╠═╣║ ║ ╚═╗╠═╣╠═╣╠╦╝╠═ ╚═╗ ║
+ ║ ╩═╝╩ ╩ ╚═╝╩ ╩╩ ╩╩╚═╚═╝╚═╝ ║
+ ║   ╔═╗╔═╗╔╦╗╔═╗╦ ╦╔═╗╦ ╦   ║
+ ║   ║ ╦╠═╣ ║ ╠═ ║║║╠═╣╚╦╝   ║
+ ║   ╚═╝╩ ╩ ╩ ╚═╝╚╩╝╩ ╩ ╩    ║
+ ║╔═╗ _                 _ ┌─┐║
+ ║╚═╝  \               /  └─┘║
+ ║╔═╗ _ \             / _ ┌─┐║
+ ║╚═╝  \  ╔═╗ ---> ┌─┐ /  └─┘║
+ ║╔═╗ _/  ╚═╝ <--- └─┘ \_ ┌─┐║
+ ║╚═╝   /             \   └─┘║
+ ║╔═╗ _/               \_ ┌─┐║
+ ║╚═╝                     └─┘║
+ ╚═══════════════════════════╝
+WTFPL litepresence.com Jan 2024
+
+Central parachain dispatcher; one per network per process
+
+    each pending deposit or withdrawal registers an expectation
+    the dispatcher reads every new parachain block exactly once
+    each transfer is looked up in a hash index of pending expectations
+    only matching transfers are handed to issue_or_reserve
+    the index keys are published so the parachain writer can filter too
+
+index keys are (listening_to, memo):
+    BTC/LTC deposits        (gateway deposit address, "")
+    XRP/EOS deposits        (gateway account, required memo)
+    reserves                (client address, ""); amount checked by issue_or_reserve
+"""
+
+# DISABLE SELECT PYLINT TESTS
+# pylint: disable=broad-except, too-many-instance-attributes
+
+# STANDARD MODULES
+import time
+import traceback
+from threading import Event, Lock, Thread
+from typing import Any, Dict, List, Optional, Tuple
+
+# BITSHARES GATEWAY MODULES
+from address_allocator import publish_watchlist, release_lease, unlock_address
+from config import parachain_params, timing
+from ipc_utilities import chronicle, json_ipc
+from issue_or_reserve import issue_or_reserve
+from parachain_transfer import Transfer
+from parachain_window import ParachainWindow
+from utilities import it
+
+# GLOBAL CONSTANTS
+DISPATCHERS: Dict[str, "ListenerDispatcher"] = {}
+DISPATCHERS_LOCK = Lock()
+
+
+def expectation_key(comptroller: Dict[str, Any]) -> Tuple[str, str]:
+    """
+    Build the index key for a pending listener.
+
+    :param comptroller: audit dictionary with listening_to and issuer_action set
+    :return: (address, memo) where memo is "" unless the network uses memos
+    """
+    memo = ""
+    if comptroller["issuer_action"] == "issue" and comptroller["network"] in [
+        "eos",
+        "xrp",
+    ]:
+        memo = str(comptroller["memo"])
+    return (str(comptroller["listening_to"]), memo)
+
+
+def transfer_keys(transfer: Transfer) -> Tuple[Tuple[str, str], ...]:
+    """
+    The index keys a parachain transfer could satisfy.
+
+    :param transfer: parachain Transfer
+    :return: the memo specific key and the address only key
+    """
+    trx_to = transfer.to
+    trx_memo = transfer.memo
+    if trx_memo:
+        return ((trx_to, trx_memo), (trx_to, ""))
+    return ((trx_to, ""),)
+
+
+class Expectation:
+    """
+    A single pending listener; the comptroller plus dispatcher bookkeeping
+    """
+
+    __slots__ = ("comptroller", "key", "start", "timeout", "lock", "done")
+
+    def __init__(self, comptroller: Dict[str, Any]) -> None:
+        self.comptroller = comptroller
+        self.key = expectation_key(comptroller)
+        self.start = time.time()
+        self.timeout = timing()[comptroller["network"]]["timeout"]
+        # serialize issue_or_reserve calls for this listener
+        self.lock = Lock()
+        # set once the listener has completed or timed out
+        self.done = Event()
+
+
+class ListenerDispatcher:
+    """
+    Read each new parachain block once and route matching transfers
+    """
+
+    def __init__(self, network: str) -> None:
+        self.network = network
+        self.index: Dict[Tuple[str, str], List[Expectation]] = {}
+        self.lock = Lock()
+        self.last_block = latest_block(network)
+        self.thread = Thread(target=self.run, daemon=True)
+
+    def register(self, comptroller: Dict[str, Any]) -> Expectation:
+        """
+        Add a listener to the index; blocks after the current height are checked.
+
+        :param comptroller: audit dictionary prepared by listener_boilerplate
+        :return: the registered Expectation
+        """
+        expectation = Expectation(comptroller)
+        with self.lock:
+            comptroller["start_block_num"] = self.last_block
+            self.index.setdefault(expectation.key, []).append(expectation)
+            # the parachain writer must know of this key before the address is offered
+            publish_watchlist(self.network, self.index.keys())
+        return expectation
+
+    def unregister(self, expectation: Expectation) -> None:
+        """
+        Remove a listener from the index and signal anyone waiting on it.
+
+        :param expectation: previously registered Expectation
+        """
+        with self.lock:
+            bucket = self.index.get(expectation.key, [])
+            if expectation in bucket:
+                bucket.remove(expectation)
+            if not bucket:
+                self.index.pop(expectation.key, None)
+                publish_watchlist(self.network, self.index.keys())
+        comptroller = expectation.comptroller
+        if comptroller["issuer_action"] == "issue":
+            # let the client request a fresh deposit address
+            release_lease(comptroller["client_id"], self.network, comptroller["nonce"])
+        expectation.done.set()
+
+    def pending(self) -> int:
+        """
+        :return: the number of listeners awaiting a transfer
+        """
+        with self.lock:
+            return sum(len(bucket) for bucket in self.index.values())
+
+    def expire(self) -> None:
+        """
+        Time out stale listeners; if deposit, release the address.
+        """
+        now = time.time()
+        with self.lock:
+            expired = [
+                expectation
+                for bucket in self.index.values()
+                for expectation in bucket
+                if now - expectation.start > expectation.timeout
+            ]
+        for expectation in expired:
+            comptroller = expectation.comptroller
+            network = comptroller["network"]
+            memo = comptroller["memo"]
+            print(it("red", f"NONCE {memo} {network.upper()} GATEWAY TIMEOUT"))
+            if comptroller["issuer_action"] == "issue":
+                if network not in ["eos", "xrp"]:
+                    unlock_address(
+                        network, comptroller["account_idx"], timing()[network]["pause"]
+                    )
+            self.unregister(expectation)
+            chronicle(comptroller, "listener timeout")
+
+    def settle(
+        self, expectation: Expectation, transfer: Transfer, block_num: int
+    ) -> None:
+        """
+        Hand a matching transfer to issue_or_reserve in its own thread.
+
+        :param expectation: the matched listener
+        :param transfer: the matching parachain transfer
+        :param block_num: the block the transfer was found in
+        """
+        with expectation.lock:
+            comptroller = expectation.comptroller
+            if comptroller["complete"]:
+                return
+            # Update the audit trail
+            comptroller["trx_to"] = transfer.to
+            comptroller["elapsed"] = time.time() - expectation.start
+            comptroller["trx_hash"] = transfer.hash
+            comptroller["trx_memo"] = transfer.memo
+            comptroller["trx_from"] = transfer.sender
+            comptroller["trx_block"] = block_num
+            comptroller["str_amount"] = transfer.decimal()
+            # a float for the audit trail only; amounts are decided in units
+            comptroller["trx_amount"] = float(transfer.amount)
+            comptroller["trx_units"] = transfer.units
+            comptroller["memo_check"] = True
+            comptroller["current_block"] = self.last_block
+            # Issue or reserve and return the modified audit trail
+            try:
+                expectation.comptroller = issue_or_reserve(comptroller)
+            except Exception:
+                print(it("red", "issue_or_reserve failed"), traceback.format_exc())
+            if expectation.comptroller["complete"]:
+                self.unregister(expectation)
+
+    def dispatch(self, parachain: Dict[str, Any]) -> None:
+        """
+        Check every transfer in every block newer than the last dispatched.
+
+        :param parachain: the windowed parachain as read from the pipe
+        """
+        window = ParachainWindow.from_json(parachain)
+        # the newest block is checked on the next pass, as the listeners always have
+        new_blocks = [
+            (height, transfers)
+            for height, transfers in window.since(self.last_block)
+            if height < window.latest
+        ]
+        if not new_blocks:
+            return
+        matches = []
+        with self.lock:
+            for block_num, transfers in new_blocks:
+                for transfer in transfers:
+                    for key in transfer_keys(transfer):
+                        for expectation in self.index.get(key, []):
+                            matches.append((expectation, transfer, block_num))
+            self.last_block = new_blocks[-1][0]
+        print(
+            it("yellow", self.network.upper()),
+            it(45, "BLOCK"),
+            it("yellow", self.last_block),
+            it(45, time.ctime()[11:19]),
+            it(45, f"PENDING {self.pending()} MATCHED {len(matches)}"),
+        )
+        for expectation, transfer, block_num in matches:
+            Thread(target=self.settle, args=(expectation, transfer, block_num)).start()
+
+    def run(self) -> None:
+        """
+        Forever: expire stale listeners then dispatch any new parachain blocks.
+        """
+        while True:
+            # Limit parachain read frequency
+            time.sleep(parachain_params()[self.network]["pause"])
+            try:
+                self.expire()
+                parachain = json_ipc(f"parachain_{self.network}.txt")
+                if parachain:
+                    self.dispatch(parachain)
+            except Exception:
+                print(
+                    it("red", f"{self.network.upper()} DISPATCHER"),
+                    traceback.format_exc(),
+                )
+
+
+def latest_block(network: str) -> int:
+    """
+    :param network: the network whose parachain to read
+    :return: the highest block number in the parachain, or zero if there is none
+    """
+    return ParachainWindow.load(network).latest or 0
+
+
+def dispatcher(network: str) -> ListenerDispatcher:
+    """
+    Return this process's dispatcher for the network, starting it on first use.
+
+    :param network: the network to listen to
+    :return: the running ListenerDispatcher
+    """
+    with DISPATCHERS_LOCK:
+        if network not in DISPATCHERS:
+            DISPATCHERS[network] = ListenerDispatcher(network)
+            DISPATCHERS[network].thread.start()
+        return DISPATCHERS[network]
+
+
+def unit_test_dispatcher(network: Optional[str] = "xyz") -> None:
+    """
+    Print the dispatcher state for a network every few seconds.
+    """
+    instance = dispatcher(network)
+    while True:
+        print(network, "block", instance.last_block, "pending", instance.pending())
+        time.sleep(5)
+
+
+if __name__ == "__main__":
+    unit_test_dispatcher()
@@ -264,9 +264,6 @@ def main():
         print("\033[0m\033[2;0H" + logo + "\033[25;0H")
         text_only()
         print("\033[25;0H")
-    else:
-        # either way wait to allow parachains to initialize
-        time.sleep(5)
 
 
 def run():
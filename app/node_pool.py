@@ -0,0 +1,299 @@
+r"""
+node_pool.py
+ ╔═══════════════════════════╗
+ ║ ╦═╗╦╔╦╗╔═╗╦ ╦╔═╗╦═╗╔═╗╔═╗ ║
+ ║ ╠═╣║ ║ ╚═╗╠═╣╠═╣╠╦╝╠═ ╚═╗ ║
+ ║ ╩═╝╩ ╩ ╚═╝╩ ╩╩ ╩╩╚═╚═╝╚═╝ ║
+ ║   ╔═╗╔═╗╔╦╗╔═╗╦ ╦╔═╗╦ ╦   ║
+ ║   ║ ╦╠═╣ ║ ╠═ ║║║╠═╣╚╦╝   ║
+ ║   ╚═╝╩ ╩ ╩ ╚═╝╚╩╝╩ ╩ ╩    ║
+ ║╔═╗ _                 _ ┌─┐║
+ ║╚═╝  \               /  └─┘║
+ ║╔═╗ _ \             / _ ┌─┐║
+ ║╚═╝  \  ╔═╗ ---> ┌─┐ /  └─┘║
+ ║╔═╗ _/  ╚═╝ <--- └─┘ \_ ┌─┐║
+ ║╚═╝   /             \   └─┘║
+ ║╔═╗ _/               \_ ┌─┐║
+ ║╚═╝                     └─┘║
+ ╚═══════════════════════════╝
+WTFPL litepresence.com Jan 2024
+
+Foreign chain endpoint pools
+
+    nodes.py functions may return one endpoint or a list of them
+    reads go to the healthiest endpoint; if it has not answered within
+    its own p95 latency a hedged duplicate goes to the next best,
+    the first good answer wins
+    consecutive failures eject an endpoint for a cooldown period
+    an optional request rate is enforced separately for each endpoint
+    each endpoint keeps one keep alive requests session
+"""
+
+# STANDARD MODULES
+import time
+from collections import deque
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from threading import Lock
+from typing import Any, Callable, Dict, List, Optional
+
+# THIRD PARTY MODULES
+from requests import Session
+from requests.adapters import HTTPAdapter
+
+# BITSHARES GATEWAY MODULES
+from config import parachain_params
+from nodes import bitcoin_node, eosio_node, litecoin_node, ripple_node
+from rate_limiter import TokenBuckets
+from utilities import it
+
+# GLOBAL CONSTANTS
+POOLS: Dict[str, "EndpointPool"] = {}
+POOLS_LOCK = Lock()
+
+
+class EndpointStats:
+    """
+    Latency samples and failure state of one endpoint
+    """
+
+    __slots__ = ("latencies", "failures", "ejected_until")
+
+    def __init__(self) -> None:
+        self.latencies: deque = deque(maxlen=64)
+        self.failures = 0
+        self.ejected_until = 0.0
+
+    def quantile(self, fraction: float, default: float) -> float:
+        """
+        :param fraction: eg. 0.95
+        :param default: seconds to assume before any samples
+        :return: the latency quantile in seconds
+        """
+        if not self.latencies:
+            return default
+        ordered = sorted(self.latencies)
+        return ordered[min(len(ordered) - 1, int(fraction * len(ordered)))]
+
+
+class EndpointPool:
+    """
+    Hedged reads across several endpoints of one foreign chain
+    """
+
+    def __init__(
+        self,
+        name: str,
+        endpoints: List[Any],
+        workers: int = 16,
+        hedge_floor: float = 0.05,
+        eject_after: int = 3,
+        cooldown: float = 60,
+        rate: Optional[float] = None,
+        burst: float = 8,
+    ) -> None:
+        """
+        :param name: label for log messages, usually the network
+        :param endpoints: urls, or for bitcoind/litecoind [url, wallet] pairs;
+            the first is the primary, used for wallet and broadcast operations
+        :param workers: concurrent calls including hedges, at most
+        :param hedge_floor: never hedge sooner than this many seconds
+        :param eject_after: consecutive failures before ejection
+        :param cooldown: seconds an ejected endpoint is skipped
+        :param rate: requests per second allowed by each node; None is unlimited
+        :param burst: requests a node may receive at once before rate applies
+        """
+        self.name = name
+        self.endpoints = endpoints
+        self.hedge_floor = hedge_floor
+        self.eject_after = eject_after
+        self.cooldown = cooldown
+        self.rate = rate
+        self.limit = TokenBuckets(rate, burst) if rate else None
+        self.stats = [EndpointStats() for _ in endpoints]
+        self.sessions: Dict[int, Session] = {}
+        self.lock = Lock()
+        self.executor = ThreadPoolExecutor(workers, thread_name_prefix=f"{name}_pool")
+
+    @property
+    def primary(self) -> Any:
+        """
+        :return: the first configured endpoint
+        """
+        return self.endpoints[0]
+
+    def session(self, endpoint: Any) -> Session:
+        """
+        :param endpoint: one of self.endpoints
+        :return: that endpoint's keep alive requests session
+        """
+        idx = self.endpoints.index(endpoint)
+        with self.lock:
+            if idx not in self.sessions:
+                session = Session()
+                adapter = HTTPAdapter(pool_connections=1, pool_maxsize=16)
+                session.mount("http://", adapter)
+                session.mount("https://", adapter)
+                self.sessions[idx] = session
+            return self.sessions[idx]
+
+    def ranked(self) -> List[int]:
+        """
+        Endpoint indices, best first: healthy by median latency, then ejected.
+
+        Once its cooldown passes an ejected endpoint is tried again;
+        a single further failure ejects it for another cooldown.
+
+        :return: list of indices into self.endpoints
+        """
+        now = time.time()
+        with self.lock:
+            return sorted(
+                range(len(self.endpoints)),
+                key=lambda idx: (
+                    self.stats[idx].ejected_until > now,
+                    self.stats[idx].quantile(0.5, 0),
+                ),
+            )
+
+    def timed(self, call: Callable[[Any], Any], idx: int) -> Any:
+        """
+        Call one endpoint and record its latency or failure.
+
+        :param call: callable(endpoint) making the request
+        :param idx: index into self.endpoints
+        :return: the call's result
+        """
+        if self.limit is not None:
+            # buckets are per endpoint, so every node of a pool gets the full rate
+            while not self.limit.take(str(idx)):
+                time.sleep(1 / self.rate)
+        start = time.time()
+        try:
+            result = call(self.endpoints[idx])
+        except Exception:
+            with self.lock:
+                stats = self.stats[idx]
+                stats.failures += 1
+                if stats.failures >= self.eject_after:
+                    stats.ejected_until = time.time() + self.cooldown
+                    print(it("yellow", f"{self.name} node {idx} ejected"))
+            raise
+        with self.lock:
+            self.stats[idx].latencies.append(time.time() - start)
+            self.stats[idx].failures = 0
+            self.stats[idx].ejected_until = 0.0
+        return result
+
+    def request(self, call: Callable[[Any], Any], hedge: bool = True) -> Any:
+        """
+        Make a read on the best endpoint; hedge to the next best after its p95.
+
+        :param call: callable(endpoint) making the request, raising on failure
+        :param hedge: False for calls which must not be duplicated
+        :return: the first successful result
+        :raise: the last failure, if every endpoint tried fails
+        """
+        ranked = iter(self.ranked())
+        first = next(ranked)
+        futures = {self.executor.submit(self.timed, call, first): first}
+        delay = None
+        if hedge and len(self.endpoints) > 1:
+            delay = max(self.hedge_floor, self.stats[first].quantile(0.95, 1.0))
+        error = None
+        while futures:
+            done, _ = wait(futures, timeout=delay, return_when=FIRST_COMPLETED)
+            if not done:
+                # the primary is slower than usual; hedge once to the next best
+                delay = None
+                backup = next(ranked, None)
+                if backup is not None:
+                    futures[self.executor.submit(self.timed, call, backup)] = backup
+                continue
+            for future in done:
+                futures.pop(future)
+                try:
+                    return future.result()
+                except Exception as failure:
+                    error = failure
+            # a failure; fail over at once if nothing else is in flight
+            if not futures:
+                backup = next(ranked, None) if hedge else None
+                if backup is not None:
+                    futures[self.executor.submit(self.timed, call, backup)] = backup
+        raise error
+
+
+def endpoint_list(network: str, nodes: Any) -> List[Any]:
+    """
+    Normalize a nodes.py return value to a list of endpoints.
+
+    :param network: eos, xrp, btc, or ltc
+    :param nodes: a url or list of urls; for btc and ltc a [url, wallet] pair
+        or a list of such pairs
+    :return: list of endpoints, the primary first
+    """
+    # a single url, or a single bitcoind/litecoind [url, wallet] pair, is a pool of one
+    if isinstance(nodes, str) or (
+        network in ("btc", "ltc") and isinstance(nodes[0], str)
+    ):
+        return [nodes]
+    return list(nodes)
+
+
+def node_pool(network: str) -> EndpointPool:
+    """
+    Return this process's endpoint pool for the network, creating it on first use.
+
+    :param network: eos, xrp, btc, or ltc
+    :return: the EndpointPool
+    """
+    with POOLS_LOCK:
+        if network not in POOLS:
+            nodes = {
+                "eos": eosio_node,
+                "xrp": ripple_node,
+                "btc": bitcoin_node,
+                "ltc": litecoin_node,
+            }[network]()
+            params = parachain_params()[network]
+            POOLS[network] = EndpointPool(
+                network,
+                endpoint_list(network, nodes),
+                rate=params.get("rate"),
+                burst=params.get("workers", 8),
+            )
+        return POOLS[network]
+
+
+def unit_test() -> None:
+    """
+    Build pools from each nodes.py shape and make a hedged read across urls.
+    """
+    print("\033c")
+    print(unit_test.__doc__, "\n")
+    shapes = [
+        ("xrp", "http://a"),
+        ("eos", ["http://a", "http://b", "http://c"]),
+        ("btc", ["http://a", "wallet"]),
+        ("ltc", [["http://a", "wallet"], ["http://b", "wallet"]]),
+    ]
+    for network, nodes in shapes:
+        endpoints = endpoint_list(network, nodes)
+        print(it("yellow", network), len(endpoints), "endpoints", endpoints)
+    assert len(endpoint_list("eos", shapes[1][1])) == 3
+    assert endpoint_list("btc", shapes[2][1]) == [shapes[2][1]]
+
+    def call(endpoint: str) -> str:
+        # the primary is slow, so the read is hedged to the next best url
+        time.sleep(0.5 if endpoint == "http://a" else 0.01)
+        return endpoint
+
+    pool = EndpointPool("eos", endpoint_list("eos", shapes[1][1]), hedge_floor=0.05)
+    for idx, latency in enumerate([0.01, 0.02, 0.03]):
+        pool.stats[idx].latencies.extend([latency] * 10)
+    start = time.time()
+    print(it("green", "answered by"), pool.request(call), f"{time.time() - start:.3f}s")
+
+
+if __name__ == "__main__":
+    unit_test()
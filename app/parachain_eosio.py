@@ -19,6 +19,9 @@ parachain_eosio.py
 WTFPL litepresence.com Jan 2021
 
 EOSIO parachain builder
+
+fetches every irreversible block, or in history mode
+only our accounts' actions from a get_actions history api
 """
 
 # FIXME enable flat fee and percent fee for gateway use
@@ -40,17 +43,41 @@ EOSIO parachain builder
 
 # STANDARD PYTHON MODULES
 import time
-from threading import Thread
-from typing import Dict, List, Union
+from json import dumps as json_dumps
+from json import loads as json_loads
+from typing import Dict, Iterator, List, Optional, Tuple, Union
 
 # THIRD PARTY MODULES
-from requests import post
+from requests import Session
 
 # BITSHARES GATEWAY MODULES
-from config import foreign_accounts, gateway_assets, timing
+from block_fetcher import fetcher, mentions, needles, pruning_hook
+from config import foreign_accounts, gateway_assets, parachain_params, timing
 from ipc_utilities import chronicle, json_ipc
-from nodes import eosio_node
-from utilities import precisely, roughly
+from node_pool import node_pool
+from parachain_transfer import Transfer, to_units
+
+# GLOBAL CONSTANTS
+# history mode; actions per get_actions page and a keep alive session
+HISTORY_PAGE = 100
+HISTORY_SESSION = Session()
+# attempts at a history page before giving up, about 45 seconds of backoff
+ATTEMPTS = 20
+# transfers of at most 0.01 EOS, in 1e-4 EOS units, are dust
+EOS_DUST = 100
+# bulky get_block fields the parachain never reads
+EOS_PRUNE = pruning_hook(
+    {
+        "packed_trx",
+        "packed_context_free_data",
+        "context_free_data",
+        "signatures",
+        "hex_data",
+        "transaction_extensions",
+        "block_extensions",
+        "header_extensions",
+    }
+)
 
 
 def verify_eosio_account(account: str, comptroller) -> bool:
@@ -61,12 +88,16 @@ def verify_eosio_account(account: str, comptroller) -> bool:
     :return bool: True if the account is valid, False otherwise
     """
     timeout = timing()["eos"]["request"]
-    url = eosio_node() + "/v1/chain/get_account"
+    pool = node_pool("eos")
     params = {"account_name": str(account)}
     iteration = 0
     while True:
         try:
-            ret = post(url, json=params, timeout=timeout).json()
+            ret = pool.request(
+                lambda url: pool.session(url)
+                .post(url + "/v1/chain/get_account", json=params, timeout=timeout)
+                .json()
+            )
             break
         except Exception as error:
             print(f"verify_eosio_account access failed {error.args}")
@@ -87,11 +118,15 @@ def get_block_number(_) -> int:
     :return int: Last irreversible block number
     """
     timeout = timing()["eos"]["request"]
-    url = eosio_node() + "/v1/chain/get_info"
+    pool = node_pool("eos")
     iteration = 0
     while True:
         try:
-            ret = post(url, timeout=timeout).json()
+            ret = pool.request(
+                lambda url: pool.session(url)
+                .post(url + "/v1/chain/get_info", timeout=timeout)
+                .json()
+            )
             irr_block = ret["last_irreversible_block_num"]
             break
         except Exception as error:
@@ -101,124 +136,198 @@ def get_block_number(_) -> int:
     return irr_block
 
 
-def eos_block_cache(new_blocks: List[int]) -> Dict[int, Dict]:
+def get_block(block_num: int, timeout: float) -> bytes:
+    """
+    Get the block data from the node pool, hedged across the configured nodes.
+
+    :param int(block_num): The block number
+    :param float(timeout): seconds allowed for the request
+    :return bytes: the undecoded block data
+    """
+    pool = node_pool("eos")
+    params = {"block_num_or_id": str(block_num)}
+
+    def request(url: str) -> bytes:
+        ret = pool.session(url).post(
+            url + "/v1/chain/get_block", json=params, timeout=timeout
+        )
+        ret.raise_for_status()
+        return ret.content
+
+    return pool.request(request)
+
+
+def eos_blocks(new_blocks: List[int]) -> Iterator[Tuple[int, bytes]]:
     """
     EOSIO has a 0.5 second block time, to prevail over network latency,
-    concurrently fetch all new blocks using threading.
+    concurrently fetch all new blocks with a bounded pool of keep alive sessions.
 
     :param list(new_blocks): List of block numbers to check
-    :return dict: Block data for each block in new_blocks
-    """
-
-    def get_block(block_num: int, blocks_pipe: Dict[int, Union[int, Dict]]) -> None:
-        """
-        Get the block data via a separate thread.
-
-        :param int(block_num): The current block number
-        :param dict(blocks_pipe): Dictionary of block data
-        :returns None:
-        :updates: The dictionary of block data
-        """
-        timeout = timing()["eos"]["request"]
-        url = eosio_node() + "/v1/chain/get_block"
-        params = {"block_num_or_id": str(block_num)}
-        iteration = 0
-        while True:
-            time.sleep(0.02 * iteration**2)
-            try:
-                ret = post(url, json=params, timeout=timeout).json()
-                break
-            except Exception as error:
-                print(f"get_block access failed {error.args}")
-            iteration += 1
-        blocks_pipe[block_num] = ret
-
-    block_processes = {}  # Dictionary of threads
-    blocks_pipe = {}  # Interprocess communication dictionary
-    # Spawn multiple threads to gather the "new" blocks
-    for block_num in new_blocks:
-        blocks_pipe[block_num] = 0
-        block_processes[block_num] = Thread(
-            target=get_block,
-            args=(
-                block_num,
-                blocks_pipe,
-            ),
+    :return iterator: (block number, undecoded block data) in order, as each completes
+    """
+    return fetcher("eos").fetch(get_block, new_blocks)
+
+
+def action_transfer(action: Dict, trx_hash: str) -> Optional[Transfer]:
+    """
+    Build a parachain transfer from an EOS token transfer action, if it qualifies.
+
+    :param dict(action): the action; account, name, and data
+    :param str(trx_hash): id of the transaction containing the action
+    :return Transfer: the transfer, or None for other actions, contracts, dust,
+        or long memos
+    """
+    try:
+        # Extract the transaction amount and asset name
+        qty = action["data"]["quantity"]
+        trx_asset = qty.split(" ")[1].upper()
+        trx_units = to_units(qty.split(" ")[0], "eos")
+        trx_memo = action["data"]["memo"].replace(" ", "")
+        transfer = Transfer(
+            action["data"]["to"],
+            action["data"]["from"],
+            trx_memo,
+            trx_hash,
+            trx_asset,
+            trx_units,
         )
-        block_processes[block_num].start()
-    while True:
-        time.sleep(0.2)
-        if all(blocks_pipe.values()):
-            break
-    return blocks_pipe
+    except Exception:
+        return None
+    # Sort by transfer ops
+    if (
+        # SECURITY: Ensure it is the correct contract!!!
+        action.get("account") == "eosio.token"
+        and action.get("name") == "transfer"
+        and trx_asset == "EOS"
+        and trx_units > EOS_DUST
+        and len(trx_memo) <= 10
+    ):
+        return transfer
+    return None
 
 
 def apodize_block_data(
     comptroller: Dict[str, Union[str, int]], new_blocks: list
-) -> Dict[str, List[Dict[str, Union[str, float]]]]:
+) -> Dict[str, List[Transfer]]:
     """
     Build a parachain fragment of all new blocks.
 
     :param dict comptroller: A dict containing information about the network and other parameters.
         - "network" (str): The network identifier (e.g., "EOS" for EOSIO).
         - "msg" (str): A message attribute for storing additional information.
+        - "watch" (set): Optional accounts; blocks not mentioning one are not decoded.
     :param List[int] new_blocks: List of block numbers to process and build the parachain fragment.
-    :return Dict[str, List[Dict[str, Union[str, float]]]]:
+    :return Dict[str, List[Transfer]]:
             A dictionary representing the parachain with block numbers as keys.
             Each value is a list of transfers,
-            where each transfer is represented as a dictionary with keys:
-            - "to" (str): The recipient address.
-            - "from" (str): The sender address.
-            - "memo" (str): The memo associated with the transaction.
-            - "hash" (str): The hash identifier of the transaction.
-            - "asset" (str): The asset type (e.g., "EOS").
-            - "amount" (float): The amount of the transaction.
+            where each transfer is a parachain_transfer.Transfer:
+            to, sender, memo, hash, asset (e.g., "EOS"), and integer units.
     """
     parachain = {}
-    # Using threading, get any new unchecked blocks
-    blocks = eos_block_cache(new_blocks)
-    # With new cache of blocks, check every block from last check till now
-    for block_num in new_blocks:
+    # only blocks mentioning a watched account, or any transfer, are decoded
+    wanted = needles(comptroller.get("watch"), b'"transfer"')
+    # Using the bounded fetcher, check every block from last check till now;
+    # each is handled as it arrives so only the fetch window is held in memory
+    for block_num, raw in eos_blocks(new_blocks):
         transfers = []
-        transactions = blocks[block_num].get("transactions", [])
+        transactions = []
+        if mentions(raw, wanted):
+            block = json_loads(raw, object_pairs_hook=EOS_PRUNE)
+            transactions = block.get("transactions", [])
         # Iterate through all transactions in the list of transactions
         for trx in transactions:
             actions = trx.get("trx", {}).get("transaction", {}).get("actions", [])
             # If there are any, iterate through the actions
             for action in actions:
-                action_name = action_account = trx_asset = ""
-                try:
-                    # Extract the transaction amount and asset name
-                    qty = action["data"]["quantity"]
-                    trx_asset = qty.split(" ")[1].upper()
-                    trx_amount = float(qty.split(" ")[0])
-                    action_name = action["name"]
-                    action_account = action["account"]
-                    trx_to = action["data"]["to"]
-                    trx_from = action["data"]["from"]
-                    trx_memo = action["data"]["memo"].replace(" ", "")
-                    trx_hash = trx["trx"]["id"]
-                except Exception:
-                    pass
-                # Sort by transfer ops
-                if (
-                    # SECURITY: Ensure it is the correct contract!!!
-                    action_account == "eosio.token"
-                    and action_name == "transfer"
-                    and trx_asset == comptroller["network"].upper()
-                    and trx_amount > 0.01
-                    and len(trx_memo) <= 10
-                ):
-                    # Build transfer dict and append to transfer list
-                    transfer = {
-                        "to": trx_to,
-                        "from": trx_from,
-                        "memo": trx_memo,
-                        "hash": trx_hash,
-                        "asset": trx_asset,
-                        "amount": trx_amount,
-                    }
+                transfer = action_transfer(action, trx.get("trx", {}).get("id", ""))
+                if transfer is not None:
                     transfers.append(transfer)
         # Build parachain fragment of transfers for new blocks
         parachain[str(block_num)] = transfers
     return parachain
+
+
+def get_actions(session: Session, account: str, pos: int, offset: int) -> Dict:
+    """
+    Get a page of an account's actions from the history api.
+
+    :param session: keep alive requests Session
+    :param str(account): EOSIO account name
+    :param int(pos): account action sequence to start from, -1 for the latest
+    :param int(offset): number of further actions, negative to page backward
+    :return dict: the get_actions response
+    :raise ConnectionError: if the history api keeps failing, so the parachain restarts
+    """
+    url = parachain_params()["eos"].get("history", node_pool("eos").primary)
+    url += "/v1/history/get_actions"
+    params = {"account_name": account, "pos": pos, "offset": offset}
+    iteration = 0
+    while iteration < ATTEMPTS:
+        # increment the delay between attempts exponentially, at most 5 seconds
+        time.sleep(min(0.02 * iteration**2, 5))
+        try:
+            ret = session.post(url, json=params, timeout=timing()["eos"]["request"])
+            ret.raise_for_status()
+            return ret.json()
+        except Exception as error:
+            print(f"get_actions access failed {error.args}")
+        iteration += 1
+    raise ConnectionError(f"get_actions {account} {pos} failed")
+
+
+def apodize_history_data(
+    comptroller: Dict[str, Union[str, int]], new_blocks: list
+) -> Dict[str, List[Transfer]]:
+    """
+    Build a parachain fragment of all new blocks from our accounts' action history;
+    parachain_params()["eos"]["mode"] = "history"
+
+    only transfers received by the gateway, or watched, accounts are fetched
+    a per account action sequence cursor persists in eos_history_cursor.txt
+    actions beyond last_irreversible_block are left for the next call
+
+    :param dict comptroller: see apodize_block_data()
+    :param List[int] new_blocks: irreversible block numbers, ascending
+    :return: see apodize_block_data()
+    """
+    parachain = {str(block_num): [] for block_num in new_blocks}
+    if not new_blocks:
+        return parachain
+    accounts = {account["public"] for account in foreign_accounts()["eos"]}
+    accounts |= set(comptroller.get("watch") or ())
+    cursors = json_ipc("eos_history_cursor.txt") or {}
+    for account in sorted(accounts):
+        if account not in cursors:
+            # begin with the first recent action within these new blocks
+            latest = get_actions(HISTORY_SESSION, account, -1, 1 - HISTORY_PAGE)
+            latest = latest["actions"]
+            recent = [a for a in latest if a["block_num"] >= new_blocks[0]]
+            if recent:
+                cursors[account] = recent[0]["account_action_seq"]
+            else:
+                cursors[account] = latest[-1]["account_action_seq"] + 1 if latest else 0
+        while True:
+            ret = get_actions(
+                HISTORY_SESSION, account, cursors[account], HISTORY_PAGE - 1
+            )
+            # SECURITY: never emit reversible actions
+            irreversible = min(new_blocks[-1], ret["last_irreversible_block"])
+            done = len(ret["actions"]) < HISTORY_PAGE
+            for item in ret["actions"]:
+                if item["block_num"] > irreversible:
+                    done = True
+                    break
+                cursors[account] = item["account_action_seq"] + 1
+                trace = item["action_trace"]
+                receiver = trace.get("receipt", {}).get("receiver")
+                receiver = trace.get("receiver", receiver)
+                # each notified account records the action; count it once, as received
+                if receiver != account or str(item["block_num"]) not in parachain:
+                    continue
+                transfer = action_transfer(trace["act"], trace["trx_id"])
+                if transfer is not None and transfer.to == account:
+                    parachain[str(item["block_num"])].append(transfer)
+            if done:
+                break
+    json_ipc("eos_history_cursor.txt", json_dumps(cursors))
+    return parachain
@@ -29,10 +29,26 @@ Litecoin and Bitcoin parachain builder
 
 # STANDARD PYTHON MODULES
 import time
-from typing import Dict, List, Union
+from functools import partial
+from typing import Dict, List, Optional, Union
 
 # BITSHARES GATEWAY MODULES
-from utilities import create_access, precisely
+from node_pool import node_pool
+from parachain_transfer import Transfer, to_units
+from signing.bitcoin.bitcoinrpc.authproxy import AuthServiceProxy, JSONRPCException
+from signing.bitshares.money import Amount
+from utilities import create_access
+
+# GLOBAL CONSTANTS
+# blocks per batched json rpc round trip; verbosity 2 blocks are a few MB each
+BATCH_SIZE = 10
+# attempts at a batch before giving up, about 50 seconds of backoff
+ATTEMPTS = 20
+# dedicated keep alive connections for waitforblockheight, by network
+LONG_POLL_ACCESS: Dict[str, AuthServiceProxy] = {}
+LONG_POLL_UNSUPPORTED = set()
+# seconds of http timeout beyond the long poll timeout
+LONG_POLL_MARGIN = 5
 
 
 def verify_ltcbtc_account(account: str, comptroller: Dict) -> bool:
@@ -49,8 +65,11 @@ def verify_ltcbtc_account(account: str, comptroller: Dict) -> bool:
         # increment the delay between attempts exponentially
         time.sleep(0.02 * iteration**2)
         try:
-            access = create_access(network)
-            return bool(access.validateaddress(account)["isvalid"])
+            return node_pool(network).request(
+                lambda node: bool(
+                    create_access(network, node).validateaddress(account)["isvalid"]
+                )
+            )
         except Exception as error:
             print(f"get_received_by {network} access failed {error.args}")
         iteration += 1
@@ -68,28 +87,131 @@ def get_block_number(network: Dict) -> int:
         # increment the delay between attempts exponentially
         time.sleep(0.02 * iteration**2)
         try:
-            access = create_access(network)
-            return int(access.getblockcount())
+            return node_pool(network).request(
+                lambda node: int(create_access(network, node).getblockcount())
+            )
         except Exception as error:
             print(f"get_block_count {network} access failed {error.args}")
         iteration += 1
 
 
-def get_block(network: Dict, block_num: int) -> List[Dict]:
+def batch_blocks(network: str, block_nums: List[int], node: List[str]) -> List[Dict]:
+    """
+    Fetch verbosity 2 blocks from one node in two batched round trips.
+
+    :param str(network): ltc or btc
+    :param list(block_nums): block heights to fetch
+    :param list(node): the [url, wallet] pair to ask
+    :return list: block data in the order of block_nums
+    """
+    access = create_access(network, node)
+    hashes = access.batch_([["getblockhash", num] for num in block_nums])
+    return access.batch_([["getblock", bhash, 2] for bhash in hashes])
+
+
+def get_blocks(network: str, block_nums: List[int]) -> Dict[int, List[Dict]]:
+    """
+    Extract Litecoin or Bitcoin block transactions given a list of block numbers.
+
+    getblock verbosity 2 returns decoded transactions inline;
+    hashes and blocks are each fetched in a single batched round trip,
+    hedged across the configured nodes.
+
+    :param str(network): ltc or btc
+    :param list(block_nums): block heights to fetch
+    :return dict: {block_num: [decoded transactions]}
+    :raise ConnectionError: if every node keeps failing, so the parachain restarts
+    """
+    blocks = {}
+    for idx in range(0, len(block_nums), BATCH_SIZE):
+        chunk = block_nums[idx : idx + BATCH_SIZE]
+        data = None
+        iteration = 0
+        while iteration < ATTEMPTS:
+            # increment the delay between attempts exponentially
+            time.sleep(0.02 * iteration**2)
+            try:
+                data = node_pool(network).request(partial(batch_blocks, network, chunk))
+                break
+            except Exception as error:
+                print(f"get_blocks {network} access failed {error.args}")
+            iteration += 1
+        if data is None:
+            raise ConnectionError(f"get_blocks {network} {chunk[0]} failed")
+        for block_num, block_data in zip(chunk, data):
+            blocks[block_num] = block_data["tx"]
+    return blocks
+
+
+def long_poll_block_number(
+    access: AuthServiceProxy, height: int, timeout: float
+) -> int:
+    """
+    Block until the node's tip reaches height or timeout elapses.
+
+    :param access: a proxy whose http timeout exceeds the long poll timeout
+    :param int(height): the block height to wait for
+    :param float(timeout): seconds to wait on the node
+    :return int: the node's tip height when the call returns
+    """
+    return int(access.waitforblockheight(height, int(timeout * 1000))["height"])
+
+
+def await_block_number(network: str, height: int, timeout: float) -> int:
+    """
+    Return the current block number as soon as it reaches height.
+
+    Long polls waitforblockheight on a dedicated keep alive connection;
+    falls back to polling getblockcount if the node does not support it.
+
+    :param str(network): ltc or btc
+    :param int(height): the block height to wait for
+    :param float(timeout): the longest to wait before returning the tip anyway
+    :return int: Current block number
+    """
+    if network not in LONG_POLL_UNSUPPORTED:
+        try:
+            if network not in LONG_POLL_ACCESS:
+                node = node_pool(network).primary
+                LONG_POLL_ACCESS[network] = AuthServiceProxy(
+                    node[0], timeout=timeout + LONG_POLL_MARGIN
+                )
+            return long_poll_block_number(LONG_POLL_ACCESS[network], height, timeout)
+        except JSONRPCException as error:
+            if error.code == -32601:
+                print(f"await_block_number {network} long poll unsupported, polling")
+                LONG_POLL_UNSUPPORTED.add(network)
+        except Exception as error:
+            print(f"await_block_number {network} long poll failed {error.args}")
+        # the connection may be half closed; reconnect on the next call
+        LONG_POLL_ACCESS.pop(network, None)
+    time.sleep(timeout)
+    return get_block_number(network)
+
+
+def get_block(network: str, block_num: int) -> List[Dict]:
     """
     Extract Litecoin or Bitcoin block transactions given a block number.
     """
-    access = create_access(network)
-    block_num = access.getblockcount()
-    block_hash = access.getblockhash(block_num)
-    block_data = access.getblock(block_hash)
-    transactions = block_data["tx"]
-    decoded_trxs = []
-    for _, trx in enumerate(transactions):
-        raw_trx = access.getrawtransaction(trx)
-        decoded_trx = access.decoderawtransaction(raw_trx)
-        decoded_trxs.append(decoded_trx)
-    return decoded_trxs
+    return get_blocks(network, [block_num])[block_num]
+
+
+def vout_address(vout: Dict) -> Optional[str]:
+    """
+    The single address paid by a transaction output, if there is one.
+
+    bitcoind 22+ reports "address", earlier versions a list of "addresses"
+
+    :param dict(vout): decoded transaction output
+    :return str: the address or None for multisig and nonstandard outputs
+    """
+    script = vout["scriptPubKey"]
+    if "address" in script:
+        return script["address"]
+    addresses = script.get("addresses", [])
+    if len(addresses) == 1:
+        return addresses[0]
+    return None
 
 
 def get_received_by(address: str, comptroller: Dict) -> float:
@@ -107,7 +229,7 @@ def get_received_by(address: str, comptroller: Dict) -> float:
         time.sleep(0.02 * iteration**2)
         try:
             access = create_access(comptroller["network"])
-            return float(precisely(float(access.getreceivedbyaddress(address, 2)), 8))
+            return float(Amount.parse(access.getreceivedbyaddress(address, 2), 8))
         except Exception as error:
             print(f"get_received_by {network} access failed {error.args}")
         iteration += 1
@@ -115,54 +237,44 @@ def get_received_by(address: str, comptroller: Dict) -> float:
 
 def apodize_block_data(
     comptroller: Dict[str, Union[str, int]], new_blocks: list
-) -> Dict[str, List[Dict[str, Union[str, float]]]]:
+) -> Dict[str, List[Transfer]]:
     """
     Build a parachain fragment of all new blocks.
 
     :param dict comptroller: A dict containing information about the network and other parameters.
         - "network" (str): The network identifier (e.g., "ltc" for Litecoin).
         - "msg" (str): A message attribute for storing additional information.
+        - "watch" (set): Optional addresses to keep; all outputs if absent.
+        - "discarded" (int): Incremented per output dropped by the watch set.
     :param List[int] new_blocks: List of block numbers to process and build the parachain fragment.
-    :return Dict[str, List[Dict[str, Union[str, float]]]]:
+    :return Dict[str, List[Transfer]]:
             A dictionary representing the parachain with block numbers as keys.
             Each value is a list of transfers,
-            where each transfer is represented as a dictionary with keys:
-            - "to" (str): The recipient address.
-            - "from" (str): The sender address.
-            - "memo" (str): The memo associated with the transaction.
-            - "hash" (str): The hash identifier of the transaction.
-            - "asset" (str): The asset type (e.g., "LTC").
-            - "amount" (float): The amount of the transaction.
+            where each transfer is a parachain_transfer.Transfer:
+            to, sender, memo, hash, asset (e.g., "LTC"), and integer units.
     """
     network = comptroller["network"]
+    # optional set of watched addresses; None keeps every output
+    watch = comptroller.get("watch")
     parachain = {}
-    # check every block from last check till now
+    # fetch every block from last check till now in batched round trips
+    blocks = get_blocks(network, list(new_blocks))
     for block_num in new_blocks:
         transfers = []
-        # get each new validated ledger
-        transactions = get_block(network, block_num)
-        # iterate through all transactions in the list of transactions
-        for trx in transactions:
+        # iterate through all transactions in the block
+        for trx in blocks[block_num]:
             for vout in trx["vout"]:
-                if "addresses" in vout["scriptPubKey"].keys():
-                    if len(vout["scriptPubKey"]["addresses"]) == 1:
-                        # localize data from the transaction
-                        trx_amount = float(vout["value"])
-                        trx_to = vout["scriptPubKey"]["addresses"][0]
-                        trx_from = ""
-                        trx_hash = trx["txid"]
-                        trx_asset = network.upper()
-                        trx_memo = ""
-                        # build transfer dict and append to transfer list
-                        transfer = {
-                            "to": trx_to,
-                            "from": trx_from,
-                            "memo": trx_memo,
-                            "hash": trx_hash,
-                            "asset": trx_asset,
-                            "amount": trx_amount,
-                        }
-                        transfers.append(transfer)
+                trx_to = vout_address(vout)
+                if trx_to is None:
+                    continue
+                if watch is not None and trx_to not in watch:
+                    comptroller["discarded"] += 1
+                    continue
+                # build transfer record and append to transfer list
+                trx_units = to_units(vout["value"], network)
+                transfers.append(
+                    Transfer(trx_to, "", "", trx["txid"], network.upper(), trx_units)
+                )
         # build parachain fragment of transfers for new blocks
         parachain[str(block_num)] = transfers
     return parachain
@@ -19,6 +19,9 @@ parachain_ripple.py
 WTFPL litepresence.com Jan 2021
 
 Ripple parachain builder
+
+polls expanded validated ledgers, or in stream mode
+follows a rippled websocket subscription to our accounts
 """
 
 # FIXME enable flat fee and percent fee for gateway use
@@ -27,16 +30,37 @@ Ripple parachain builder
 # pylint: disable=too-many-locals, too-many-nested-blocks, bare-except, broad-except
 # pylint: disable=too-many-function-args, too-many-branches, too-many-statements
 
+import re
+import time
+from functools import partial
+from threading import Lock, Thread
 from json import dumps as json_dumps
-from typing import Dict, List, Union
+from json import loads as json_loads
+from typing import Any, Callable, Dict, List, Optional, Set, Union
 
 # THIRD PARTY MODULES
-from requests import get
+from requests import Session
+from websocket import create_connection as wss
 
 # BITSHARES GATEWAY MODULES
-from config import timing
+from address_allocator import load_watchlist
+from block_fetcher import fetcher, mentions, needles, pruning_hook
+from config import foreign_accounts, parachain_params, timing
 from ipc_utilities import chronicle
-from nodes import ripple_node
+from node_pool import node_pool
+from parachain_transfer import Transfer
+
+# GLOBAL CONSTANTS
+# bulky expanded ledger fields the parachain never reads
+XRP_PRUNE = pruning_hook(
+    {"AffectedNodes", "TxnSignature", "SigningPubKey", "Paths", "Memos"}
+)
+# a validated ledger response, whatever the node's json whitespace
+VALIDATED = re.compile(rb'"validated"\s*:\s*true')
+# payments of at most 0.1 XRP, in drops, are dust
+XRP_DUST = 100000
+# this process's websocket stream, if in stream mode
+XRP_STREAM: List["XrpStream"] = []
 
 
 def verify_ripple_account(
@@ -51,6 +75,7 @@ def verify_ripple_account(
     """
     network = comptroller["network"]
     timeout = timing()[network]["request"]
+    pool = node_pool("xrp")
     data = json_dumps(
         {
             "method": "account_info",
@@ -66,8 +91,14 @@ def verify_ripple_account(
     )
     iteration = 0
     while True:
+        # increment the delay between attempts exponentially, at most 5 seconds
+        time.sleep(min(0.02 * iteration**2, 5))
         try:
-            ret = get(ripple_node(), data=data, timeout=timeout).json()["result"]
+            ret = pool.request(
+                lambda url: pool.session(url)
+                .get(url, data=data, timeout=timeout)
+                .json()
+            )["result"]
             break
         except Exception as error:
             print(f"verify_ripple_account access failed {error.args}")
@@ -89,11 +120,18 @@ def get_block_number(_) -> int:
     :return int: Validated ledger index
     """
     timeout = timing()["xrp"]["request"]
+    pool = node_pool("xrp")
     data = json_dumps({"method": "ledger", "params": [{"ledger_index": "validated"}]})
     iteration = 0
     while True:
+        # increment the delay between attempts exponentially, at most 5 seconds
+        time.sleep(min(0.02 * iteration**2, 5))
         try:
-            ret = get(ripple_node(), data=data, timeout=timeout).json()
+            ret = pool.request(
+                lambda url: pool.session(url)
+                .get(url, data=data, timeout=timeout)
+                .json()
+            )
             ledger_index = int(ret["result"]["ledger"]["ledger_index"])
             break
         except Exception as error:
@@ -103,85 +141,350 @@ def get_block_number(_) -> int:
     return ledger_index
 
 
-def get_ledger(ledger: int) -> list:
+def get_ledger(
+    ledger: int, timeout: float, wanted: Optional[List[bytes]] = None
+) -> list:
     """
-    Get the list of transactions on a specific ledger from the Ripple public API.
+    Get the list of transactions on a specific ledger, hedged across the node pool.
 
     :param int(ledger): Validated ledger index
+    :param float(timeout): seconds allowed for the request
+    :param list(wanted): byte strings from block_fetcher.needles();
+        a ledger mentioning none of them is not decoded
     :return list(ret): List of transactions on this ledger
     """
-    timeout = timing()["xrp"]["request"]
+    wanted = [b'"Payment"'] if wanted is None else wanted
     data = json_dumps(
         {
             "method": "ledger",
             "params": [{"ledger_index": ledger, "transactions": True, "expand": True}],
         }
     )
-    iteration = 0
-    while True:
-        try:
-            ret = get(ripple_node(), data=data, timeout=timeout).json()
-            ret = ret["result"]["ledger"]["transactions"]
-            ret = [t for t in ret if t["TransactionType"] == "Payment"]
-            ret = [t for t in ret if t["metaData"]["TransactionResult"] == "tesSUCCESS"]
-            break
-        except Exception as error:
-            print(f"get_ledger access failed {error.args}")
-        iteration += 1
+    pool = node_pool("xrp")
+
+    def request(url: str) -> bytes:
+        ret = pool.session(url).post(url, data=data, timeout=timeout)
+        ret.raise_for_status()
+        return ret.content
 
+    raw = pool.request(request)
+    if not mentions(raw, wanted):
+        # the ledger must exist and be validated, eg. not an error response
+        if VALIDATED.search(raw) is None:
+            raise ValueError(raw[:100])
+        return []
+    ret = json_loads(raw, object_pairs_hook=XRP_PRUNE)["result"]
+    if not ret.get("validated"):
+        raise ValueError(f"xrp ledger {ledger} not validated")
+    ret = ret["ledger"]["transactions"]
+    ret = [t for t in ret if t["TransactionType"] == "Payment"]
+    ret = [t for t in ret if t["metaData"]["TransactionResult"] == "tesSUCCESS"]
     return ret
 
 
+def payment_transfer(trx: Dict[str, Any]) -> Optional[Transfer]:
+    """
+    Build a parachain transfer from a successful XRP Payment, if it qualifies.
+
+    :param dict(trx): Payment transaction fields, as in an expanded ledger
+    :return Transfer: the transfer, or None for issued currencies, dust, or no memo
+    """
+    # Non-XRP transaction amounts are in dict format
+    if isinstance(trx["Amount"], dict):
+        return None
+    # Localize data from the transaction; amounts are already in drops
+    trx_units = int(trx["Amount"])
+    trx_memo = str(trx.get("DestinationTag", ""))
+    if len(trx_memo) != 10 or trx_units <= XRP_DUST:
+        return None
+    # Build transfer record
+    return Transfer(
+        trx["Destination"], trx["Account"], trx_memo, trx["hash"], "XRP", trx_units
+    )
+
+
 def apodize_block_data(
     comptroller: Dict[str, Union[str, int]], new_blocks: list
-) -> Dict[str, List[Dict[str, Union[str, float]]]]:
+) -> Dict[str, List[Transfer]]:
     """
     Build a parachain fragment of all new blocks.
 
     :param dict comptroller: A dict containing information about the network and other parameters.
         - "network" (str): The network identifier (e.g., "xrp" for Ripple).
         - "msg" (str): A message attribute for storing additional information.
+        - "watch" (set): Optional addresses; ledgers not mentioning one are not decoded.
     :param List[int] new_blocks: List of block numbers to process and build the parachain fragment.
-    :return Dict[str, List[Dict[str, Union[str, float]]]]:
+    :return Dict[str, List[Transfer]]:
             A dictionary representing the parachain with block numbers as keys.
             Each value is a list of transfers,
-            where each transfer is represented as a dictionary with keys:
-            - "to" (str): The recipient address.
-            - "from" (str): The sender address.
-            - "memo" (str): The memo associated with the transaction.
-            - "hash" (str): The hash identifier of the transaction.
-            - "asset" (str): The asset type (e.g., "XRP").
-            - "amount" (float): The amount of the transaction.
+            where each transfer is a parachain_transfer.Transfer:
+            to, sender, memo, hash, asset (e.g., "XRP"), and integer units.
     """
     parachain = {}
+    # only ledgers mentioning a watched address, or any payment, are decoded
+    wanted = needles(comptroller.get("watch"), b'"Payment"')
+    # Concurrently get each new validated ledger, in order, within the node rate limit
+    ledgers = fetcher("xrp").fetch(partial(get_ledger, wanted=wanted), new_blocks)
     # Check every block from the last check till now
-    for block_num in new_blocks:
+    for block_num, transactions in ledgers:
         transfers = []
-        # Get each new validated ledger
-        transactions = get_ledger(block_num)
         # Iterate through all transactions in the list of transactions
         for trx in transactions:
-            # Non-XRP transaction amounts are in dict format
-            if not isinstance(trx["Amount"], dict):
-                # Localize data from the transaction
-                trx_amount = int(trx["Amount"]) / 10**6  # Convert drops to XRP
-                trx_to = trx["Destination"]
-                trx_from = trx["Account"]
-                trx_hash = trx["hash"]
-                trx_asset = comptroller["network"].upper()
-                trx_memo = trx.get("DestinationTag", "")
-                if len(str(trx_memo)) == 10 and trx_amount > 0.1:
-                    # Build transfer dict and append to transfer list
-                    transfer = {
-                        "to": trx_to,
-                        "from": trx_from,
-                        "memo": trx_memo,
-                        "hash": trx_hash,
-                        "asset": trx_asset,
-                        "amount": trx_amount,
-                    }
-                    transfers.append(transfer)
+            transfer = payment_transfer(trx)
+            if transfer is not None:
+                transfers.append(transfer)
         # Build parachain fragment of transfers for new blocks
         parachain[str(block_num)] = transfers
 
     return parachain
+
+
+class XrpStream:
+    """
+    Push mode XRP parachain source; parachain_params()["xrp"]["mode"] = "stream"
+
+    subscribes to the ledger stream and to our accounts over one rippled websocket
+    buffers qualifying payments by validated ledger index
+    on a gap, eg. a reconnect, backfills the missing ledgers with account_tx
+    """
+
+    def __init__(
+        self,
+        ws_url: str,
+        rpc_url: str,
+        accounts: Callable[[], Set[str]],
+        timeout: float = 30,
+    ) -> None:
+        """
+        :param ws_url: rippled websocket endpoint
+        :param rpc_url: rippled json rpc endpoint, for account_tx backfill
+        :param accounts: callable returning the addresses to follow
+        :param timeout: seconds without a message before reconnecting
+        """
+        self.ws_url = ws_url
+        self.rpc_url = rpc_url
+        self.accounts = accounts
+        self.timeout = timeout
+        self.session = Session()
+        self.lock = Lock()
+        # {ledger_index: {hash: transfer}}
+        self.ledgers: Dict[int, Dict[str, Transfer]] = {}
+        self.subscribed: Set[str] = set()
+        self.validated = 0
+        # True until the first ledger closes on a new connection
+        self.resumed = False
+        # the latest ledger handed to the parachain writer
+        self.emitted = 0
+        self.thread = Thread(target=self.run, daemon=True)
+
+    def run(self) -> None:
+        """
+        Forever: connect, subscribe, and consume the stream; reconnect on failure.
+        """
+        iteration = 0
+        while True:
+            # increment the delay between attempts exponentially, at most 5 seconds
+            time.sleep(min(0.02 * iteration**2, 5))
+            try:
+                self.consume(wss(self.ws_url, timeout=self.timeout))
+            except Exception as error:
+                print(f"xrp stream failed {error.args}")
+            self.subscribed = set()
+            iteration += 1
+
+    def consume(self, conn: Any) -> None:
+        """
+        Subscribe and process messages until the connection fails.
+
+        :param conn: connected websocket
+        """
+        self.resumed = bool(self.validated)
+        self.subscribe(conn, ["ledger"])
+        while True:
+            msg = json_loads(conn.recv())
+            if msg.get("type") == "transaction" and msg.get("validated"):
+                self.add(msg["ledger_index"], msg["transaction"], msg["meta"])
+            elif msg.get("type") == "ledgerClosed":
+                self.close(conn, int(msg["ledger_index"]))
+
+    def subscribe(self, conn: Any, streams: List[str]) -> None:
+        """
+        Subscribe to streams and to any accounts not yet followed.
+
+        :param conn: connected websocket
+        :param streams: stream names, eg. ["ledger"], may be empty
+        """
+        accounts = set(self.accounts()) - self.subscribed
+        if not accounts and not streams:
+            return
+        request = {"command": "subscribe", "streams": streams}
+        if accounts:
+            request["accounts"] = sorted(accounts)
+        conn.send(json_dumps(request))
+        self.subscribed |= accounts
+        # new accounts may have been paid before we subscribed to them
+        if accounts and self.validated:
+            self.backfill(accounts, self.emitted + 1, self.validated)
+
+    def add(self, ledger_index: int, trx: Dict[str, Any], meta: Dict[str, Any]) -> None:
+        """
+        Buffer a validated payment if it qualifies.
+
+        :param ledger_index: the validated ledger containing the transaction
+        :param trx: the transaction fields
+        :param meta: the transaction metadata
+        """
+        if trx.get("TransactionType") != "Payment":
+            return
+        if meta.get("TransactionResult") != "tesSUCCESS":
+            return
+        transfer = payment_transfer(trx)
+        if transfer is not None:
+            with self.lock:
+                if int(ledger_index) > self.emitted:
+                    # keyed by hash, so a payment both streamed and backfilled counts once
+                    ledger = self.ledgers.setdefault(int(ledger_index), {})
+                    ledger[trx["hash"]] = transfer
+
+    def close(self, conn: Any, ledger_index: int) -> None:
+        """
+        A ledger validated; backfill any gap and follow any new accounts.
+
+        :param conn: connected websocket
+        :param ledger_index: the newly validated ledger
+        """
+        if not self.emitted:
+            # the parachain writer begins with the ledger before the first tip
+            self.emitted = ledger_index - 2
+        if self.validated and (self.resumed or ledger_index > self.validated + 1):
+            # the last ledger seen may have lost transactions too, so it is included;
+            # transfers it already buffered are deduplicated by hash
+            stop = max(self.validated, ledger_index - 1)
+            print(f"xrp stream gap {self.validated} to {stop}")
+            self.backfill(self.subscribed, self.validated, stop)
+        self.resumed = False
+        self.validated = max(self.validated, ledger_index)
+        self.subscribe(conn, [])
+
+    def backfill(self, accounts: Set[str], start: int, stop: int) -> None:
+        """
+        Buffer payments to or from accounts in ledgers start to stop via account_tx.
+
+        :param accounts: addresses to backfill
+        :param start: first ledger index
+        :param stop: last ledger index
+        """
+        for account in accounts:
+            marker = None
+            while True:
+                params = {
+                    "account": account,
+                    "ledger_index_min": start,
+                    "ledger_index_max": stop,
+                    "forward": True,
+                    "limit": 200,
+                }
+                if marker is not None:
+                    params["marker"] = marker
+                data = json_dumps({"method": "account_tx", "params": [params]})
+                ret = self.session.post(self.rpc_url, data=data, timeout=self.timeout)
+                ret = ret.json()["result"]
+                for item in ret["transactions"]:
+                    if item.get("validated"):
+                        trx = item["tx"]
+                        self.add(trx["ledger_index"], trx, item["meta"])
+                marker = ret.get("marker")
+                if marker is None:
+                    break
+
+    def block_number(self) -> int:
+        """
+        :return: the latest validated ledger index seen on the stream
+        :raise ConnectionError: if no ledger validates within self.timeout,
+            eg. the websocket never connects; the parachain writer then restarts
+        """
+        deadline = time.time() + self.timeout
+        while not self.validated:
+            if time.time() > deadline:
+                raise ConnectionError(
+                    f"xrp stream {self.ws_url} has no validated ledger"
+                )
+            time.sleep(0.1)
+        return self.validated
+
+    def rewind(self, ledger_index: int) -> None:
+        """
+        Emit from an earlier ledger, eg. when a warm restart resumes the parachain.
+
+        :param ledger_index: the first ledger the writer will pop
+        """
+        self.block_number()
+        with self.lock:
+            if ledger_index > self.emitted:
+                return
+            stop = self.emitted
+            self.emitted = ledger_index - 1
+        self.backfill(set(self.accounts()), ledger_index, stop)
+
+    def pop(self, ledger_index: int) -> List[Transfer]:
+        """
+        Remove and return the buffered transfers for a validated ledger.
+
+        :param ledger_index: the ledger
+        :return: list of transfers
+        """
+        with self.lock:
+            transfers = list(self.ledgers.pop(ledger_index, {}).values())
+            self.emitted = max(self.emitted, ledger_index)
+            # discard anything backfilled into ledgers already emitted
+            for stale in [key for key in self.ledgers if key < self.emitted]:
+                del self.ledgers[stale]
+        return transfers
+
+
+def xrp_stream() -> XrpStream:
+    """
+    Return this process's XrpStream, starting it on first use.
+
+    parachain_params()["xrp"]["websocket"] is the endpoint,
+    else derived from the primary node
+    """
+    if not XRP_STREAM:
+        ws_url = parachain_params()["xrp"].get(
+            "websocket", node_pool("xrp").primary.replace("http", "ws", 1)
+        )
+
+        def accounts() -> Set[str]:
+            gateway = {account["public"] for account in foreign_accounts()["xrp"]}
+            return gateway | {key[0] for key in load_watchlist("xrp")}
+
+        XRP_STREAM.append(XrpStream(ws_url, node_pool("xrp").primary, accounts))
+        XRP_STREAM[0].thread.start()
+    return XRP_STREAM[0]
+
+
+def get_stream_block_number(_) -> int:
+    """
+    Get the validated ledger index from the websocket stream.
+
+    :param _: Required for cross-chain compatibility but not applicable to Ripple
+    :return int: Validated ledger index
+    """
+    return xrp_stream().block_number()
+
+
+def apodize_stream_data(
+    comptroller: Dict[str, Union[str, int]], new_blocks: list
+) -> Dict[str, List[Transfer]]:
+    """
+    Build a parachain fragment of all new blocks from the websocket stream.
+
+    :param dict comptroller: see apodize_block_data()
+    :param List[int] new_blocks: validated ledgers, all older than the stream tip
+    :return: see apodize_block_data()
+    """
+    _ = comptroller
+    stream = xrp_stream()
+    if new_blocks:
+        stream.rewind(min(new_blocks))
+    return {str(block_num): stream.pop(block_num) for block_num in new_blocks}
@@ -0,0 +1,166 @@
+r"""
+parachain_transfer.py
+ ╔═══════════════════════════╗
+ ║ ╦═╗╦╔╦╗╔═╗╦ ╦╔═╗╦═╗╔═╗╔═╗ ║
+ ║ ╠═╣║ ║ ╚═╗╠═╣╠═╣╠╦╝╠═ ╚═╗ ║
+ ║ ╩═╝╩ ╩ ╚═╝╩ ╩╩ ╩╩╚═╚═╝╚═╝ ║
+ ║   ╔═╗╔═╗╔╦╗╔═╗╦ ╦╔═╗╦ ╦   ║
+ ║   ║ ╦╠═╣ ║ ╠═ ║║║╠═╣╚╦╝   ║
+ ║   ╚═╝╩ ╩ ╩ ╚═╝╚╩╝╩ ╩ ╩    ║
+ ║╔═╗ _                 _ ┌─┐║
+ ║╚═╝  \               /  └─┘║
+ ║╔═╗ _ \             / _ ┌─┐║
+ ║╚═╝  \  ╔═╗ ---> ┌─┐ /  └─┘║
+ ║╔═╗ _/  ╚═╝ <--- └─┘ \_ ┌─┐║
+ ║╚═╝   /             \   └─┘║
+ ║╔═╗ _/               \_ ┌─┐║
+ ║╚═╝                     └─┘║
+ ╚═══════════════════════════╝
+WTFPL litepresence.com Jan 2024
+
+Compact parachain transfer records
+
+    in memory a transfer is an immutable NamedTuple, no per record dict
+    amounts are integer base units; satoshis, drops, 1e-4 EOS, 1e-5 XYZ
+    on disk a transfer is a positional row in a schema versioned parachain:
+        {"schema": 1, "start": height, "blocks": [[row, ...], ...]}
+        row: [to, from, memo, hash, asset, units]
+    legacy parachains of {"height": [{to, from, memo, hash, asset, amount}]} still load
+"""
+
+# STANDARD MODULES
+from decimal import Decimal
+from typing import Any, Dict, List, NamedTuple, Union
+
+# BITSHARES GATEWAY MODULES
+from signing.bitshares.money import Amount
+
+# GLOBAL CONSTANTS
+SCHEMA = 1
+# decimal places of one base unit, by network
+PRECISION = {"btc": 8, "ltc": 8, "xrp": 6, "eos": 4, "xyz": 5}
+
+
+def to_units(amount: Union[Amount, str, int, float, Decimal], network: str) -> int:
+    """
+    Convert an amount to integer base units, truncating any excess places.
+
+    :param amount: eg. "1.0001", Decimal("1.0001"), 1.0001, or an Amount
+    :param network: eg. btc
+    :return: eg. 100010000 satoshis
+    """
+    return Amount.parse(amount, PRECISION[network]).units
+
+
+def from_units(units: int, network: str) -> str:
+    """
+    Format integer base units as an exact decimal string.
+
+    :param units: eg. 100010000
+    :param network: eg. btc
+    :return: eg. "1.00010000"
+    """
+    return str(Amount(units, PRECISION[network]))
+
+
+class Transfer(NamedTuple):
+    """
+    One transfer on a foreign chain, as recorded on the parachain
+    """
+
+    to: str
+    sender: str
+    memo: str
+    hash: str
+    asset: str
+    units: int
+
+    @property
+    def network(self) -> str:
+        """
+        :return: the network of the asset, eg. eos
+        """
+        return self.asset.lower()
+
+    @property
+    def amount(self) -> Amount:
+        """
+        :return: the fixed point amount
+        """
+        return Amount(self.units, PRECISION[self.network])
+
+    def decimal(self) -> str:
+        """
+        :return: the exact amount as a decimal string
+        """
+        return from_units(self.units, self.network)
+
+    @classmethod
+    def from_legacy(cls, transfer: Dict[str, Any]) -> "Transfer":
+        """
+        :param transfer: a transfer dict from a legacy parachain
+        :return: the Transfer
+        """
+        return cls(
+            str(transfer["to"]),
+            str(transfer["from"]),
+            str(transfer["memo"]),
+            str(transfer["hash"]),
+            str(transfer["asset"]),
+            to_units(transfer["amount"], str(transfer["asset"]).lower()),
+        )
+
+
+def encode_blocks(start: Any, blocks: List[List[Transfer]]) -> Dict[str, Any]:
+    """
+    :param start: the height of the first block, None if there are none
+    :param blocks: the transfers of each contiguous block
+    :return: the parachain in the current schema
+    """
+    return {
+        "schema": SCHEMA,
+        "start": start,
+        "blocks": [[list(transfer) for transfer in block] for block in blocks],
+    }
+
+
+def decode_blocks(parachain: Dict[str, Any]) -> Dict[int, List[Transfer]]:
+    """
+    Read a parachain of any schema.
+
+    :param parachain: as read from the pipe
+    :return: {height: transfers}, ascending
+    """
+    if "schema" not in parachain:
+        heights = sorted(int(key) for key in parachain)
+        return {
+            height: [Transfer.from_legacy(item) for item in parachain[str(height)]]
+            for height in heights
+        }
+    if parachain["schema"] > SCHEMA:
+        raise ValueError(
+            f"parachain schema {parachain['schema']} is newer than {SCHEMA}"
+        )
+    return {
+        parachain["start"] + idx: [Transfer(*row) for row in block]
+        for idx, block in enumerate(parachain["blocks"])
+    }
+
+
+def unit_test() -> None:
+    """
+    Exact round trips where a float would drift, and a legacy parachain.
+    """
+    print(to_units(0.29, "btc"), to_units("1.0001", "eos"), from_units(1, "btc"))
+    legacy = {
+        "9": [],
+        "10": [{"to": "a", "from": "b", "memo": 1, "hash": "h", "asset": "XRP"}],
+    }
+    legacy["10"][0]["amount"] = 0.1 + 0.2
+    blocks = decode_blocks(legacy)
+    print(blocks)
+    print(decode_blocks(encode_blocks(9, list(blocks.values()))) == blocks)
+
+
+if __name__ == "__main__":
+    unit_test()
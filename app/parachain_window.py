@@ -0,0 +1,156 @@
+r"""
+parachain_window.py
+ ╔═══════════════════════════╗
+ ║ ╦═╗╦╔╦╗╔═╗╦ ╦╔═╗╦═╗╔═╗╔═╗ ║
+ ║ ╠═╣║ ║ ╚═╗╠═╣╠═╣╠╦╝╠═ ╚═╗ ║
+ ║ ╩═╝╩ ╩ ╚═╝╩ ╩╩ ╩╩╚═╚═╝╚═╝ ║
+ ║   ╔═╗╔═╗╔╦╗╔═╗╦ ╦╔═╗╦ ╦   ║
+ ║   ║ ╦╠═╣ ║ ╠═ ║║║╠═╣╚╦╝   ║
+ ║   ╚═╝╩ ╩ ╩ ╚═╝╚╩╝╩ ╩ ╩    ║
+ ║╔═╗ _                 _ ┌─┐║
+ ║╚═╝  \               /  └─┘║
+ ║╔═╗ _ \             / _ ┌─┐║
+ ║╚═╝  \  ╔═╗ ---> ┌─┐ /  └─┘║
+ ║╔═╗ _/  ╚═╝ <--- └─┘ \_ ┌─┐║
+ ║╚═╝   /             \   └─┘║
+ ║╔═╗ _/               \_ ┌─┐║
+ ║╚═╝                     └─┘║
+ ╚═══════════════════════════╝
+WTFPL litepresence.com Jan 2024
+
+Integer keyed ring buffer of recent parachain blocks
+
+    heights are ints, ascending and contiguous
+    append and evict are O(1) on a bounded deque
+    the latest height is O(1); blocks since a cursor are O(new blocks)
+    persisted to the pipe as parachain_{network}.txt in the schema versioned
+    format of parachain_transfer.py
+"""
+
+# STANDARD MODULES
+from collections import deque
+from itertools import islice
+from json import dumps as json_dumps
+from typing import Any, Dict, Iterator, List, Optional, Tuple
+
+# BITSHARES GATEWAY MODULES
+from ipc_utilities import json_ipc
+from parachain_transfer import Transfer, decode_blocks, encode_blocks
+
+
+class ParachainWindow:
+    """
+    The latest size blocks of a parachain, keyed by integer height
+    """
+
+    def __init__(self, size: int) -> None:
+        """
+        :param size: the number of blocks to retain
+        """
+        self.blocks: deque = deque(maxlen=size)
+
+    def __len__(self) -> int:
+        return len(self.blocks)
+
+    @property
+    def latest(self) -> Optional[int]:
+        """
+        :return: the highest height in the window, or None if empty
+        """
+        return self.blocks[-1][0] if self.blocks else None
+
+    @property
+    def earliest(self) -> Optional[int]:
+        """
+        :return: the lowest height in the window, or None if empty
+        """
+        return self.blocks[0][0] if self.blocks else None
+
+    def append(self, height: int, transfers: List[Transfer]) -> None:
+        """
+        Add the next block, evicting the oldest if the window is full.
+
+        :param height: must follow the latest height
+        :param transfers: the block's parachain transfers
+        """
+        if self.blocks and height != self.blocks[-1][0] + 1:
+            raise ValueError(f"parachain height {height} after {self.blocks[-1][0]}")
+        self.blocks.append((height, transfers))
+
+    def extend(self, fragment: Dict[str, List[Transfer]]) -> None:
+        """
+        Append every block of an apodized parachain fragment in height order.
+
+        :param fragment: {str(height): transfers}
+        """
+        for height in sorted(int(key) for key in fragment):
+            self.append(height, fragment[str(height)])
+
+    def since(self, height: int) -> Iterator[Tuple[int, List[Transfer]]]:
+        """
+        The listener cursor; every block newer than height, ascending.
+
+        :param height: the last height already processed
+        :return: iterator of (height, transfers)
+        """
+        if not self.blocks:
+            return iter(())
+        start = max(0, height + 1 - self.blocks[0][0])
+        return islice(self.blocks, start, None)
+
+    def to_json(self) -> Dict[str, Any]:
+        """
+        :return: the window in the parachain pipe format
+        """
+        return encode_blocks(self.earliest, [block for _, block in self.blocks])
+
+    @classmethod
+    def from_json(
+        cls, parachain: Optional[Dict[str, Any]], size: int = 0
+    ) -> "ParachainWindow":
+        """
+        Rebuild a window from the parachain pipe format, current or legacy.
+
+        :param parachain: as read from the pipe; may be None or empty
+        :param size: the number of blocks to retain, default all of them
+        :return: the ParachainWindow
+        """
+        blocks = decode_blocks(parachain or {})
+        window = cls(size or max(len(blocks), 1))
+        window.blocks.extend(blocks.items())
+        return window
+
+    @classmethod
+    def load(cls, network: str, size: int = 0) -> "ParachainWindow":
+        """
+        Read the window for a network from the pipe.
+
+        :param network: the network of the parachain
+        :param size: the number of blocks to retain, default all of them
+        :return: the ParachainWindow
+        """
+        return cls.from_json(json_ipc(f"parachain_{network}.txt"), size)
+
+    def save(self, network: str) -> None:
+        """
+        Write the window for a network to the pipe.
+
+        :param network: the network of the parachain
+        """
+        json_ipc(f"parachain_{network}.txt", json_dumps(self.to_json()))
+
+
+def unit_test() -> None:
+    """
+    Cross a power of ten, which a string sort gets wrong, and evict.
+    """
+    window = ParachainWindow(3)
+    transfer = Transfer("a", "b", "", "h", "BTC", 1)
+    window.extend({"998": [], "999": [transfer], "1000": [], "1001": []})
+    print("latest", window.latest, "earliest", window.earliest, "len", len(window))
+    print("since 999", [height for height, _ in window.since(999)])
+    print("round trip", ParachainWindow.from_json(window.to_json()).latest)
+
+
+if __name__ == "__main__":
+    unit_test()
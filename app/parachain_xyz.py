@@ -48,6 +48,7 @@ from typing import Dict, List, Union
 
 # BITSHARES GATEWAY MODULES
 from ipc_utilities import json_ipc
+from parachain_transfer import Transfer
 
 
 def verify_xyz_account(*_) -> bool:
@@ -95,7 +96,7 @@ def get_transactions(block_num) -> list:
 
 def apodize_block_data(
     comptroller: Dict[str, Union[str, int]], new_blocks: list
-) -> Dict[str, List[Dict[str, Union[str, float]]]]:
+) -> Dict[str, List[Transfer]]:
     """
     Build a parachain fragment of all new blocks.
 
@@ -103,16 +104,11 @@ def apodize_block_data(
         - "network" (str): The network identifier (e.g., "xrp" for Ripple).
         - "msg" (str): A message attribute for storing additional information.
     :param List[int] new_blocks: List of block numbers to process and build the parachain fragment.
-    :return Dict[str, List[Dict[str, Union[str, float]]]]:
+    :return Dict[str, List[Transfer]]:
             A dictionary representing the parachain with block numbers as keys.
             Each value is a list of transfers,
-            where each transfer is represented as a dictionary with keys:
-            - "to" (str): The recipient address.
-            - "from" (str): The sender address.
-            - "memo" (str): The memo associated with the transaction.
-            - "hash" (str): The hash identifier of the transaction.
-            - "asset" (str): The asset type (e.g., "XRP").
-            - "amount" (float): The amount of the transaction.
+            where each transfer is a parachain_transfer.Transfer:
+            to, sender, memo, hash, asset (e.g., "XRP"), and integer units.
     """
     parachain = {}
     # Check every block from the last check till now
@@ -125,21 +121,16 @@ def apodize_block_data(
             #
             if trx["type"] == "transfer":
                 # Localize data from the transaction
-                trx_amount = int(trx["quantity"]) / 10**5  # Precision of 5
+                trx_units = int(trx["quantity"])  # Precision of 5
                 trx_to = trx["to"]
                 trx_from = trx["public"]
                 trx_hash = trx["hash"]
                 trx_asset = comptroller["network"].upper()
                 trx_memo = trx.get("memo", "")
-                # Build transfer dict and append to transfer list
-                transfer = {
-                    "to": trx_to,
-                    "from": trx_from,
-                    "memo": trx_memo,
-                    "hash": trx_hash,
-                    "asset": trx_asset,
-                    "amount": trx_amount,
-                }
+                # Build transfer record and append to transfer list
+                transfer = Transfer(
+                    trx_to, trx_from, trx_memo, trx_hash, trx_asset, trx_units
+                )
                 transfers.append(transfer)
         # Build parachain fragment of transfers for new blocks
         parachain[str(block_num)] = transfers
@@ -27,21 +27,30 @@ Falcon API Server for Gateway Deposit Requests
 # pylint: disable=too-many-statements, too-many-locals, bare-except
 
 # STANDARD MODULES
+import asyncio
 import time
+from concurrent.futures import ThreadPoolExecutor
 from copy import deepcopy
+from itertools import count
 from json import dumps as json_dumps
-from os import urandom
-from random import randint, random, seed
+from math import ceil
+from random import randint
 from subprocess import PIPE, Popen
 from threading import Thread
-from typing import Any, Dict
+from typing import Any, Dict, Optional
 
 # THIRD PARTY MODULES
-from falcon import App
+from falcon import App, asgi
 
 # GATEWAY MODULES
 import wsgiserver
-from address_allocator import initialize_addresses, lock_address
+from address_allocator import (
+    get_lease,
+    grant_lease,
+    initialize_addresses,
+    lease_lock,
+    lock_address,
+)
 from config import (
     contact,
     foreign_accounts,
@@ -50,8 +59,9 @@ from config import (
     server_config,
     timing,
 )
-from ipc_utilities import chronicle, json_ipc
+from ipc_utilities import chronicle, chronicle_later, json_ipc
 from listener_boilerplate import listener_boilerplate
+from rate_limiter import AdmissionControl
 from utilities import encode_memo, event_id, it, microseconds
 from watchdog import watchdog_sleep
 
@@ -76,9 +86,50 @@ class GatewayDepositServer:
         :param comptroller: The comptroller dictionary.
         """
         self.comptroller = comptroller
-        self.deposit_id = 0
+        # itertools.count is thread safe under the GIL, unlike += on an attribute
+        self.deposit_ids = count(1)
+        # map each offered uia name to its network once, rather than per request
+        self.networks = {
+            asset["asset_name"]: network for network, asset in gateway_assets().items()
+        }
+        # reject abusive bursts before any address is locked or audit written
+        self.admission = AdmissionControl()
+
+    def admit(self, req: Any, resp: Any) -> bool:
+        """
+        Apply per client_id, per ip, and in flight limits to a request.
+
+        :param req: The Falcon request object.
+        :param resp: The Falcon response object; set to 429 if rejected.
+        :return: True if the request may proceed; the caller must release()
+        """
+        reason = self.admission.admit(
+            str(req.params.get("client_id", "")), str(req.remote_addr)
+        )
+        if reason is None:
+            return True
+        resp.status = 429
+        resp.media = {"response": "error", "msg": reason, "contact": contact()}
+        return False
 
     def on_get(self, req: Any, resp: Any) -> None:
+        """
+        WSGI GET handler; see respond()
+
+        :param req: The Falcon request object.
+        :param resp: The Falcon response object.
+        """
+        if not self.admit(req, resp):
+            return
+        try:
+            response_body = self.respond(dict(req.params))
+        finally:
+            self.admission.release()
+        if response_body is not None:
+            resp.media = response_body
+            resp.status = 200
+
+    def respond(self, req_params: Dict[str, Any]) -> Optional[Dict[str, Any]]:
         """
         When there is a get request made to the deposit server api
         User GET request includes the client_id's BitShares account_name
@@ -87,28 +138,25 @@ class GatewayDepositServer:
         Server RESPONSE is deposit address and timeout
         After timeout or deposit return address to text pipe list
 
-        :param req: The Falcon request object.
-        :param resp: The Falcon response object.
+        Audit writes are queued to a background thread via chronicle_later,
+        the response is sent as soon as the listener is registered.
+
+        :param req_params: The query parameters of the request.
+        :return: The response json for the client, None on an invalid request.
         """
         # localize the comptroller to this get request
         comptroller = deepcopy(self.comptroller)
-        # seed pseudorandom in a cryptographically secure manner
-        seed(urandom(20))
-        # pause for a random 1/10 of a seocond
-        time.sleep(random() / 10)
         # increment the event identifier
-        self.deposit_id += 1
+        deposit_id = next(self.deposit_ids)
         # create a millesecond nonce to log this event
         nonce = microseconds()
-        # extract the incoming parameters to a dictionary
-        req_params = dict(req.params)
         # update the comptroller and chronicle this request
         comptroller["req_params"] = req_params
         comptroller["nonce"] = nonce
-        comptroller["event_id"] = event_id("D", self.deposit_id)
+        comptroller["event_id"] = event_id("D", deposit_id)
         comptroller["issuer_action"] = "issue"
         msg = "received deposit request"
-        chronicle(comptroller, msg)
+        chronicle_later(comptroller, msg)
         print(it("red", "DEPOSIT SERVER RECEIVED REQUEST"), SERVER_URL, req_params)
         # assuming the client is using an approved wallet this should never fail
         client_id, uia = "", ""
@@ -121,23 +169,13 @@ class GatewayDepositServer:
             comptroller["client_id"] = client_id
         except:
             msg = "invalid request"
-            chronicle(comptroller, msg)
+            chronicle_later(comptroller, msg)
             return
         # translate the incoming uia request to the appropriate network
-        network = ""
-        if uia == gateway_assets()["xrp"]["asset_name"]:
-            network = "xrp"
-        if uia == gateway_assets()["xyz"]["asset_name"]:
-            network = "xyz"
-        elif uia == gateway_assets()["eos"]["asset_name"]:
-            network = "eos"
-        elif uia == gateway_assets()["btc"]["asset_name"]:
-            network = "btc"
-        elif uia == gateway_assets()["ltc"]["asset_name"]:
-            network = "ltc"
-        else:
+        network = self.networks.get(uia, "")
+        if not network:
             msg = "invalid request"
-            chronicle(comptroller, msg)
+            chronicle_later(comptroller, msg)
             return
         # create a unique memo for this event
         memo = encode_memo(network, randint(10**17, 10**18))
@@ -145,63 +183,31 @@ class GatewayDepositServer:
         # beyond this point we have a valid uia and client_id
         comptroller["network"] = network
         if network in comptroller["offerings"]:
-            if network in ["eos", "xrp"]:
-                # UIA's using memo method will always default to zero idx gateway
-                account_idx = 0
-            else:
-                # lock an address until this transaction is complete
-                account_idx = lock_address(network)
-            # lock_address will return None if all rotating addresses are in use
-            if account_idx is not None:
-                # configure the estimated gateway timing for this network
-                estimate = int(timing()[network]["estimate"] / 60)
-                # get the deposit address assigned to this request
-                deposit_address = foreign_accounts()[network][account_idx]["public"]
-                print("gateway address", deposit_address, "index", account_idx)
-                # format a response json to the api request
-                response_body = {
-                    "response": "success",
-                    "server_time": nonce,
-                    "deposit_address": deposit_address,
-                    "gateway_timeout": "30 MINUTES",
-                    "msg": (
-                        f"Welcome {client_id}, please tranfer your foreign blockchain "
-                        + f"{network.upper()} asset, to the {uia.upper()} gateway "
-                        + "'deposit_address' in this response.  "
-                        + "Make ONE transfer to this address, "
-                        + "within the 'gateway_timeout' specified. Transactions on "
-                        + f"this network take about {estimate} minutes to confirm. "
-                    ),
-                    "contact": contact(),
-                }
-                if network in [
-                    "eos",
-                    "xrp",
-                    "xyz",
-                ]:  # some deposts will require a hashed memo
-                    response_body["msg"] += (
-                        f"\n\n*ALERT*: {network.upper()} deposits must include a the "
-                        + "*MEMO* provided in this response!!!"
-                    )
-                    response_body["memo"] = memo
-                print(
-                    it(
-                        "red",
-                        f"STARTING {network.upper()} LISTENER TO ISSUE to {client_id}",
+            # hold this client's lease so a double click cannot lock two addresses
+            with lease_lock(client_id, network):
+                # a live lease for this client and network is offered again as is
+                lease = get_lease(client_id, network)
+                if lease is not None:
+                    account_idx = lease["account_idx"]
+                    comptroller["memo"] = lease["memo"]
+                elif network in ["eos", "xrp"]:
+                    # UIA's using memo method will always default to zero idx gateway
+                    account_idx = 0
+                else:
+                    # lock an address until this transaction is complete
+                    account_idx = lock_address(network)
+                # lock_address will return None if all rotating addresses are in use
+                if account_idx is not None:
+                    response_body = self.deposit_response(
+                        comptroller, account_idx, lease
                     )
-                )
-                comptroller["amount"] = None
-                comptroller["account_idx"] = account_idx
-                comptroller["required_memo"] = memo
-                comptroller["deposit_address"] = deposit_address
-                listener = Thread(target=listener_boilerplate, args=(comptroller,))
-                listener.start()
-                msg = "listener process started"
-                chronicle(comptroller, msg)
+            if account_idx is not None:
+                msg = "listener process started" if lease is None else "lease reused"
+                chronicle_later(comptroller, msg)
             else:
                 msg = f"{comptroller['event_id']} {uia.upper()} gateway overloaded."
                 print(it("red", msg.upper()))
-                chronicle(comptroller, msg)
+                chronicle_later(comptroller, msg)
                 response_body = {
                     "response": "error",
                     "server_time": nonce,
@@ -216,7 +222,7 @@ class GatewayDepositServer:
         else:
             msg = f"{comptroller['event_id']} {uia.upper()} not listed in offerings."
             print(it("red", msg.upper()))
-            chronicle(comptroller, msg)
+            chronicle_later(comptroller, msg)
             response_body = {
                 "response": "error",
                 "server_time": nonce,
@@ -228,12 +234,126 @@ class GatewayDepositServer:
                 "contact": contact(),
             }
 
-        time.sleep(0.5)  # allow time for listener to start before offering address
-        resp.media = response_body
-        resp.status = 200
+        return response_body
+
+    def deposit_response(
+        self,
+        comptroller: Dict[str, Any],
+        account_idx: int,
+        lease: Optional[Dict[str, Any]],
+    ) -> Dict[str, Any]:
+        """
+        Offer the deposit address; register a listener and lease it if new.
+
+        :param comptroller: The comptroller for this request.
+        :param account_idx: The index of the gateway address offered.
+        :param lease: The live lease for this client and network, or None.
+        :return: The success response json for the client.
+        """
+        memo = comptroller["memo"]
+        network = comptroller["network"]
+        client_id = comptroller["client_id"]
+        uia = comptroller["uia"]
+        if lease is None:
+            expires = time.time() + timing()[network]["timeout"]
+        else:
+            expires = lease["expires"]
+        # configure the estimated gateway timing for this network
+        estimate = int(timing()[network]["estimate"] / 60)
+        remaining = ceil(max(0, expires - time.time()) / 60)
+        # get the deposit address assigned to this request
+        deposit_address = foreign_accounts()[network][account_idx]["public"]
+        print("gateway address", deposit_address, "index", account_idx)
+        # format a response json to the api request
+        response_body = {
+            "response": "success",
+            "server_time": comptroller["nonce"],
+            "deposit_address": deposit_address,
+            "gateway_timeout": f"{remaining} MINUTES",
+            "msg": (
+                f"Welcome {client_id}, please tranfer your foreign blockchain "
+                + f"{network.upper()} asset, to the {uia.upper()} gateway "
+                + "'deposit_address' in this response.  "
+                + "Make ONE transfer to this address, "
+                + "within the 'gateway_timeout' specified. Transactions on "
+                + f"this network take about {estimate} minutes to confirm. "
+            ),
+            "contact": contact(),
+        }
+        if network in [
+            "eos",
+            "xrp",
+            "xyz",
+        ]:  # some deposts will require a hashed memo
+            response_body["msg"] += (
+                f"\n\n*ALERT*: {network.upper()} deposits must include a the "
+                + "*MEMO* provided in this response!!!"
+            )
+            response_body["memo"] = memo
+        comptroller["amount"] = None
+        comptroller["account_idx"] = account_idx
+        comptroller["required_memo"] = memo
+        comptroller["deposit_address"] = deposit_address
+        if lease is None:
+            print(
+                it(
+                    "red",
+                    f"STARTING {network.upper()} LISTENER TO ISSUE to {client_id}",
+                )
+            )
+            # register before offering the address; the dispatcher is watching
+            listener_boilerplate(comptroller)
+            grant_lease(
+                client_id,
+                network,
+                {
+                    "memo": memo,
+                    "nonce": comptroller["nonce"],
+                    "account_idx": account_idx,
+                    "expires": expires,
+                },
+            )
+        return response_body
+
+
+class AsyncGatewayDepositServer(GatewayDepositServer):
+    """
+    ASGI flavor of the deposit api; slow clients hold a coroutine, not a thread
+    """
+
+    def __init__(self, comptroller: Dict[str, Any]) -> None:
+        """
+        Initialize the AsyncGatewayDepositServer instance.
+
+        :param comptroller: The comptroller dictionary.
+        """
+        super().__init__(comptroller)
+        # address allocation touches the gateway state pipe; keep it off the loop
+        self.executor = ThreadPoolExecutor(server_config().get("asgi_workers", 8))
+
+    async def on_get(self, req: Any, resp: Any) -> None:
+        """
+        ASGI GET handler; see respond()
+
+        :param req: The Falcon request object.
+        :param resp: The Falcon response object.
+        """
+        if not self.admit(req, resp):
+            return
+        loop = asyncio.get_running_loop()
+        params = dict(req.params)
+        try:
+            response_body = await loop.run_in_executor(
+                self.executor, self.respond, params
+            )
+        finally:
+            self.admission.release()
+        if response_body is not None:
+            resp.media = response_body
+            resp.status = 200
 
 
-def deposit_watchdog(server: "WSGIServer") -> None:
+def deposit_watchdog(server: Any) -> None:
     """
     Kill this child process if main terminates
     """
@@ -241,17 +361,54 @@ def deposit_watchdog(server: "WSGIServer") -> None:
         watchdog_sleep("deposits", 10)
 
 
+def asgi_deposit_server(comptroller: Dict[str, Any]) -> None:
+    """
+    Serve the deposit api on an asyncio event loop with uvicorn.
+
+    :param comptroller: The comptroller dictionary.
+    """
+    try:
+        import uvicorn  # pylint: disable=import-outside-toplevel
+    except ImportError as error:
+        raise ImportError(
+            "Missing dependency for asgi deposit server: uvicorn"
+        ) from error
+    app = asgi.App(cors_enable=True)
+    app.add_route(f"/{ROUTE}", AsyncGatewayDepositServer(comptroller))
+    config = uvicorn.Config(
+        app,
+        host="0.0.0.0",
+        port=PORT,
+        log_level="warning",
+        backlog=server_config().get("asgi_backlog", 4096),
+    )
+    server = uvicorn.Server(config)
+    # signals belong to the gateway main process
+    server.install_signal_handlers = lambda: None
+    # Create and start the server thread
+    server_thread = Thread(target=server.run)
+    server_thread.start()
+    # Create and start the watchdog thread
+    watchdog_thread = Thread(target=deposit_watchdog, args=(server_thread,))
+    watchdog_thread.start()
+
+
 def deposit_server(comptroller: Dict[str, Any]) -> None:
     """
     Spawn a run forever API server instance and add routing information.
 
+    server_config()["asgi"] selects the asyncio server, else threaded wsgi
+
     :param comptroller: The comptroller dictionary.
     """
     json_ipc("deposit_id.txt", json_dumps(1))
-    app = App(cors_enable=True)
-    app.add_route(f"/{ROUTE}", GatewayDepositServer(comptroller))
     print(it("red", "INITIALIZING DEPOSIT SERVER\n"))
     print(it(159, "serving http at:"), it("green", SERVER_URL))
+    if server_config().get("asgi", False):
+        asgi_deposit_server(comptroller)
+        return
+    app = App(cors_enable=True)
+    app.add_route(f"/{ROUTE}", GatewayDepositServer(comptroller))
     # Create and start the server thread
     my_apps = wsgiserver.WSGIPathInfoDispatcher({"/": app})
     server = wsgiserver.WSGIServer(my_apps, host="0.0.0.0", port=PORT, num_threads=100)
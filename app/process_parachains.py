@@ -21,22 +21,39 @@ WTFPL litepresence.com Jan 2021
 apodize block data and write a parachain to disk for each offering
 """
 
+import asyncio
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
 from json import dumps as json_dumps
 from multiprocessing import Process
-from typing import Any, Dict, List
+from typing import Any, Dict, List, Optional, Set, Tuple
 
 # GATEWAY MODULES
-from config import offerings, parachain_params
+from address_allocator import PIPE, load_watchlist, scrub_watchlists
+from cadence import Cadence
+from config import offerings, parachain_params, processes, timing
 from ipc_utilities import chronicle, json_ipc
+from listener_dispatcher import transfer_keys
 from parachain_eosio import apodize_block_data as apodize_eosio_block_data
+from parachain_eosio import apodize_history_data as apodize_eosio_history_data
 from parachain_eosio import get_block_number as get_eosio_block_number
 from parachain_ltcbtc import apodize_block_data as apodize_ltcbtc_block_data
+from parachain_ltcbtc import await_block_number as await_ltcbtc_block_number
 from parachain_ltcbtc import get_block_number as get_ltcbtc_block_number
 from parachain_ripple import apodize_block_data as apodize_ripple_block_data
+from parachain_ripple import apodize_stream_data as apodize_ripple_stream_data
 from parachain_ripple import get_block_number as get_ripple_block_number
+from parachain_ripple import get_stream_block_number as get_ripple_stream_block_number
+from parachain_transfer import Transfer
+from parachain_window import ParachainWindow
 from parachain_xyz import apodize_block_data as apodize_xyz_block_data
 from parachain_xyz import get_block_number as get_xyz_block_number
-from watchdog import watchdog_sleep
+from watchdog import watchdog, watchdog_sleep
+
+# GLOBAL CONSTANTS
+# seconds Gateway.main waits for the parachains to resume and backfill
+READY_TIMEOUT = 600
 
 
 def get_block_number(network: str) -> int:
@@ -53,9 +70,30 @@ def get_block_number(network: str) -> int:
         "xrp": get_ripple_block_number,
         "xyz": get_xyz_block_number,
     }
+    if parachain_params()[network].get("mode") == "stream":
+        dispatch["xrp"] = get_ripple_stream_block_number
     return dispatch[network](network)
 
 
+def await_block_number(network: str, height: int, pause: float) -> int:
+    """
+    Return the irreversible block number once it reaches height, or after pause.
+
+    bitcoind and litecoind are long polled; other networks sleep then poll.
+
+    :param network: The network for which to get the block number.
+    :param height: The block number to wait for.
+    :param pause: The longest to wait; long polls return within ten seconds.
+    :return: The block number.
+    """
+    if network in ["ltc", "btc"]:
+        # feed the watchdog at least every ten seconds
+        watchdog("parachains")
+        return await_ltcbtc_block_number(network, height, min(pause, 10))
+    watchdog_sleep("parachains", pause)
+    return get_block_number(network)
+
+
 def apodize_block_data(network: str) -> Any:
     """
     Return the correct apodize function for each network.
@@ -70,18 +108,147 @@ def apodize_block_data(network: str) -> Any:
         "xrp": apodize_ripple_block_data,
         "xyz": apodize_xyz_block_data,
     }
+    if parachain_params()[network].get("mode") == "stream":
+        dispatch["xrp"] = apodize_ripple_stream_data
+    if parachain_params()[network].get("mode") == "history":
+        dispatch["eos"] = apodize_eosio_history_data
     return dispatch[network]
 
 
+def filter_parachain(
+    parachain: Dict[str, List[Transfer]], watchlist: Set[Tuple[str, str]]
+) -> Tuple[Dict[str, List[Transfer]], int]:
+    """
+    Keep only transfers which some listener is waiting for.
+
+    :param parachain: A parachain fragment.
+    :param watchlist: (address, memo) pairs published by the listener dispatchers.
+    :return: The filtered fragment and the number of transfers discarded.
+    """
+    filtered = {}
+    discarded = 0
+    for block_num, transfers in parachain.items():
+        kept = [
+            transfer
+            for transfer in transfers
+            if any(key in watchlist for key in transfer_keys(transfer))
+        ]
+        discarded += len(transfers) - len(kept)
+        filtered[block_num] = kept
+    return filtered, discarded
+
+
+def apodize_watched(
+    comptroller: Dict[str, Any], network: str, new_blocks: List[int]
+) -> Tuple[Dict[str, List[Transfer]], int]:
+    """
+    Build a parachain fragment of only the watched transfers in new blocks.
+
+    parachain_params()[network]["filter"] = False persists every transfer
+
+    :param comptroller: The comptroller dictionary.
+    :param network: The network of the parachain.
+    :param new_blocks: Block numbers to apodize.
+    :return: The parachain fragment and the number of transfers discarded.
+    """
+    apodize = apodize_block_data(network)
+    if not parachain_params()[network].get("filter", True):
+        return apodize(comptroller, new_blocks), 0
+    watchlist = load_watchlist(network)
+    # writers able to prune during extraction receive the watched addresses
+    scope = dict(comptroller, watch={key[0] for key in watchlist}, discarded=0)
+    new_parachain, discarded = filter_parachain(apodize(scope, new_blocks), watchlist)
+    return new_parachain, discarded + scope["discarded"]
+
+
+def write_status(
+    comptroller: Dict[str, Any],
+    network: str,
+    window: ParachainWindow,
+    discarded: int,
+    ready: bool,
+    cadence: Optional[Cadence] = None,
+) -> None:
+    """
+    Report the parachain's progress to the pipe as parachain_{network}_status.txt.
+
+    :param comptroller: The comptroller dictionary.
+    :param network: The network of the parachain.
+    :param window: The parachain window.
+    :param discarded: Transfers discarded by the watchlist filter this session.
+    :param ready: True once the parachain has caught up with the chain tip.
+    :param cadence: The live polling cadence, if any.
+    """
+    status = {
+        "block": window.latest,
+        "transfers": sum(len(v) for _, v in window.blocks),
+        "discarded": discarded,
+        "ready": ready,
+        "session": comptroller.get("session_unix", 0),
+        "unix": int(time.time()),
+    }
+    if cadence is not None:
+        status["cadence"] = cadence.report()
+    json_ipc(f"parachain_{network}_status.txt", json_dumps(status))
+
+
+def parachain_ready(comptroller: Dict[str, Any], network: str) -> bool:
+    """
+    :param comptroller: The comptroller dictionary, for the session.
+    :param network: The network of the parachain.
+    :return: True if the parachain has caught up during this session.
+    """
+    doc = f"parachain_{network}_status.txt"
+    if not os.path.exists(f"{PIPE}/{doc}"):
+        return False
+    status = json_ipc(doc) or {}
+    return bool(
+        status.get("ready")
+        and status.get("session") == comptroller.get("session_unix", 0)
+    )
+
+
+def await_parachains(
+    comptroller: Dict[str, Any], process: str, timeout: float = READY_TIMEOUT
+) -> None:
+    """
+    Block until every offered parachain reports ready for this session.
+
+    :param comptroller: The comptroller dictionary, for the session.
+    :param process: The name of the waiting process, to feed its watchdog.
+    :param timeout: The longest to wait, in seconds.
+    :raise TimeoutError: If a parachain is not ready in time.
+    """
+    start = time.time()
+    waiting = list(offerings())
+    while waiting:
+        waiting = [
+            network for network in waiting if not parachain_ready(comptroller, network)
+        ]
+        if waiting and time.time() - start > timeout:
+            raise TimeoutError(f"parachains {waiting} not ready")
+        if waiting:
+            watchdog_sleep(process, 0.2)
+
+
 def spawn_parachains(comptroller: Dict[str, Any]) -> None:
     """
     For each network listed in offerings, launch a parachain subprocess.
 
+    Persisted parachains are kept; each process resumes from its own.
+
     :param comptroller: The comptroller dictionary.
     """
-    # Scrub the parachains
+    # Scrub the previous session's watchlists; create any missing parachains
+    scrub_watchlists()
     for network in offerings():
-        json_ipc(f"parachain_{network}.txt", json_dumps({}))
+        if not os.path.exists(f"{PIPE}/parachain_{network}.txt"):
+            json_ipc(f"parachain_{network}.txt", json_dumps({}))
+
+    # processes()["parachains_async"] hosts every parachain in this process
+    if processes().get("parachains_async"):
+        asyncio.run(host_parachains(comptroller))
+        return
 
     # Launch parachain writing processes
     parachains = {}
@@ -93,49 +260,208 @@ def spawn_parachains(comptroller: Dict[str, Any]) -> None:
         parachains[network].start()
 
 
+def resume_parachain(
+    comptroller: Dict[str, Any], network: str, size: int
+) -> ParachainWindow:
+    """
+    Load the persisted parachain and backfill it up to the chain tip.
+
+    The missing blocks, at most a window of them, are fetched by the
+    network's concurrent apodizer and persisted unfiltered; the watchlists
+    of this session's listeners are not yet published.
+    A parachain more than a window behind is refilled with the latest window;
+    with none at all the parachain starts at the block before the tip.
+
+    :param comptroller: The comptroller dictionary.
+    :param network: The network of the parachain.
+    :param size: The window size.
+    :return: The parachain window, contiguous up to the block before the tip.
+    """
+    window = ParachainWindow.load(network, size)
+    current_block_num = get_block_number(network)
+    start = current_block_num - 1
+    if window.latest is not None:
+        start = max(window.latest + 1, current_block_num - size)
+        if start != window.latest + 1:
+            window = ParachainWindow(size)
+    new_blocks = [*range(start, current_block_num)]
+    if new_blocks:
+        window.extend(apodize_block_data(network)(comptroller, new_blocks))
+    window.save(network)
+    chronicle(comptroller, f"resumed parachain with {len(new_blocks)} blocks")
+    return window
+
+
+class ParachainWriter:
+    """
+    The state of one network's parachain between steps
+    """
+
+    def __init__(self, comptroller: Dict[str, Any], network: str) -> None:
+        """
+        :param comptroller: The comptroller dictionary.
+        :param network: The network of the parachain.
+        """
+        self.comptroller = dict(comptroller, network=network)
+        self.network = network
+        params = parachain_params()[network]
+        pause = params["pause"]
+        # the static pause seeds the cadence until a block time is learned
+        self.cadence = Cadence(
+            pause,
+            params.get("pause_min", pause / 8),
+            params.get("pause_max", pause * 4),
+        )
+        self.size = parachain_params()[network]["window"]
+        # the window lives in memory; the pipe file is only written
+        self.window = ParachainWindow(self.size)
+        self.discarded = 0
+        self.ready = False
+        # unix time of the last block number seen, for the watchdog
+        self.beat = time.time()
+
+    def start(self) -> None:
+        """
+        Resume the persisted parachain and report it ready.
+        """
+        self.window = resume_parachain(self.comptroller, self.network, self.size)
+        self.ready = True
+        write_status(self.comptroller, self.network, self.window, 0, True)
+
+    def height(self) -> int:
+        """
+        :return: The block number which makes a new block irreversible.
+        """
+        return self.window.latest + 2
+
+    def step(self, current_block_num: int) -> None:
+        """
+        Apodize and persist every block from the window to current_block_num.
+
+        :param current_block_num: The current irreversible block number.
+        """
+        self.beat = time.time()
+        self.cadence.observe(int(current_block_num), self.beat)
+        max_checked_block = self.window.latest
+        if int(current_block_num) > max_checked_block + 1:
+            # New blocks are all those from max on record to the current
+            new_blocks = [*range(max_checked_block + 1, int(current_block_num))]
+            # Get watched block data for all the new block numbers
+            new_parachain, new_discarded = apodize_watched(
+                self.comptroller, self.network, new_blocks
+            )
+            self.discarded += new_discarded
+            # Append the new blocks, evicting those beyond the window
+            self.window.extend(new_parachain)
+            # Write the windowed parachain to file
+            self.window.save(self.network)
+        # Report the filter effectiveness and the live cadence
+        write_status(
+            self.comptroller,
+            self.network,
+            self.window,
+            self.discarded,
+            True,
+            self.cadence,
+        )
+
+    def pause(self) -> float:
+        """
+        :return: Seconds to wait before polling the block number again.
+        """
+        return self.cadence.next_pause()
+
+
 def window_parachain(comptroller: Dict[str, Any]) -> None:
     """
     Maintain a windowed parachain in the pipe folder as parachain_{network}.txt.
 
     :param comptroller: The comptroller dictionary.
     """
-    network = comptroller["network"]
-    block_num = get_block_number(network) - 1
-    apodize = apodize_block_data(network)
-    new_blocks: List[int] = [block_num]
-    new_parachain = apodize(comptroller, new_blocks)
-    json_ipc(f"parachain_{network}.txt", json_dumps(new_parachain))
-    params = parachain_params()
-    chronicle(comptroller, "initializing parachain")
+    writer = ParachainWriter(comptroller, comptroller["network"])
+    iteration = 0
     while True:
-        watchdog_sleep("parachains", int(params[network]["pause"]))
-        # Get the current block number
-        current_block_num = get_block_number(network)
-        # Get the cached parachain via text pipe ipc
-        parachain_cache = json_ipc(f"parachain_{network}.txt")
-        # Extract the block numbers in the cached parachain
-        parachain_cache_nums = sorted([str(i) for i in list(parachain_cache.keys())])
-        # Determine the maximum block number on record
-        max_checked_block = max(parachain_cache_nums)
-        if int(current_block_num) > int(max_checked_block) + 1:
-            # New blocks are all those from max on record to the current
-            new_blocks = [*range(int(max_checked_block) + 1, int(current_block_num))]
-            # Get block data for all the new block numbers
-            new_parachain = apodize(comptroller, new_blocks)
-            # Append the new parachain to the old
-            parachain_cache.update(new_parachain)
-            # Get all the block numbers in the concatenated parachains
-            parachain_cache_nums = sorted(
-                [str(i) for i in list(parachain_cache.keys())]
+        # increment the delay between attempts exponentially, at most 5 seconds
+        time.sleep(min(0.02 * iteration**2, 5))
+        try:
+            if not writer.ready:
+                writer.start()
+            while True:
+                # Await the current block number
+                # before the watchlist, so no listener can miss a block
+                writer.step(
+                    await_block_number(writer.network, writer.height(), writer.pause())
+                )
+                iteration = 0
+        except Exception as error:
+            print(f"{writer.network} parachain failed {error.args}")
+            chronicle(writer.comptroller, f"parachain restarting {error.args}")
+        iteration += 1
+
+
+async def host_parachain(writer: ParachainWriter, executor: ThreadPoolExecutor) -> None:
+    """
+    Maintain one network's parachain as a task; a failure restarts only this task.
+
+    :param writer: The network's ParachainWriter.
+    :param executor: Threads for the blocking node and pipe calls.
+    """
+    loop = asyncio.get_running_loop()
+    iteration = 0
+    while True:
+        # increment the delay between attempts exponentially, at most 5 seconds
+        await asyncio.sleep(min(0.02 * iteration**2, 5))
+        try:
+            if not writer.ready:
+                await loop.run_in_executor(executor, writer.start)
+            while True:
+                if writer.network in ["ltc", "btc"]:
+                    # long polls return within ten seconds
+                    current_block_num = await loop.run_in_executor(
+                        executor,
+                        await_ltcbtc_block_number,
+                        writer.network,
+                        writer.height(),
+                        min(writer.pause(), 10),
+                    )
+                else:
+                    await asyncio.sleep(writer.pause())
+                    current_block_num = await loop.run_in_executor(
+                        executor, get_block_number, writer.network
+                    )
+                await loop.run_in_executor(executor, writer.step, current_block_num)
+                iteration = 0
+        except Exception as error:
+            print(f"{writer.network} parachain failed {error.args}")
+            await loop.run_in_executor(
+                executor,
+                chronicle,
+                writer.comptroller,
+                f"parachain task restarting {error.args}",
             )
-            # Window the block numbers to the latest blocks only
-            window = parachain_cache_nums[-params[network]["window"] :]
-            # Window the parachain
-            windowed_parachain = {
-                k: v for k, v in parachain_cache.items() if k in window
-            }
-            # Write the windowed parachain to file
-            json_ipc(f"parachain_{network}.txt", json_dumps(windowed_parachain))
+        iteration += 1
+
+
+async def host_parachains(comptroller: Dict[str, Any]) -> None:
+    """
+    Host every offered network's parachain as a task on one event loop.
+
+    The node pools, block fetchers, and their keep alive sessions are per
+    process, so the networks share them. The watchdog is fed only while
+    every network has seen a block number within the watchdog's stale limit.
+
+    :param comptroller: The comptroller dictionary.
+    """
+    writers = [ParachainWriter(comptroller, network) for network in offerings()]
+    # a long poll, a node call, and a step may each hold a thread per network
+    executor = ThreadPoolExecutor(3 * len(writers), thread_name_prefix="parachain")
+    # hold the tasks; the event loop keeps only weak references
+    tasks = [asyncio.ensure_future(host_parachain(w, executor)) for w in writers]
+    while True:
+        stale = timing()["watchdog_stale"]
+        if all(time.time() - writer.beat < stale for writer in writers):
+            watchdog("parachains")
+        await asyncio.sleep(10)
 
 
 def unit_test_parachains() -> None:
@@ -55,6 +55,7 @@ from parachain_eosio import verify_eosio_account
 from parachain_ltcbtc import verify_ltcbtc_account
 from parachain_ripple import verify_ripple_account
 from parachain_xyz import verify_xyz_account
+from signing.bitshares.money import Amount
 from signing_eosio import eos_transfer
 from signing_ltcbtc import ltcbtc_transfer
 from signing_ripple import xrp_transfer
@@ -458,9 +459,12 @@ def withdraw(withdrawal_id: int, comptroller: dict) -> None:
         order = {
             "private": foreign_accounts()[network][0]["private"],
             "public": foreign_accounts()[network][0]["public"],
-            "quantity": (
-                op[1]["amount"]["amount"]
-                / 10 ** gateway_assets()[network]["asset_precision"]
+            # the exact decimal string; never a float
+            "quantity": str(
+                Amount(
+                    op[1]["amount"]["amount"],
+                    gateway_assets()[network]["asset_precision"],
+                )
             ),
             "to": (
                 ovaltine(op[1]["memo"], gateway_assets()[network]["issuer_private"])
@@ -491,16 +495,12 @@ def withdraw(withdrawal_id: int, comptroller: dict) -> None:
         if verify(order["to"], comptroller):
             # Upon hearing real foreign chain transfer, reserve the UIA equal
             # FIXME: Do we need to deep copy here? Perhaps not... for good measure:
-            listener = Thread(
-                target=listener_boilerplate, args=(deepcopy(comptroller),)
-            )
-            listener.start()
+            listener_boilerplate(deepcopy(comptroller))
             msg = f"Spawn {network} withdrawal listener to reserve {order['quantity']}"
             print(it("red", msg), "\n")
             chronicle(comptroller, msg)
 
-            # Wait for the listener thread to initialize then transfer the order
-            time.sleep(30)
+            # The listener is registered from the current block; transfer the order
             timestamp()
             line_number()
             print(transfer(order, comptroller))
@@ -0,0 +1,164 @@
+r"""
+rate_limiter.py
+ ╔═══════════════════════════╗
+ ║ ╦═╗╦╔╦╗╔═╗╦ ╦╔═╗╦═╗╔═╗╔═╗ ║
+ ║ ╠═╣║ ║ ╚═╗╠═╣╠═╣╠╦╝╠═ ╚═╗ ║
+ ║ ╩═╝╩ ╩ ╚═╝╩ ╩╩ ╩╩╚═╚═╝╚═╝ ║
+ ║   ╔═╗╔═╗╔╦╗╔═╗╦ ╦╔═╗╦ ╦   ║
+ ║   ║ ╦╠═╣ ║ ╠═ ║║║╠═╣╚╦╝   ║
+ ║   ╚═╝╩ ╩ ╩ ╚═╝╚╩╝╩ ╩ ╩    ║
+ ║╔═╗ _                 _ ┌─┐║
+ ║╚═╝  \               /  └─┘║
+ ║╔═╗ _ \             / _ ┌─┐║
+ ║╚═╝  \  ╔═╗ ---> ┌─┐ /  └─┘║
+ ║╔═╗ _/  ╚═╝ <--- └─┘ \_ ┌─┐║
+ ║╚═╝   /             \   └─┘║
+ ║╔═╗ _/               \_ ┌─┐║
+ ║╚═╝                     └─┘║
+ ╚═══════════════════════════╝
+WTFPL litepresence.com Jan 2024
+
+Admission control for the deposit api
+
+    token buckets per client_id and per remote ip
+    a global cap on requests in flight
+    each bucket is two floats in a dict, refilled lazily on access
+    idle full buckets are purged periodically so memory tracks active clients
+"""
+
+# STANDARD MODULES
+import time
+from threading import Lock
+from typing import Dict, List, Optional
+
+# BITSHARES GATEWAY MODULES
+from config import server_config
+from utilities import it
+
+
+class TokenBuckets:
+    """
+    Keyed token buckets; rate tokens per second up to burst tokens
+    """
+
+    def __init__(self, rate: float, burst: float, purge: float = 60) -> None:
+        """
+        :param rate: tokens refilled per second
+        :param burst: maximum tokens held by any bucket
+        :param purge: seconds between sweeps of idle full buckets
+        """
+        self.rate = rate
+        self.burst = burst
+        self.purge = purge
+        self.buckets: Dict[str, List[float]] = {}
+        self.lock = Lock()
+        self.swept = time.monotonic()
+
+    def take(self, key: str, now: Optional[float] = None) -> bool:
+        """
+        Spend one token from this key's bucket.
+
+        :param key: the client identifier
+        :param now: monotonic time, for testing
+        :return: True if a token was available
+        """
+        now = time.monotonic() if now is None else now
+        with self.lock:
+            if now - self.swept > self.purge:
+                self.sweep(now)
+            bucket = self.buckets.get(key)
+            if bucket is None:
+                bucket = self.buckets[key] = [self.burst, now]
+            tokens = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+            if tokens < 1:
+                bucket[0] = tokens
+                return False
+            bucket[0] = tokens - 1
+            return True
+
+    def sweep(self, now: float) -> None:
+        """
+        Drop buckets which have refilled completely; caller holds the lock.
+
+        :param now: monotonic time
+        """
+        full = self.burst / self.rate if self.rate else float("inf")
+        self.buckets = {
+            key: bucket
+            for key, bucket in self.buckets.items()
+            if now - bucket[1] < full
+        }
+        self.swept = now
+
+
+class AdmissionControl:
+    """
+    Decide whether a deposit request may proceed, before any work is done
+    """
+
+    def __init__(self) -> None:
+        config = server_config()
+        self.clients = TokenBuckets(
+            config.get("client_rate", 0.2), config.get("client_burst", 3)
+        )
+        self.ips = TokenBuckets(config.get("ip_rate", 1), config.get("ip_burst", 10))
+        self.max_in_flight = config.get("max_in_flight", 64)
+        self.in_flight = 0
+        self.lock = Lock()
+
+    def admit(self, client_id: str, remote_ip: str) -> Optional[str]:
+        """
+        Admit a request, counting it in flight.
+
+        :param client_id: the BitShares client_id query parameter
+        :param remote_ip: the remote address of the request
+        :return: None if admitted, else the reason for rejection
+        """
+        # claim a slot first so a busy gateway does not drain anyone's tokens
+        with self.lock:
+            if self.in_flight >= self.max_in_flight:
+                return "gateway busy"
+            self.in_flight += 1
+        reason = None
+        if not self.ips.take(remote_ip):
+            reason = "too many requests from this ip"
+        elif not self.clients.take(client_id):
+            reason = "too many requests for this client_id"
+        if reason is not None:
+            self.release()
+        return reason
+
+    def release(self) -> None:
+        """
+        Mark an admitted request as finished.
+        """
+        with self.lock:
+            self.in_flight -= 1
+
+
+def unit_test() -> None:
+    """
+    Burst a single client and then let the bucket refill.
+    """
+    print("\033c")
+    print(unit_test.__doc__, "\n")
+    buckets = TokenBuckets(rate=0.5, burst=3, purge=10)
+    for now in [0, 0, 0, 0, 1, 2, 2, 4, 100]:
+        print(it("yellow", f"t={now:<4}"), buckets.take("1.2.x", now), buckets.buckets)
+    admission = AdmissionControl()
+    start = time.perf_counter()
+    rejected = [admission.admit("1.2.x", "127.0.0.1") for _ in range(10000)]
+    elapsed = (time.perf_counter() - start) / 10000
+    print(it("green", f"\n{elapsed * 1e6:.2f} microseconds per decision"))
+    print(sum(bool(reason) for reason in rejected), "of 10000 rejected")
+    admission = AdmissionControl()
+    admission.in_flight = admission.max_in_flight
+    print(it("yellow", "\nbusy:"), admission.admit("1.2.y", "127.0.0.2"))
+    admission.in_flight = 0
+    print(it("yellow", "after busy:"), admission.admit("1.2.y", "127.0.0.2"))
+    print(admission.clients.buckets["1.2.y"][0], "client tokens left")
+
+
+if __name__ == "__main__":
+    unit_test()
@@ -39,6 +39,7 @@ from .config import (
 from .graphene_signing import (
     ObjectId,
 )
+from .money import Amount
 from .rpc import (
     rpc_balances,
     rpc_block_number,
@@ -154,7 +155,7 @@ def graphenize_issue(issue_edicts, fees, asset_id, asset_precision, account_id,
         # convert to graphene amount, asset_id type
         # class Asset_issue(GrapheneObject): # OPERATION ID 14 "asset_issue"
         fee = OrderedDict([("amount", fees["issue"]), ("asset_id", "1.3.0")])
-        graphene_amount = issue["amount"] * 10**asset_precision
+        graphene_amount = Amount.parse(issue["amount"], asset_precision).units
         amount_dict = OrderedDict([("amount", graphene_amount), ("asset_id", asset_id)])
         # issue ordered dictionary from each buy/sell operation
         operation = [
@@ -182,7 +183,7 @@ def graphenize_reserve(reserve_edicts, fees, asset_id, asset_precision, account_
         # convert to graphene amount, asset_id type
         # class Asset_reserve(GrapheneObject): # OPERATION ID 15 "asset_reserve"
         fee = OrderedDict([("amount", fees["reserve"]), ("asset_id", "1.3.0")])
-        graphene_amount = reserve["amount"] * 10**asset_precision
+        graphene_amount = Amount.parse(reserve["amount"], asset_precision).units
         amount_dict = OrderedDict([("amount", graphene_amount), ("asset_id", asset_id)])
         # reserve ordered dictionary from each buy/sell operation
         operation = [
@@ -210,7 +211,7 @@ def graphenize_transfer(
         # convert to graphene amount, asset_id type
         # class Transfer(GrapheneObject): # OPERATION ID 0 "transfer"
         fee = OrderedDict([("amount", fees["transfer"]), ("asset_id", "1.3.0")])
-        graphene_amount = int(transfer["amount"] * 10**asset_precision)
+        graphene_amount = Amount.parse(transfer["amount"], asset_precision).units
         amount_dict = OrderedDict([("amount", graphene_amount), ("asset_id", asset_id)])
         # transfer ordered dictionary from each buy/sell operation
         operation = [
@@ -347,7 +348,7 @@ def save_core_fees(buy_edicts, sell_edicts, asset_id, currency_id):
     return buy_edicts, sell_edicts
 
 
-def build_transaction(rpc, order):
+def build_transaction(rpc, order, block=None, fees=None):
     """
     # this performs incoming limit order api conversion
     # from human terms to graphene terms
@@ -374,6 +375,8 @@ def build_transaction(rpc, order):
      - bundled cancel/buy/sell transactions out; cancel first
      - prevent inadvertent huge number of orders
      - do not place orders for dust amounts
+
+    # a resident caller may pass a recent block and fees to skip their round trips
     """
     # VALIDATE INCOMING DATA
     for key, expected_type in [("edicts", list), ("nodes", list), ("header", dict)]:
@@ -402,11 +405,13 @@ def build_transaction(rpc, order):
         ObjectId(check)
     # GATHER TRANSACTION HEADER DATA
     # fetch block data via websocket request
-    block = rpc_block_number(rpc)
+    if block is None:
+        block = rpc_block_number(rpc)
     ref_block_num = block["head_block_number"] & 0xFFFF
     ref_block_prefix = unpack_from("<I", unhexlify(block["head_block_id"]), 4)[0]
     # fetch limit order create and cancel fee via websocket request
-    fees = rpc_tx_fees(rpc, account_id)
+    if fees is None:
+        fees = rpc_tx_fees(rpc, account_id)
     # establish transaction expiration
     tx_expiration = to_iso_date(int(time.time() + 120))
     # initialize tx_operations list
@@ -36,6 +36,19 @@ ATTEMPTS = 3
 LIMIT = 20
 # default True to execute order in primary script process
 JOIN = True
+# local socket of the resident signing service; None to fork a process per order
+# connections authenticate with the Gateway run's random multiprocessing authkey
+SERVICE_ADDRESS = ("127.0.0.1", 47470)
+# signing service reuse of reference block and fees, default 30 seconds
+CACHE_TTL = 30
+# signing service wait for more issue/reserve orders to share a transaction
+BATCH_WINDOW = 0.5
+# most issue/reserve orders per transaction; at most LIMIT
+BATCH_SIZE = 10
+# fraction of transactions whose serialization is also checked by a node, default 1
+# 1 asks the node every time, 0 trusts the offline serializer alone
+# lower it, eg. to 0.05, once unit_test_serializer.py node passes against your node
+SERIALIZER_CANARY = 1
 # ignore orders value less than ~X bitshares; 0 to disable
 DUST = 0
 # True = heavy print output
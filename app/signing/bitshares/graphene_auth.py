@@ -35,6 +35,7 @@ from .config import (
     JOIN,
     PROCESS_TIMEOUT,
     NODES,
+    SERVICE_ADDRESS,
 )
 from .graphene_signing import (
     PrivateKey,
@@ -47,6 +48,7 @@ from .rpc import (
     rpc_key_reference,
     wss_handshake,
 )
+from .signing_service import submit
 from .utilities import it, trace
 from .build_transaction import build_transaction
 
@@ -80,28 +82,30 @@ def prototype_order(info, nodes=None):
     return order
 
 
-def issue(info, amount, account_id):
+def issue(info, amount, account_id, service=False):
     """
     Put UIA.XYZ in user's BitShares wallet.
+    service True tries the resident signing service first
     """
     order = prototype_order(info)
     order["edicts"] = [{"op": "issue", "amount": amount, "account_id": account_id}]
     print(order["header"]["account_name"], order["header"]["asset_id"], order["edicts"])
-    broker(order)
+    return broker(order, service)
 
 
-def reserve(info, amount):
+def reserve(info, amount, service=False):
     """
     Put UIA.XYZ into the reserve pool.
+    service True tries the resident signing service first
     """
     order = prototype_order(info)
     order["edicts"] = [{"op": "reserve", "amount": amount}]
     print(order["header"]["account_name"], order["header"]["asset_id"], order["edicts"])
-    broker(order)
+    return broker(order, service)
 
 
 # Main process
-def broker(order):
+def broker(order, service=False):
     """
     "broker(order) --> execute(signal, order)"
     # insistent timed multiprocess wrapper for authorized ops
@@ -110,7 +114,19 @@ def broker(order):
     # serves to force disconnect websockets if hung
     "up to ATTEMPTS chances; each PROCESS_TIMEOUT long: else abort"
     # signal is switched to 0 after execution to end the process
+    # with service True orders go to the resident signing service instead,
+    # falling back to the fork when it did not receive them
+    # returns a receipt dict; "auth", and the "tx_id" from the signing service
     """
+    if (
+        service
+        and SERVICE_ADDRESS is not None
+        and order["edicts"][0]["op"] not in ("login", "cancel")
+    ):
+        try:
+            return submit(order)
+        except ConnectionRefusedError as error:
+            print(it("yellow", f"signing service {error.args}, forking a process"))
     signal = Value("i", 0)
     auth = Value("i", 0)
     iteration = 0
@@ -123,7 +139,7 @@ def broker(order):
         if JOIN:  # means main script will not continue till child done
             child.join(PROCESS_TIMEOUT)
 
-    return bool(auth.value)
+    return {"auth": bool(auth.value), "tx_id": None, "rejected": False, "batch": 1}
 
 
 def execute(signal, auth, order):
@@ -142,10 +158,14 @@ def execute(signal, auth, order):
             if signed_tx is None:
                 msg = it("red", "FAILED TO AUTHENTICATE ORDER")
                 return msg
-            signed_tx = verify_transaction(signed_tx, wif)
+            signed_tx = verify_transaction(signed_tx, message, wif)
             # don't actaully broadcast login op, signing it is enough
             if order["edicts"][0]["op"] != "login":
-                print(rpc_broadcast_transaction(rpc, signed_tx, order["header"]["client_order_id"]))
+                print(
+                    rpc_broadcast_transaction(
+                        rpc, signed_tx, order["header"].get("client_order_id", 1)
+                    )
+                )
             auth.value = 1
             msg = it("green", "EXECUTED ORDER")
         else:
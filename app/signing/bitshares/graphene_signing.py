@@ -29,7 +29,9 @@ from hashlib import new as hashlib_new  # access algorithm library
 from hashlib import sha256  # message digest algorithm
 from json import dumps as json_dumps  # serialize object to string
 from json import loads as json_loads  # deserialize string to object
+from random import random  # sample the serialization canary
 from struct import pack  # convert to string representation of C struct
+from threading import local  # per thread recovery buffers
 
 # THIRD PARTY MODULES
 from ecdsa import SECP256k1 as ecdsa_SECP256k1  # curve
@@ -37,13 +39,12 @@ from ecdsa import SigningKey as ecdsa_SigningKey  # class
 from ecdsa import VerifyingKey as ecdsa_VerifyingKey  # class
 from ecdsa import numbertheory as ecdsa_numbertheory  # largest import
 from ecdsa import util as ecdsa_util  # module
-from secp256k1 import PrivateKey as secp256k1_PrivateKey  # class
 from secp256k1 import PublicKey as secp256k1_PublicKey  # class
 from secp256k1 import ffi as secp256k1_ffi  # compiled ffi object
 from secp256k1 import lib as secp256k1_lib  # library
 
 # GRAPHENE SIGNING MODULES
-from .config import ID, PREFIX
+from .config import ID, PREFIX, SERIALIZER_CANARY
 from .rpc import rpc_get_transaction_hex
 from .utilities import from_iso_date, it
 
@@ -70,6 +71,11 @@ BASE58 = b"123456789ABCDEFGHJKLMNPQRSTUVWXYZabcdefghijkmnopqrstuvwxyz"
 # hex encoding and decoding
 HEXDIGITS = "0123456789abcdefABCDEF"
 ALL_FLAGS = secp256k1_lib.SECP256K1_CONTEXT_VERIFY | secp256k1_lib.SECP256K1_CONTEXT_SIGN
+# one long lived libsecp256k1 context for every signature and verification;
+# creating a context precomputes tables, far costlier than a signature
+CONTEXT = secp256k1_lib.secp256k1_context_create(ALL_FLAGS)
+# KeyMaterial by wif, or by raw secret for a PrivateKey
+KEYS = {}
 
 
 class ObjectId:
@@ -524,6 +530,53 @@ class PrivateKey:
         return bytes(self._wif)
 
 
+class KeyMaterial:
+    """
+    a private key and its compressed public key, derived with libsecp256k1
+    instead of the pure python point multiplication of PrivateKey
+    """
+
+    def __init__(self, secret):
+        self.secret = secret
+        pubkey = secp256k1_ffi.new("secp256k1_pubkey *")
+        if not secp256k1_lib.secp256k1_ec_pubkey_create(CONTEXT, pubkey, secret):
+            raise ValueError("invalid private key")
+        output = secp256k1_ffi.new("unsigned char[33]")
+        length = secp256k1_ffi.new("size_t *", 33)
+        secp256k1_lib.secp256k1_ec_pubkey_serialize(
+            CONTEXT, output, length, pubkey, secp256k1_lib.SECP256K1_EC_COMPRESSED
+        )
+        self.compressed = bytes(secp256k1_ffi.buffer(output, 33))
+        self.pubkey = PublicKey(hexlify(self.compressed).decode("ascii"))
+
+
+class Recovery(local):
+    """
+    libsecp256k1 buffers for public key recovery, allocated once per thread
+    """
+
+    def __init__(self):
+        super().__init__()
+        self.signature = secp256k1_ffi.new("secp256k1_ecdsa_recoverable_signature *")
+        self.pubkey = secp256k1_ffi.new("secp256k1_pubkey *")
+        self.output = secp256k1_ffi.new("unsigned char[33]")
+        self.length = secp256k1_ffi.new("size_t *")
+        self.found = bytearray(33)
+
+
+RECOVERY = Recovery()
+
+
+def load_key(wif):
+    """
+    the KeyMaterial of a wif or PrivateKey, derived on first use then cached
+    """
+    secret = bytes(wif) if isinstance(wif, PrivateKey) else None
+    if (secret or wif) not in KEYS:
+        KEYS[secret or wif] = KeyMaterial(secret or bytes(Base58(wif)))
+    return KEYS[secret or wif]
+
+
 # SERIALIZATION OBJECTS
 
 
@@ -591,16 +644,16 @@ class Operation:
         name = OP_NAMES[self.op_id]
         self.name = name[0].upper() + name[1:]
 
-        if op[0] == 0:
-            self.op = Transfer(op[1])
-        elif op[0] == 1:
-            self.op = LimitOrderCreate(op[1])
-        elif op[0] == 2:
-            self.op = LimitOrderCancel(op[1])
-        elif op[0] == 14:
-            self.op = AssetIssue(op[1])
-        elif op[0] == 15:
-            self.op = AssetReserve(op[1])
+        if self.op_id == 0:
+            self.operation = Transfer(operation[1])
+        elif self.op_id == 1:
+            self.operation = LimitOrderCreate(operation[1])
+        elif self.op_id == 2:
+            self.operation = LimitOrderCancel(operation[1])
+        elif self.op_id == 14:
+            self.operation = AssetIssue(operation[1])
+        elif self.op_id == 15:
+            self.operation = AssetReserve(operation[1])
 
     def __bytes__(self):
         return bytes(Id(self.op_id)) + bytes(self.operation)
@@ -911,10 +964,6 @@ def serialize_transaction(rpc, trx):
     for idx, _ in enumerate(tx_ops):
         if "memo" in tx_ops[idx][1].keys() and tx_ops[idx][1]["memo"] == "":
             tx_ops[idx][1] = {k: v for k, v in tx_ops[idx][1].items() if k != "memo"}
-    rpc_tx = dict(trx)
-    rpc_tx["operations"] = tx_ops
-    # find out how the backend suggests to serialize the trx
-    rpc_tx_hex = rpc_get_transaction_hex(rpc, json_loads(json_dumps(rpc_tx)))
     buf = b""  # create an empty byte string buffer
     # add block number, prefix, and trx expiration to the buffer
     buf += pack("<H", trx["ref_block_num"])  # 2 byte int
@@ -943,11 +992,26 @@ def serialize_transaction(rpc, trx):
     manual_tx_hex = hexlify(buf)
     # prepend the chain ID to the buffer to create final serialized msg
     message = unhexlify(ID) + buf
-    # if serialization is correct: rpc_tx_hex = manual_tx_hex plus an empty signature
-    assert rpc_tx_hex == manual_tx_hex + b"00", "Serialization Failed"
+    # the manual serialization is verified offline by unit_test_serializer.py;
+    # a sample of transactions still ask the backend, as a canary
+    if rpc is not None and random() < SERIALIZER_CANARY:
+        rpc_tx = dict(trx)
+        rpc_tx["operations"] = tx_ops
+        # find out how the backend suggests to serialize the trx
+        rpc_tx_hex = rpc_get_transaction_hex(rpc, json_loads(json_dumps(rpc_tx)))
+        # if serialization is correct: rpc_tx_hex = manual_tx_hex plus an empty signature
+        assert rpc_tx_hex == manual_tx_hex + b"00", "Serialization Failed"
     return trx, message
 
 
+def transaction_id(message):
+    """
+    the graphene transaction id; first 20 bytes of the sha256
+    of the unsigned serialization, without the chain id prefix
+    """
+    return hexlify(sha256(message[len(unhexlify(ID)) :]).digest()[:20]).decode("ascii")
+
+
 def sign_transaction(trx, message, wif):
     """
     # graphenebase/ecdsa.py
@@ -991,25 +1055,26 @@ def sign_transaction(trx, message, wif):
     # culminates with the message meeting the wif
     # begin with the 8 bit string representation of private key
     try:
-        private_key = bytes(PrivateKey(wif))
+        # derived once per wif, then cached
+        key = load_key(wif)
     except:
         return
     # create some arbitrary data used by the nonce generation
     ndata = secp256k1_ffi.new("const int *ndata")
     ndata[0] = 0  # it adds "\0x00", then "\0x00\0x00", etc..
+    # a recoverable 65 byte ECDSA signature, its compact form and recovery id;
+    # allocated once and overwritten by each attempt
+    sig = secp256k1_ffi.new("secp256k1_ecdsa_recoverable_signature *")
+    compact = secp256k1_ffi.new("unsigned char[64]")
+    recovery_id = secp256k1_ffi.new("int *")
     while True:  # repeat process until deterministic and cannonical
         ndata[0] += 1  # increment the arbitrary nonce
-        # obtain compiled/binary private key from the wif
-        privkey = secp256k1_PrivateKey(private_key, raw=True)
-        # create a new recoverable 65 byte ECDSA signature
-        sig = secp256k1_ffi.new("secp256k1_ecdsa_recoverable_signature *")
-        # parse a compact ECDSA signature (64 bytes + recovery id)
         # returns: 1 = deterministic; 0 = not deterministic
         deterministic = secp256k1_lib.secp256k1_ecdsa_sign_recoverable(
-            privkey.ctx,  # initialized context object
+            CONTEXT,  # the long lived context object
             sig,  # array where signature is held
             digest,  # 32-byte message hash being signed
-            privkey.private_key,  # 32-byte secret key
+            key.secret,  # 32-byte secret key
             secp256k1_ffi.NULL,  # default nonce function
             ndata,  # incrementing nonce data
         )
@@ -1020,7 +1085,11 @@ def sign_transaction(trx, message, wif):
         # it links the signature to a single unique public key
         # without this parameter, the back-end would need to test
         # for multiple public keys instead of just one
-        signature, i = privkey.ecdsa_recoverable_serialize(sig)
+        secp256k1_lib.secp256k1_ecdsa_recoverable_signature_serialize_compact(
+            CONTEXT, compact, recovery_id, sig
+        )
+        signature = bytes(secp256k1_ffi.buffer(compact, 64))
+        i = recovery_id[0]
         # we ensure that the signature is canonical; simplest/reduced form
         if canonical(signature):
             # add 4 and 27 to stay compatible with other protocols
@@ -1039,17 +1108,44 @@ def sign_transaction(trx, message, wif):
     return trx
 
 
-def verify_transaction(trx, wif):
+def verify_transaction(trx, message, wif):
     """
     # gist.github.com/xeroc/9bda11add796b603d83eb4b41d38532b
     # once you have derived your new trx including the signatures
     # verify your transaction and it's signature
+    # the message is that of serialize_transaction(); recover the public key
+    # of each compact signature and compare it to the cached public key
+    # rather than rebuild the transaction as a SignedTransaction
     """
-    tx2 = SignedTransaction(**trx)
-    tx2.derive_digest(PREFIX)
-    pubkeys = [PrivateKey(wif).pubkey]
-    tx2.verify(pubkeys, PREFIX)
-    return trx
+    key = load_key(wif)
+    digest = sha256(message).digest()
+    buffers = RECOVERY
+    for signature in trx["signatures"]:
+        signature = unhexlify(signature)
+        # strip the compact and compressed flags from the recovery parameter
+        recover_parameter = signature[0] - 4 - 27
+        if not 0 <= recover_parameter <= 3:
+            continue
+        if not secp256k1_lib.secp256k1_ecdsa_recoverable_signature_parse_compact(
+            CONTEXT, buffers.signature, signature[1:], recover_parameter
+        ):
+            continue
+        if not secp256k1_lib.secp256k1_ecdsa_recover(
+            CONTEXT, buffers.pubkey, buffers.signature, digest
+        ):
+            continue
+        buffers.length[0] = 33
+        secp256k1_lib.secp256k1_ec_pubkey_serialize(
+            CONTEXT,
+            buffers.output,
+            buffers.length,
+            buffers.pubkey,
+            secp256k1_lib.SECP256K1_EC_COMPRESSED,
+        )
+        secp256k1_ffi.memmove(buffers.found, buffers.output, 33)
+        if buffers.found == key.compressed:
+            return trx
+    raise Exception("Signature for %s missing" % format(key.pubkey, PREFIX))
 
 
 def verify_message(message, signature):
@@ -1069,11 +1165,11 @@ def verify_message(message, signature):
 
     # ecdsa.PublicKey with additional functions to serialize
     # in uncompressed and compressed formats
-    pub = secp256k1_PublicKey(flags=ALL_FLAGS)
+    pub = secp256k1_PublicKey(flags=ALL_FLAGS, ctx=CONTEXT)
     # recover raw signature
     sig = pub.ecdsa_recoverable_deserialize(signature[1:], recover_parameter)
     # recover public key
-    verify_pub = secp256k1_PublicKey(pub.ecdsa_recover(message, sig))
+    verify_pub = secp256k1_PublicKey(pub.ecdsa_recover(message, sig), ctx=CONTEXT)
     # convert recoverable sig to normal sig
     normal_sig = verify_pub.ecdsa_recoverable_convert(sig)
     # verify
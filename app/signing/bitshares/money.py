@@ -0,0 +1,175 @@
+r"""
+money.py
+
+  ____  _ _   ____  _                         
+ | __ )(_) |_/ ___|| |__   __ _ _ __ ___  ___ 
+ |  _ \| | __\___ \| '_ \ / _` | '__/ _ \/ __|
+ | |_) | | |_ ___) | | | | (_| | | |  __/\__ \
+ |____/|_|\__|____/|_| |_|\__,_|_|  \___||___/
+       ____  _             _                  
+      / ___|(_) __ _ _ __ (_)_ __   __ _      
+      \___ \| |/ _` | '_ \| | '_ \ / _` |     
+       ___) | | (_| | | | | | | | | (_| |     
+      |____/|_|\__, |_| |_|_|_| |_|\__, |     
+               |___/               |___/      
+
+
+WTFPL litepresence.com Dec 2021 & squidKid-deluxe Jan 2024
+
+Integer backed fixed point amounts
+
+    an Amount is integer base units plus the precision of one unit,
+    the same representation graphene uses for every asset amount
+    parsing truncates excess places and never passes through a float
+    arithmetic and comparison across precisions are exact
+    str() is canonical; always exactly precision decimal places
+    batch helpers parse or total many amounts in one pass
+
+"""
+# STANDARD PYTHON MODULES
+from decimal import Decimal as decimal
+from functools import total_ordering
+from typing import Iterable, List, Union
+
+
+@total_ordering
+class Amount:
+    """
+    units / 10**precision, eg. Amount(150, 2) is 1.50
+    """
+
+    __slots__ = ("units", "precision")
+
+    def __init__(self, units: int, precision: int) -> None:
+        self.units = int(units)
+        self.precision = int(precision)
+
+    @classmethod
+    def parse(
+        cls, value: Union["Amount", str, int, float, decimal], precision: int
+    ) -> "Amount":
+        """
+        Any amount to this precision, truncating places beyond it.
+
+        floats parse from their shortest repr, so 0.29 is 29 cents, not 28.999...
+
+        :param value: eg. "1.0001", 1.0001, Decimal("1.0001"), or an Amount
+        :param precision: decimal places of one base unit
+        :return: the Amount
+        """
+        if isinstance(value, Amount):
+            return value.rescale(precision)
+        if isinstance(value, int):
+            return cls(value * 10**precision, precision)
+        text = repr(value) if isinstance(value, float) else str(value)
+        if "e" in text or "E" in text:
+            text = f"{decimal(text):f}"
+        negative = text.startswith("-")
+        whole, _, fraction = text.lstrip("+-").partition(".")
+        units = int((whole or "0") + fraction[:precision].ljust(precision, "0"))
+        return cls(-units if negative else units, precision)
+
+    def rescale(self, precision: int) -> "Amount":
+        """
+        :param precision: decimal places of one base unit
+        :return: this amount at that precision, truncated toward zero if fewer places
+        """
+        if precision >= self.precision:
+            return Amount(self.units * 10 ** (precision - self.precision), precision)
+        scale = 10 ** (self.precision - precision)
+        units = abs(self.units) // scale
+        return Amount(-units if self.units < 0 else units, precision)
+
+    def aligned(self, other: "Amount") -> tuple:
+        """
+        :return: (self units, other units) at the finer of the two precisions
+        """
+        if self.precision == other.precision:
+            return self.units, other.units
+        precision = max(self.precision, other.precision)
+        return (
+            self.units * 10 ** (precision - self.precision),
+            other.units * 10 ** (precision - other.precision),
+        )
+
+    def __add__(self, other: "Amount") -> "Amount":
+        units, other_units = self.aligned(other)
+        return Amount(units + other_units, max(self.precision, other.precision))
+
+    def __sub__(self, other: "Amount") -> "Amount":
+        units, other_units = self.aligned(other)
+        return Amount(units - other_units, max(self.precision, other.precision))
+
+    def __mul__(self, factor: int) -> "Amount":
+        return Amount(self.units * int(factor), self.precision)
+
+    __rmul__ = __mul__
+
+    def __neg__(self) -> "Amount":
+        return Amount(-self.units, self.precision)
+
+    def __eq__(self, other: object) -> bool:
+        if not isinstance(other, Amount):
+            return NotImplemented
+        units, other_units = self.aligned(other)
+        return units == other_units
+
+    def __lt__(self, other: "Amount") -> bool:
+        units, other_units = self.aligned(other)
+        return units < other_units
+
+    def __hash__(self) -> int:
+        # equal amounts at different precisions hash alike
+        units, precision = self.units, self.precision
+        while precision and not units % 10:
+            units //= 10
+            precision -= 1
+        return hash((units, precision))
+
+    def __bool__(self) -> bool:
+        return bool(self.units)
+
+    def __float__(self) -> float:
+        return self.units / 10**self.precision
+
+    def __str__(self) -> str:
+        sign = "-" if self.units < 0 else ""
+        digits = str(abs(self.units)).rjust(self.precision + 1, "0")
+        if not self.precision:
+            return sign + digits
+        return f"{sign}{digits[:-self.precision]}.{digits[-self.precision:]}"
+
+    def __repr__(self) -> str:
+        return f"Amount('{self}')"
+
+
+def parse_units(values: Iterable, precision: int) -> List[int]:
+    """
+    :param values: amounts as accepted by Amount.parse
+    :param precision: decimal places of one base unit
+    :return: the integer base units of each
+    """
+    return [Amount.parse(value, precision).units for value in values]
+
+
+def total(amounts: Iterable[Amount], precision: int) -> Amount:
+    """
+    :param amounts: Amounts of any precisions, each truncated to precision
+    :param precision: decimal places of the result
+    :return: the sum
+    """
+    return Amount(sum(amount.rescale(precision).units for amount in amounts), precision)
+
+
+def unit_test():
+    """
+    Values a float or a sliced .99f string would get wrong.
+    """
+    print(Amount.parse(0.29, 8), Amount.parse("1e-8", 8), Amount.parse(-1.5, 0))
+    print(Amount.parse("0.1", 8) + Amount.parse("0.2", 4) == Amount.parse("0.3", 5))
+    print(Amount.parse("123.456789", 4), Amount(1, 8).rescale(4), Amount(5, 0))
+    print(parse_units(["1", 0.5, "0.00001"], 5), total([Amount(1, 8), Amount(1, 2)], 8))
+
+
+if __name__ == "__main__":
+    unit_test()
@@ -0,0 +1,337 @@
+r"""
+signing_service.py
+
+  ____  _ _   ____  _                         
+ | __ )(_) |_/ ___|| |__   __ _ _ __ ___  ___ 
+ |  _ \| | __\___ \| '_ \ / _` | '__/ _ \/ __|
+ | |_) | | |_ ___) | | | | (_| | | |  __/\__ \
+ |____/|_|\__|____/|_| |_|\__,_|_|  \___||___/
+       ____  _             _                  
+      / ___|(_) __ _ _ __ (_)_ __   __ _      
+      \___ \| |/ _` | '_ \| | '_ \ / _` |     
+       ___) | | (_| | | | | | | | | (_| |     
+      |____/|_|\__, |_| |_|_|_| |_|\__, |     
+               |___/               |___/      
+
+
+WTFPL litepresence.com Dec 2021 & squidKid-deluxe Jan 2024
+
+Resident BitShares signing service
+
+    one long lived process keeps a warm node connection, a recent reference
+    block, cached fees and preloaded keys, then signs and broadcasts orders
+    received over a local socket; an order which outlives PROCESS_TIMEOUT
+    ends the service and the supervisor respawns it, as broker() once did
+
+    issue and reserve orders arriving together are signed as one multi op
+    transaction per asset; every order learns the shared transaction id
+
+    the socket authkey is the multiprocessing authkey, random for each run of
+    the Gateway and inherited by every process it starts; no secret is configured
+
+"""
+# DISABLE SELECT PYLINT TESTS
+# pylint: disable=broad-except
+#
+# STANDARD PYTHON MODULES
+import os
+import time
+from multiprocessing import AuthenticationError, Process, current_process
+from multiprocessing.connection import Client, Listener
+from threading import Event, Lock, Thread, Timer
+
+# GRAPHENE SIGNING MODULES
+from .build_transaction import build_transaction
+from .config import (
+    ATTEMPTS,
+    BATCH_SIZE,
+    BATCH_WINDOW,
+    CACHE_TTL,
+    LIMIT,
+    PROCESS_TIMEOUT,
+    SERVICE_ADDRESS,
+)
+from .graphene_signing import (
+    load_key,
+    serialize_transaction,
+    sign_transaction,
+    transaction_id,
+    verify_transaction,
+)
+from .rpc import (
+    rpc_block_number,
+    rpc_broadcast_transaction,
+    rpc_tx_fees,
+    wss_handshake,
+)
+from .utilities import it, trace
+
+
+class SigningService:
+    """
+    warm state shared by every order the service signs
+    """
+
+    def __init__(self, infos):
+        """
+        :param infos: gateway asset info dicts; their issuer keys are preloaded
+        """
+        self.rpc = wss_handshake()
+        self.lock = Lock()
+        # derive the issuer keys now, rather than on the first order
+        for info in infos:
+            load_key(info["issuer_private"])
+        self.accounts = {i["issuer_id"] for i in infos}
+        self.block = None
+        self.fees = {}
+        self.refreshed = 0
+        # issue and reserve orders awaiting a batch, by asset and issuer
+        self.pending = {}
+        self.pending_lock = Lock()
+
+    def connection(self):
+        """
+        the node connection, reopened if a query dropped it
+        """
+        if not getattr(self.rpc, "connected", False):
+            self.rpc = wss_handshake(self.rpc)
+        return self.rpc
+
+    def refresh(self, account_id=None):
+        """
+        fetch the reference block and fees if stale or for a new account
+        """
+        if account_id is not None:
+            self.accounts.add(account_id)
+        stale = time.time() - self.refreshed > CACHE_TTL
+        if stale or (account_id is not None and account_id not in self.fees):
+            rpc = self.connection()
+            self.block = rpc_block_number(rpc)
+            self.fees = {
+                account: rpc_tx_fees(rpc, account) for account in self.accounts
+            }
+            self.refreshed = time.time()
+
+    def keepalive(self):
+        """
+        refresh while idle so orders find the caches warm
+        """
+        while True:
+            time.sleep(CACHE_TTL / 2)
+            with self.lock:
+                try:
+                    self.refresh()
+                except Exception as error:
+                    trace(error)
+                    self.refreshed = 0
+
+    def execute(self, order, deadline=None):
+        """
+        sign and broadcast one order
+        :param deadline: time.time() after which the order is not started,
+            eg. it waited that long behind other orders for the lock
+        :return dict: receipt with "auth" True if the node accepted the transaction,
+            its "tx_id", and "rejected" True if the node refused it outright
+            or it was never started
+        """
+        account_id = str(order["header"]["account_id"])
+        wif = order["header"]["wif"]
+        receipt = {"auth": False, "tx_id": None, "rejected": False}
+        with self.lock:
+            if deadline is not None and time.time() > deadline:
+                # the client would give up before an answer; never signed
+                receipt["rejected"] = True
+                return receipt
+            # a hung order ends the service; the supervisor respawns it
+            timer = Timer(PROCESS_TIMEOUT, os._exit, (1,))
+            timer.start()
+            try:
+                self.refresh(account_id)
+                rpc = self.connection()
+                trx = build_transaction(rpc, order, self.block, self.fees[account_id])
+                if trx == -1 or not trx["operations"]:
+                    return receipt
+                trx, message = serialize_transaction(rpc, trx)
+                signed_tx = sign_transaction(trx, message, wif)
+                if signed_tx is None:
+                    return receipt
+                signed_tx = verify_transaction(signed_tx, message, wif)
+                receipt["tx_id"] = transaction_id(message)
+                ret = rpc_broadcast_transaction(
+                    rpc, signed_tx, order["header"].get("client_order_id", 1)
+                )
+                if isinstance(ret, dict) and "error" in ret:
+                    # perhaps a stale block or fee; fetch anew for the next order
+                    self.refreshed = 0
+                    receipt["rejected"] = True
+                    return receipt
+                receipt["auth"] = True
+                return receipt
+            except Exception as error:
+                trace(error)
+                self.refreshed = 0
+                return receipt
+            finally:
+                timer.cancel()
+
+    def batch(self, order):
+        """
+        sign this order along with others for the same asset and issuer
+        which arrive within BATCH_WINDOW, up to BATCH_SIZE of them
+        :return dict: the receipt of the shared transaction
+        """
+        key = (order["header"]["asset_id"], order["header"]["account_id"])
+        # one execute lasts at most PROCESS_TIMEOUT, so an order started by its
+        # deadline is answered within the client's wait in submit()
+        slot = {
+            "done": Event(),
+            "receipt": None,
+            "deadline": time.time() + PROCESS_TIMEOUT,
+        }
+        with self.pending_lock:
+            batch = self.pending.get(key)
+            leader = batch is None
+            if leader:
+                batch = self.pending[key] = {"slots": [], "full": Event()}
+            batch["slots"].append((order, slot))
+            if len(batch["slots"]) >= min(BATCH_SIZE, LIMIT):
+                # later arrivals start the next batch
+                del self.pending[key]
+                batch["full"].set()
+        if leader:
+            batch["full"].wait(BATCH_WINDOW)
+            with self.pending_lock:
+                if self.pending.get(key) is batch:
+                    del self.pending[key]
+            # the leader awaits only its own order, like the others
+            Thread(
+                target=self.execute_batch, args=(batch["slots"],), daemon=True
+            ).start()
+        slot["done"].wait()
+        return slot["receipt"]
+
+    def execute_batch(self, slots):
+        """
+        sign the edicts of every order in one multi op transaction
+        if the node refuses it, sign each order alone so one bad edict
+        does not hold back the rest; each client is answered as soon as its
+        own order is decided, and no order is started after its deadline
+        """
+        merged = dict(
+            slots[0][0], edicts=[e for order, _ in slots for e in order["edicts"]]
+        )
+        deadline = min(slot["deadline"] for _, slot in slots)
+        receipt = dict(self.execute(merged, deadline), batch=len(slots))
+        if receipt["rejected"] and len(slots) > 1:
+            for order, slot in slots:
+                slot["receipt"] = dict(self.execute(order, slot["deadline"]), batch=1)
+                slot["done"].set()
+            return
+        for _, slot in slots:
+            slot["receipt"] = receipt
+            slot["done"].set()
+
+    def serve(self, conn):
+        """
+        answer one client connection with the receipt of its order
+        """
+        with conn:
+            start = time.time()
+            order = conn.recv()
+            if all(edict["op"] in ("issue", "reserve") for edict in order["edicts"]):
+                receipt = self.batch(order)
+            else:
+                receipt = dict(self.execute(order, start + PROCESS_TIMEOUT), batch=1)
+            conn.send(receipt)
+            if receipt["auth"]:
+                msg = it("green", f"EXECUTED ORDER {receipt['tx_id']}")
+            else:
+                msg = it("red", "REJECTED ORDER")
+            print("signing service", msg, "%.3f sec" % (time.time() - start))
+
+
+def signing_service(infos):
+    """
+    run the signing service on SERVICE_ADDRESS until an order hangs
+    """
+    service = SigningService(infos)
+    Thread(target=service.keepalive, daemon=True).start()
+    # a deep backlog; bursts of deposits connect at once
+    authkey = current_process().authkey
+    with Listener(SERVICE_ADDRESS, backlog=64, authkey=authkey) as listener:
+        while True:
+            try:
+                conn = listener.accept()
+            except Exception as error:
+                # eg. a client with the wrong authkey
+                trace(error)
+                continue
+            Thread(target=service.serve, args=(conn,), daemon=True).start()
+
+
+def supervise(infos):
+    """
+    keep a signing service process alive; respawn it whenever it ends
+    """
+    iteration = 0
+    while True:
+        # increment the delay between attempts exponentially, at most 5 seconds
+        time.sleep(min(0.02 * iteration**2, 5))
+        start = time.time()
+        child = Process(target=signing_service, args=(infos,))
+        child.daemon = True
+        child.start()
+        child.join()
+        print(it("yellow", f"signing service ended {child.exitcode}, respawning"))
+        # a long lived service restarts at once, a crash loop backs off
+        iteration = 0 if time.time() - start > PROCESS_TIMEOUT else iteration + 1
+
+
+def submit(order):
+    """
+    send an order to the signing service; up to ATTEMPTS chances to deliver it
+    once delivered it is never sent again, the service may have broadcast it
+    raises ConnectionRefusedError if the order was not delivered, eg. no service
+    is running or it has another authkey; the caller may then sign it itself
+    :return dict: the receipt, see SigningService.execute(); "auth" False
+        if the outcome is unknown
+    """
+    failed = {"auth": False, "tx_id": None, "rejected": False, "batch": 0}
+    iteration = 0
+    while iteration < ATTEMPTS:
+        iteration += 1
+        try:
+            conn = Client(SERVICE_ADDRESS, authkey=current_process().authkey)
+        except AuthenticationError as error:
+            # eg. a service left running by an earlier Gateway session
+            raise ConnectionRefusedError("signing service authkey mismatch") from error
+        except ConnectionRefusedError:
+            if iteration == 1:
+                raise
+            # the service is respawning
+            time.sleep(iteration)
+            continue
+        except Exception as error:
+            # any other failed handshake; nothing was sent
+            trace(error)
+            time.sleep(iteration)
+            continue
+        try:
+            conn.send(order)
+        except Exception as error:
+            # an incomplete message is discarded by the service
+            conn.close()
+            trace(error)
+            time.sleep(iteration)
+            continue
+        with conn:
+            try:
+                # generous; the service queues orders behind one another
+                if conn.poll(PROCESS_TIMEOUT * 2 + BATCH_WINDOW):
+                    return conn.recv()
+            except (EOFError, OSError) as error:
+                # the service ended mid order and is respawning
+                trace(error)
+        print(it("red", "signing service outcome unknown, not resending"))
+        return failed
+    raise ConnectionRefusedError("signing service unreachable")
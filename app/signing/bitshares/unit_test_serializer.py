@@ -0,0 +1,352 @@
+r"""
+unit_test_serializer.py
+
+  ____  _ _   ____  _                         
+ | __ )(_) |_/ ___|| |__   __ _ _ __ ___  ___ 
+ |  _ \| | __\___ \| '_ \ / _` | '__/ _ \/ __|
+ | |_) | | |_ ___) | | | | (_| | | |  __/\__ \
+ |____/|_|\__|____/|_| |_|\__,_|_|  \___||___/
+       ____  _             _                  
+      / ___|(_) __ _ _ __ (_)_ __   __ _      
+      \___ \| |/ _` | '_ \| | '_ \ / _` |     
+       ___) | | (_| | | | | | | | | (_| |     
+      |____/|_|\__, |_| |_|_|_| |_|\__, |     
+               |___/               |___/      
+
+
+WTFPL litepresence.com Dec 2021 & squidKid-deluxe Jan 2024
+
+Offline verification of the graphene transaction serializer
+
+    golden vectors, assembled field by field from the graphene wire format,
+    for Transfer, AssetIssue, AssetReserve, LimitOrderCreate, LimitOrderCancel
+    property tests on random operations against a reference encoder
+    and against the SignedTransaction serializer used to verify signatures
+
+from the app folder:
+
+    python3 -m signing.bitshares.unit_test_serializer
+    python3 -m signing.bitshares.unit_test_serializer node
+
+the second form also checks every golden vector against a node
+
+"""
+# STANDARD PYTHON MODULES
+import sys
+from binascii import hexlify, unhexlify
+from collections import OrderedDict
+from copy import deepcopy
+from random import Random
+from struct import pack
+
+# GRAPHENE SIGNING MODULES
+from .config import ID
+from .graphene_signing import SignedTransaction, serialize_transaction, varint
+from .rpc import rpc_get_transaction_hex, wss_handshake
+from .utilities import from_iso_date, it
+
+# GLOBAL CONSTANTS
+# every golden transaction shares this header
+HEADER = {
+    "ref_block_num": 0x1234,
+    "ref_block_prefix": 0x89ABCDEF,
+    "expiration": "2024-01-01T00:00:00",
+    "extensions": [],
+    "signatures": [],
+}
+# ref_block_num, ref_block_prefix, expiration; little endian
+HEADER_HEX = "3412" + "efcdab89" + "80009265"
+# each operation, and its wire format, one field per line
+TRANSFER = (
+    [
+        0,
+        OrderedDict(
+            [
+                ("fee", {"amount": 100000, "asset_id": "1.3.0"}),
+                ("from", "1.2.100"),
+                ("to", "1.2.1000"),
+                ("amount", {"amount": 123456789, "asset_id": "1.3.5650"}),
+                ("extensions", []),
+            ]
+        ),
+    ],
+    "00"  # operation id
+    + "a086010000000000"  # fee amount int64
+    + "00"  # fee asset id varint
+    + "64"  # from account varint
+    + "e807"  # to account varint
+    + "15cd5b0700000000"  # amount int64
+    + "922c"  # amount asset id varint
+    + "00"  # no memo
+    + "00",  # no extensions
+)
+ISSUE = (
+    [
+        14,
+        OrderedDict(
+            [
+                ("fee", {"amount": 48260, "asset_id": "1.3.0"}),
+                ("issuer", "1.2.100"),
+                ("asset_to_issue", {"amount": 500000000, "asset_id": "1.3.5650"}),
+                ("issue_to_account", "1.2.1000"),
+                ("extensions", []),
+            ]
+        ),
+    ],
+    "0e"  # operation id
+    + "84bc000000000000"  # fee amount int64
+    + "00"  # fee asset id varint
+    + "64"  # issuer varint
+    + "0065cd1d00000000"  # amount int64
+    + "922c"  # asset id varint
+    + "e807"  # issue to account varint
+    + "00"  # no memo
+    + "00",  # no extensions
+)
+RESERVE = (
+    [
+        15,
+        OrderedDict(
+            [
+                ("fee", {"amount": 12345, "asset_id": "1.3.0"}),
+                ("payer", "1.2.100"),
+                ("amount_to_reserve", {"amount": 1, "asset_id": "1.3.5650"}),
+                ("extensions", []),
+            ]
+        ),
+    ],
+    "0f"  # operation id
+    + "3930000000000000"  # fee amount int64
+    + "00"  # fee asset id varint
+    + "64"  # payer varint
+    + "0100000000000000"  # amount int64
+    + "922c"  # asset id varint
+    + "00",  # no extensions
+)
+CREATE = (
+    [
+        1,
+        OrderedDict(
+            [
+                ("fee", {"amount": 57, "asset_id": "1.3.0"}),
+                ("seller", "1.2.100"),
+                ("amount_to_sell", {"amount": 1000000000, "asset_id": "1.3.0"}),
+                ("min_to_receive", {"amount": 250, "asset_id": "1.3.5650"}),
+                ("expiration", "2024-01-02T00:00:00"),
+                ("fill_or_kill", 0),
+                ("extensions", []),
+            ]
+        ),
+    ],
+    "01"  # operation id
+    + "3900000000000000"  # fee amount int64
+    + "00"  # fee asset id varint
+    + "64"  # seller varint
+    + "00ca9a3b00000000"  # amount to sell int64
+    + "00"  # asset id varint
+    + "fa00000000000000"  # min to receive int64
+    + "922c"  # asset id varint
+    + "00529365"  # expiration uint32
+    + "00"  # fill or kill uint8
+    + "00",  # no extensions
+)
+CANCEL = (
+    [
+        2,
+        OrderedDict(
+            [
+                ("fee", {"amount": 0, "asset_id": "1.3.0"}),
+                ("fee_paying_account", "1.2.100"),
+                ("order", "1.7.300"),
+                ("extensions", []),
+            ]
+        ),
+    ],
+    "02"  # operation id
+    + "0000000000000000"  # fee amount int64
+    + "00"  # fee asset id varint
+    + "64"  # fee paying account varint
+    + "ac02"  # order varint
+    + "00",  # no extensions
+)
+# the account fields of those operations
+ACCOUNTS = (
+    "from",
+    "to",
+    "seller",
+    "issuer",
+    "payer",
+    "issue_to_account",
+    "fee_paying_account",
+)
+# name: operations; the batched issue and reserve of the signing service last
+GOLDEN = {
+    "transfer": [TRANSFER],
+    "issue": [ISSUE],
+    "reserve": [RESERVE],
+    "create": [CREATE],
+    "cancel": [CANCEL],
+    "batch": [ISSUE, ISSUE, RESERVE],
+}
+
+
+def golden_transactions():
+    """
+    yield name, transaction, and expected unsigned serialization hex
+    """
+    for name, operations in GOLDEN.items():
+        trx = dict(deepcopy(HEADER), operations=[deepcopy(op) for op, _ in operations])
+        expected = (
+            HEADER_HEX
+            + hexlify(varint(len(operations))).decode()
+            + "".join(wire for _, wire in operations)
+            + "00"  # no transaction extensions
+        )
+        yield name, trx, expected
+
+
+def unsigned_hex(trx):
+    """
+    serialize_transaction() offline, without the chain id prefix
+    """
+    _, message = serialize_transaction(None, deepcopy(trx))
+    return hexlify(message[len(unhexlify(ID)) :]).decode()
+
+
+def signed_transaction_hex(trx):
+    """
+    the SignedTransaction serializer, without its empty signatures array
+    """
+    return hexlify(bytes(SignedTransaction(**deepcopy(trx)))[:-1]).decode()
+
+
+def reference_hex(trx):
+    """
+    a second, deliberately naive encoder of the graphene wire format
+    """
+
+    def uvarint(num):
+        out = []
+        while True:
+            out.append((num & 0x7F) | (0x80 if num > 0x7F else 0))
+            num >>= 7
+            if not num:
+                return bytes(out)
+
+    def instance(object_id):
+        return uvarint(int(object_id.split(".")[2]))
+
+    def asset(amount):
+        return pack("<q", amount["amount"]) + instance(amount["asset_id"])
+
+    fields = {
+        0: [("fee", asset), ("from", instance), ("to", instance), ("amount", asset)],
+        1: [
+            ("fee", asset),
+            ("seller", instance),
+            ("amount_to_sell", asset),
+            ("min_to_receive", asset),
+            ("expiration", lambda iso: pack("<I", from_iso_date(iso))),
+            ("fill_or_kill", lambda flag: pack("<B", flag)),
+        ],
+        2: [("fee", asset), ("fee_paying_account", instance), ("order", instance)],
+        14: [
+            ("fee", asset),
+            ("issuer", instance),
+            ("asset_to_issue", asset),
+            ("issue_to_account", instance),
+        ],
+        15: [("fee", asset), ("payer", instance), ("amount_to_reserve", asset)],
+    }
+    # operations with an optional memo, absent here
+    memos = (0, 14)
+    buf = pack("<HI", trx["ref_block_num"], trx["ref_block_prefix"])
+    buf += pack("<I", from_iso_date(trx["expiration"]))
+    buf += uvarint(len(trx["operations"]))
+    for op_id, operation in trx["operations"]:
+        buf += uvarint(op_id)
+        for key, encode in fields[op_id]:
+            buf += encode(operation[key])
+        buf += (b"\x00" if op_id in memos else b"") + b"\x00"
+    return hexlify(buf + b"\x00").decode()
+
+
+def random_transaction(rng):
+    """
+    a random transaction of one to five golden style operations
+    """
+
+    def object_id(space):
+        # favor the varint byte boundaries
+        return f"1.{space}.{rng.choice([0, 1, 127, 128, 16383, 16384, rng.randrange(2**32)])}"
+
+    def amount(space=3):
+        return {"amount": rng.randrange(2**63), "asset_id": object_id(space)}
+
+    operations = []
+    for _ in range(rng.randint(1, 5)):
+        op_id, operation = deepcopy(
+            rng.choice([TRANSFER, ISSUE, RESERVE, CREATE, CANCEL])[0]
+        )
+        for key in operation:
+            if isinstance(operation[key], dict):
+                operation[key] = amount()
+            elif key in ACCOUNTS:
+                operation[key] = object_id(2)
+            elif key == "order":
+                operation[key] = object_id(7)
+            elif key == "fill_or_kill":
+                operation[key] = rng.randint(0, 1)
+        operations.append([op_id, operation])
+    return dict(
+        deepcopy(HEADER),
+        ref_block_num=rng.randrange(2**16),
+        ref_block_prefix=rng.randrange(2**32),
+        operations=operations,
+    )
+
+
+def unit_test_golden(rpc=None):
+    """
+    every golden vector by every serializer, and by a node if given
+    """
+    for name, trx, expected in golden_transactions():
+        for serializer in (unsigned_hex, signed_transaction_hex, reference_hex):
+            got = serializer(trx)
+            assert got == expected, f"{name} {serializer.__name__}\n{got}\n{expected}"
+        if rpc is not None:
+            node_hex = rpc_get_transaction_hex(rpc, trx).decode()
+            # the node includes the empty signatures array
+            assert node_hex == expected + "00", f"{name} node\n{node_hex}\n{expected}"
+        print(it("green", "golden"), name)
+
+
+def unit_test_properties(samples=2000, seed=0):
+    """
+    random transactions serialize alike by all three serializers
+    """
+    rng = Random(seed)
+    for _ in range(samples):
+        trx = random_transaction(rng)
+        expected = reference_hex(trx)
+        assert unsigned_hex(trx) == expected, trx
+        assert signed_transaction_hex(trx) == expected, trx
+    # varint is a prefix code, seven bits to a byte
+    for num in [0, 1, 127, 128, 255, 16383, 16384, 2**32 - 1, 2**63 - 1]:
+        encoded = varint(num)
+        assert len(encoded) == max(1, -(-num.bit_length() // 7)), num
+        assert all(byte & 0x80 for byte in encoded[:-1]) and encoded[-1] < 0x80, num
+    print(it("green", "properties"), samples, "random transactions")
+
+
+def main():
+    """
+    offline always; against a node with the argument "node"
+    """
+    rpc = wss_handshake() if "node" in sys.argv[1:] else None
+    unit_test_golden(rpc)
+    unit_test_properties()
+
+
+if __name__ == "__main__":
+    main()
@@ -28,19 +28,18 @@ Eosio Transfer Operations and Account Balances
 import traceback
 from json import dumps as json_dumps
 
-from requests import post
-
 # BITSHARES GATEWAY MODULES
 from config import foreign_accounts, test_accounts, timing
 from ipc_utilities import chronicle
-from nodes import eosio_node
+from node_pool import node_pool
+from parachain_transfer import from_units, to_units
 
 # THIRD PARTY MODULES
 from signing.eosio.eosiopy import eosio_config
 from signing.eosio.eosiopy.eosioparams import EosioParams
 from signing.eosio.eosiopy.nodenetwork import NodeNetwork
 from signing.eosio.eosiopy.rawinputparams import RawinputParams
-from utilities import it, line_number, precisely, timestamp
+from utilities import it, line_number, timestamp
 
 
 def eos_balance(account, comptroller):
@@ -48,13 +47,18 @@ def eos_balance(account, comptroller):
     eosio public api consensus of EOS balance
     """
     timeout = timing()["eos"]["request"]
-    url = eosio_node() + "/v1/chain/get_currency_balance"
+    pool = node_pool("eos")
+    path = "/v1/chain/get_currency_balance"
     params = {"code": "eosio.token", "account": account, "symbol": "EOS"}
     iteration = 0
     while True:
         try:
             data = json_dumps(params)
-            ret = post(url, data=data, timeout=timeout).json()
+            ret = pool.request(
+                lambda url: pool.session(url)
+                .post(url + path, data=data, timeout=timeout)
+                .json()
+            )
             return float(ret[0].split(" ")[0])
         except Exception:
             print(traceback.format_exc())
@@ -72,15 +76,15 @@ def eos_transfer(order, comptroller):
     line_number()
     print("\nORDER\n\n", {k: v for k, v in order.items() if k != "private"}, "\n")
     while 1:
-        # configure the url and port
-        eosio_config.url = eosio_node()
+        # configure the url and port; broadcasts are never hedged
+        eosio_config.url = node_pool("eos").primary
         eosio_config.port = ""
         # assemble the transfer operation dictionary
         operation = {
             "from": order["public"],
             "memo": "",
             # eos must have 4 decimal places formatted as string with space and "EOS"
-            "quantity": precisely(order["quantity"], 4) + " EOS",
+            "quantity": from_units(to_units(order["quantity"], "eos"), "eos") + " EOS",
             "to": order["to"],
         }
         print("\nOPERATION\n\n", operation, "\n")
@@ -29,7 +29,8 @@ import time
 
 # BITSHARES GATEWAY MODULES
 from ipc_utilities import chronicle
-from utilities import create_access, it, line_number, precisely, timestamp
+from parachain_transfer import from_units, to_units
+from utilities import create_access, it, line_number, timestamp
 
 
 def ltcbtc_balance(_, comptroller):
@@ -93,7 +94,7 @@ def ltcbtc_transfer(order, comptroller, pay_fee=True):
             # access.sendtoaddress(address, amount)
             tx_id = access.sendtoaddress(
                 order["to"],
-                precisely(order["quantity"], 8),
+                from_units(to_units(order["quantity"], network), network),
                 "",
                 "",
                 pay_fee,  # True = send amount less fee
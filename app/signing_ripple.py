@@ -29,12 +29,11 @@ import asyncio
 import time
 from json import dumps as json_dumps
 
-from requests import get
-
 # BITSHARES GATEWAY MODULES
 from config import foreign_accounts, test_accounts
 from ipc_utilities import chronicle
-from nodes import ripple_node
+from node_pool import node_pool
+from parachain_transfer import to_units
 
 # THIRD PARTY MODULES
 from signing.ripple.aioxrpy.definitions import (
@@ -63,7 +62,8 @@ def xrp_balance(account, comptroller):
             ],
         }
     )
-    ret = get(ripple_node(), data=data).json()
+    pool = node_pool("xrp")
+    ret = pool.request(lambda url: pool.session(url).get(url, data=data).json())
     # print("\n\nreturned data:    ", ret)
     balance = 0
     try:
@@ -85,7 +85,8 @@ async def xrp_transfer_execute(order):
     broadcast the xrp transfer to the ripple public api server
     """
     master = RippleKey(private_key=order["private"])
-    rpc = RippleJsonRpc(ripple_node())
+    # broadcasts are never hedged
+    rpc = RippleJsonRpc(node_pool("xrp").primary)
     # reserve = await rpc.get_reserve()
     fee = await rpc.fee()
 
@@ -93,7 +94,7 @@ async def xrp_transfer_execute(order):
         "Account": master.to_account(),
         "Flags": RippleTransactionFlags.FullyCanonicalSig,
         "TransactionType": RippleTransactionType.Payment,
-        "Amount": int(order["quantity"] * 10**6),  # conversion to ripple "drops"
+        "Amount": to_units(order["quantity"], "xrp"),  # conversion to ripple "drops"
         "Destination": order["to"],
         "Fee": fee.minimum,
     }
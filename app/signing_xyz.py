@@ -31,6 +31,7 @@ import time
 
 # BITSHARES GATEWAY MODULES
 from ipc_utilities import chronicle, json_ipc
+from parachain_transfer import to_units
 from utilities import it, line_number, timestamp
 
 
@@ -62,7 +63,7 @@ def xyz_transfer(order, comptroller):
     msg = it("red", "XYZ TRANSFERRED")
     chronicle(comptroller, msg)
     print(msg)
-    order["quantity"] = order["quantity"] * 10**5
+    order["quantity"] = to_units(order["quantity"], "xyz")
     json_ipc(
         "xyz_transactions.txt",
         json.dumps(
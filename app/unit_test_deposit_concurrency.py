@@ -18,12 +18,12 @@ from config import server_config
 from utilities import it
 
 
-def make_call(rpc):
+def make_call(rpc, statuses):
     """
     Wrap requests.get so we can thread it
     """
     for _ in range(10):
-        requests.get(rpc)
+        statuses.append(requests.get(rpc).status_code)
 
 
 def main() -> None:
@@ -32,6 +32,7 @@ def main() -> None:
     """
     threads = {}
     calls = []
+    statuses = []
     iteration = 0
     while True:
         iteration += 1
@@ -42,11 +43,13 @@ def main() -> None:
             "&client_id=1.2.25634&amount=10&memo="
         )
 
-        threads[iteration] = Thread(target=make_call, args=(rpc,))
+        threads[iteration] = Thread(target=make_call, args=(rpc, statuses))
         threads[iteration].start()
         time.sleep(0.1)
 
-        print(it("red", f"\nTotal: {len(calls)} - {Counter(calls)}\n"))
+        print(it("red", f"\nTotal: {len(calls)} - {Counter(calls)}"))
+        # expect mostly 429 once the client_id token bucket is empty
+        print(it("yellow", f"Status: {Counter(statuses)}\n"))
         if iteration == 50:
             break
 
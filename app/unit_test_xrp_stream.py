@@ -0,0 +1,160 @@
+"""
+Follow a local rippled websocket stand-in with the XRP stream parachain source
+
+the stand-in validates a ledger every second with one payment to the gateway,
+it drops the stream for ledger 105, which must be backfilled with account_tx
+"""
+# DISABLE SELECT PYLINT TESTS
+# pylint: disable=invalid-name
+
+# STANDARD MODULES
+import base64
+import hashlib
+import socket
+import struct
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from json import dumps as json_dumps
+from json import loads as json_loads
+from threading import Thread
+
+# GATEWAY MODULES
+from parachain_ripple import XrpStream
+from utilities import it
+
+# GLOBAL CONSTANTS
+WS_PORT = 16006
+RPC_PORT = 15005
+GATEWAY = "rGatewayXXXXXXXXXXXXXXXXXXXXXXXXX"
+CLIENT = "rClientXXXXXXXXXXXXXXXXXXXXXXXXXX"
+DROPPED = 105
+
+
+def payment(ledger_index):
+    """
+    A qualifying payment to the gateway in this ledger
+    """
+    return {
+        "TransactionType": "Payment",
+        "Account": CLIENT,
+        "Destination": GATEWAY,
+        "DestinationTag": 1234567890,
+        "Amount": str(ledger_index * 10**6),
+        "hash": f"{ledger_index:064X}",
+        "ledger_index": ledger_index,
+    }
+
+
+def send_frame(conn, text):
+    """
+    Send an unmasked websocket text frame
+    """
+    data = text.encode()
+    if len(data) < 126:
+        header = struct.pack("!BB", 0x81, len(data))
+    else:
+        header = struct.pack("!BBH", 0x81, 126, len(data))
+    conn.sendall(header + data)
+
+
+def serve_websocket(listener):
+    """
+    Accept one client, handshake, then stream ledgers forever
+    """
+    conn, _ = listener.accept()
+    request = conn.recv(4096).decode()
+    key = [
+        line.split(":", 1)[1].strip()
+        for line in request.split("\r\n")
+        if line.lower().startswith("sec-websocket-key")
+    ][0]
+    accept = base64.b64encode(
+        hashlib.sha1((key + "258EAFA5-E914-47DA-95CA-C5AB0DC85B11").encode()).digest()
+    ).decode()
+    conn.sendall(
+        (
+            "HTTP/1.1 101 Switching Protocols\r\nUpgrade: websocket\r\n"
+            f"Connection: Upgrade\r\nSec-WebSocket-Accept: {accept}\r\n\r\n"
+        ).encode()
+    )
+    for ledger_index in range(100, 112):
+        time.sleep(1)
+        if ledger_index == DROPPED:
+            continue
+        msg = {
+            "type": "transaction",
+            "validated": True,
+            "ledger_index": ledger_index,
+            "transaction": payment(ledger_index),
+            "meta": {"TransactionResult": "tesSUCCESS"},
+        }
+        send_frame(conn, json_dumps(msg))
+        send_frame(
+            conn, json_dumps({"type": "ledgerClosed", "ledger_index": ledger_index})
+        )
+
+
+class AccountTx(BaseHTTPRequestHandler):
+    """
+    Minimal rippled json rpc: account_tx over the dropped ledger
+    """
+
+    def do_POST(self):
+        """
+        Answer account_tx with the payments in the requested range
+        """
+        request = json_loads(self.rfile.read(int(self.headers["Content-Length"])))
+        params = request["params"][0]
+        print(it("yellow", "account_tx"), params)
+        transactions = [
+            {
+                "tx": payment(index),
+                "meta": {"TransactionResult": "tesSUCCESS"},
+                "validated": True,
+            }
+            for index in range(
+                params["ledger_index_min"], params["ledger_index_max"] + 1
+            )
+            if index == DROPPED and params["account"] == GATEWAY
+        ]
+        body = json_dumps({"result": {"transactions": transactions}})
+        self.send_response(200)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body.encode())
+
+    def log_message(self, *_):
+        """
+        Silence the per request log
+        """
+
+
+def main():
+    """
+    Emit each validated ledger below the stream tip, as the parachain writer would
+    """
+    listener = socket.socket()
+    listener.setsockopt(socket.SOL_SOCKET, socket.SO_REUSEADDR, 1)
+    listener.bind(("127.0.0.1", WS_PORT))
+    listener.listen(1)
+    Thread(target=serve_websocket, args=(listener,), daemon=True).start()
+    rpc = ThreadingHTTPServer(("127.0.0.1", RPC_PORT), AccountTx)
+    Thread(target=rpc.serve_forever, daemon=True).start()
+    stream = XrpStream(
+        f"ws://127.0.0.1:{WS_PORT}", f"http://127.0.0.1:{RPC_PORT}", lambda: {GATEWAY}
+    )
+    stream.thread.start()
+    emitted = stream.block_number() - 1
+    while emitted < 110:
+        time.sleep(0.5)
+        for ledger_index in range(emitted + 1, stream.block_number()):
+            transfers = stream.pop(ledger_index)
+            print(
+                it("green", f"ledger {ledger_index}"), [t.decimal() for t in transfers]
+            )
+            emitted = ledger_index
+
+
+if __name__ == "__main__":
+    main()
@@ -42,6 +42,7 @@ from nodes import bitcoin_node, bitshares_nodes, litecoin_node
 
 # THIRD PARTY MODULES
 from signing.bitcoin.bitcoinrpc.authproxy import AuthServiceProxy
+from signing.bitshares.money import Amount
 
 
 def encode_memo(network, seed):
@@ -79,15 +80,19 @@ def roughly(amount, reference):
     return bool(0.9999 * reference <= amount <= reference * 1.0001)
 
 
-def create_access(network):
+def create_access(network, node=None):
     """
     create an RPC connection to bitcoind or litecoind node
-    """
-    nodes = {
-        "btc": bitcoin_node(),
-        "ltc": litecoin_node(),
-    }
-    node = nodes[network]
+    node is a [url, wallet] pair; by default the first configured node
+    """
+    if node is None:
+        node = {
+            "btc": bitcoin_node,
+            "ltc": litecoin_node,
+        }[network]()
+        # nodes.py may list several nodes
+        if not isinstance(node[0], str):
+            node = node[0]
     if network == "btc":
         access = AuthServiceProxy(node[0])
         try:
@@ -169,14 +174,12 @@ def logo():
 def precisely(number, precision):
     """
     format float or int as string to specific number of decimal places
+    floats are read from their shortest repr; see signing.bitshares.money
     :param number: int or float to be returned to specific number of decimal places
     :param int(precision): truncated decimal places to return; no more no less
     :return str(): string representation of a decimal to specific number of places
     """
-    num = f"{float(number):.99f}"
-    for _ in range(precision):
-        num += "0"
-    return num[: num.find(".") + precision + 1]
+    return str(Amount.parse(number, precision))
 
 
 def vivid(bright=0.5):